@@ -0,0 +1,69 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Adding or removing a node only moves the keys that hash next to its
+    virtual nodes (about 1/N of all keys); every other key keeps its node.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        """
+        Args:
+            nodes: Initial node IDs
+            replicas: Virtual nodes per node; more gives a more even spread
+        """
+        self.replicas = replicas
+        self._ring: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._ring, point)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            del self._owners[point]
+            index = bisect.bisect_left(self._ring, point)
+            del self._ring[index]
+
+    def lookup(self, key: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        Node owning a key: the first node clockwise from the key's hash.
+
+        Args:
+            key: Key to place (a camera stream ID)
+            exclude: Nodes to skip, e.g. unhealthy ones; the key falls through
+                to the next node on the ring
+
+        Returns:
+            Node ID, or None if no eligible node exists
+        """
+        exclude = set(exclude)
+        if not self._ring or not self.nodes - exclude:
+            return None
+        start = bisect.bisect(self._ring, _hash(key))
+        for offset in range(len(self._ring)):
+            node = self._owners[self._ring[(start + offset) % len(self._ring)]]
+            if node not in exclude:
+                return node
+        return None
@@ -0,0 +1,54 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from cluster.router import StreamRouter, create_app
+
+logger = logging.getLogger('hostel-security-ai')
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_nodes(count: int, base_port: int):
+    """Start `count` detection servers on consecutive ports as local processes."""
+    processes = {}
+    for i in range(count):
+        node_id = f"node-{i}"
+        env = dict(os.environ, PORT=str(base_port + i), ML_NODE_ID=node_id)
+        processes[node_id] = subprocess.Popen([sys.executable, os.path.join(ML_DIR, 'server.py')],
+                                              cwd=ML_DIR, env=env)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several detection nodes behind a stream router on one machine.")
+    parser.add_argument('--nodes', type=int, default=3, help="Number of node processes")
+    parser.add_argument('--base-port', type=int, default=5001, help="Port of the first node")
+    parser.add_argument('--port', type=int, default=5000, help="Router port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    processes = start_nodes(args.nodes, args.base_port)
+    router = StreamRouter({node_id: f"http://127.0.0.1:{args.base_port + i}"
+                           for i, node_id in enumerate(processes)})
+    # Give the nodes a moment to bind before the first health check
+    time.sleep(2)
+    router.check_health()
+    router.start_health_checks()
+
+    try:
+        create_app(router).run(host='0.0.0.0', port=args.port, threaded=True)
+    finally:
+        router.stop()
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    # Run from src/ml as: python -m cluster.local_cluster --nodes 3
+    main()
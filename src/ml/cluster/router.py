@@ -0,0 +1,596 @@
+import json
+import logging
+import os
+import struct
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+
+from cluster.hash_ring import HashRing
+from runtime.protocol import (FRAMES_CONTENT_TYPE, RESULTS_CONTENT_TYPE, FrameResult, decode_frames, decode_results,
+                              encode_frames, encode_results)
+
+logger = logging.getLogger('hostel-security-ai')
+
+# Request headers passed on to the nodes
+FORWARDED_HEADERS = ('content-type', 'accept', 'x-camera-id', 'authorization', 'x-admin-token')
+
+# Alert IDs are only unique within one event store; the router hands out
+# (local ID << ALERT_ID_BITS) | store tag instead
+ALERT_ID_BITS = 16
+
+def store_tag(store: str) -> int:
+    return zlib.crc32(store.encode()) & ((1 << ALERT_ID_BITS) - 1)
+
+
+def global_alert_id(store: str, local_id: int) -> int:
+    return (local_id << ALERT_ID_BITS) | store_tag(store)
+
+
+def split_alert_id(alert_id: int) -> Tuple[int, int]:
+    """(store tag, local ID) of a router alert ID."""
+    return alert_id & ((1 << ALERT_ID_BITS) - 1), alert_id >> ALERT_ID_BITS
+
+
+def merge_analytics(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up the analytics of several event stores (see AnalyticsRollups.summary)."""
+    merged = {key: sum(summary[key] for summary in summaries)
+              for key in summaries[0] if key.endswith('Count')}
+    series = {}
+    locations = defaultdict(int)
+    histograms = {}
+    for summary in summaries:
+        for bucket in summary["incidents"]:
+            entry = series.setdefault(bucket["name"], dict.fromkeys(bucket, 0))
+            for key, value in bucket.items():
+                entry[key] = value if key == "name" else entry.get(key, 0) + value
+        for location in summary["locations"]:
+            locations[location["name"]] += location["incidents"]
+        for kind, histogram in summary["confidenceHistograms"].items():
+            histograms[kind] = [a + b for a, b in zip(histograms.get(kind, [0] * len(histogram)), histogram)]
+    merged["incidents"] = list(series.values())
+    merged["locations"] = [{"name": name, "incidents": count}
+                           for name, count in sorted(locations.items(), key=lambda item: -item[1])]
+    merged["confidenceHistograms"] = histograms
+    return merged
+
+
+class StreamRouter:
+    """
+    Assigns camera streams to inference nodes.
+
+    Placement uses a consistent hash ring, but once a stream is assigned it
+    stays on its node (sticky affinity) for as long as that node is healthy,
+    so detector histories are never split across nodes. Streams move only
+    when their node fails or leaves (failover to the next node on the ring)
+    or when a node joins or recovers and the ring now assigns the stream to
+    it (rebalancing). Each move copies the stream's detector snapshot from
+    its old node to the new one, releases it on the old node, and is
+    reported to the on_move callback.
+    """
+
+    def __init__(self, nodes: Dict[str, str] = None, failure_threshold: int = 2,
+                 health_interval: float = 2.0, request_timeout: float = 10.0,
+                 on_move: Callable[[str, Optional[str], str], None] = None):
+        """
+        Args:
+            nodes: Node ID -> base URL (e.g. "http://10.0.0.5:5000")
+            failure_threshold: Consecutive failures before a node is marked unhealthy
+            health_interval: Seconds between health checks
+            request_timeout: Timeout for forwarded requests and health checks
+            on_move: Callback(stream_id, old_node, new_node) for every reassignment
+        """
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self.request_timeout = request_timeout
+        self.on_move = on_move
+
+        self.ring = HashRing()
+        self.urls: Dict[str, str] = {}
+        self.failures: Dict[str, int] = {}
+        self.unhealthy = set()
+        self.assignments: Dict[str, str] = {}
+        # Event store each node writes to, as reported by its health check
+        self.stores: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+        for node_id, url in (nodes or {}).items():
+            self.add_node(node_id, url)
+
+    def add_node(self, node_id: str, url: str):
+        """Add a node to the ring and move over the streams it now owns."""
+        with self._lock:
+            self.urls[node_id] = url.rstrip('/')
+            self.failures[node_id] = 0
+            self.unhealthy.discard(node_id)
+            self.ring.add(node_id)
+            self._rebalance()
+        logger.info(f"Node {node_id} joined at {url}")
+
+    def remove_node(self, node_id: str):
+        """Take a node out of the ring; its streams fail over on their next frame."""
+        with self._lock:
+            self.ring.remove(node_id)
+            self.urls.pop(node_id, None)
+            self.failures.pop(node_id, None)
+            self.stores.pop(node_id, None)
+            self.unhealthy.discard(node_id)
+        logger.info(f"Node {node_id} left")
+
+    def route(self, stream_id: str, exclude: Iterable[str] = ()) -> Optional[Tuple[str, str]]:
+        """
+        Node that should process a stream's frames.
+
+        Args:
+            stream_id: Camera stream
+            exclude: Nodes that already failed the current request; it goes to
+                the next node on the ring, without moving the stream
+
+        Returns:
+            Tuple of (node_id, base_url), or None if no node is healthy
+        """
+        exclude = set(exclude)
+        with self._lock:
+            current = self.assignments.get(stream_id)
+            if current in self.urls and current not in self.unhealthy and current not in exclude:
+                return current, self.urls[current]
+
+            node = self.ring.lookup(stream_id, exclude=self.unhealthy | exclude)
+            if node is None:
+                return None
+            if not exclude:
+                self._assign(stream_id, current, node)
+            return node, self.urls[node]
+
+    def any_node(self, exclude: Iterable[str] = ()) -> Optional[Tuple[str, str]]:
+        """A healthy node for requests that are not tied to a stream."""
+        with self._lock:
+            for node in sorted(self.urls):
+                if node not in self.unhealthy and node not in exclude:
+                    return node, self.urls[node]
+        return None
+
+    def store_nodes(self) -> Dict[str, Tuple[str, str]]:
+        """
+        One healthy node per event store, for reads that span the cluster.
+
+        Nodes sharing a database report the same store ID, so each store is
+        read once. A node whose store is not known yet counts as its own store.
+
+        Returns:
+            Store ID -> (node_id, base_url)
+        """
+        with self._lock:
+            nodes = {}
+            for node in sorted(self.urls):
+                if node not in self.unhealthy:
+                    nodes.setdefault(self.stores.get(node, node), (node, self.urls[node]))
+            return nodes
+
+    def healthy_nodes(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return [(node, self.urls[node]) for node in sorted(self.urls) if node not in self.unhealthy]
+
+    def report_success(self, node_id: str):
+        with self._lock:
+            if node_id not in self.urls:
+                return
+            self.failures[node_id] = 0
+            if node_id in self.unhealthy:
+                self.unhealthy.discard(node_id)
+                logger.info(f"Node {node_id} recovered")
+                self._rebalance()
+
+    def report_failure(self, node_id: str):
+        with self._lock:
+            if node_id not in self.urls:
+                return
+            self.failures[node_id] += 1
+            if self.failures[node_id] >= self.failure_threshold and node_id not in self.unhealthy:
+                self.unhealthy.add(node_id)
+                logger.warning(f"Node {node_id} marked unhealthy")
+
+    def _rebalance(self):
+        """Move streams whose ring owner changed (caller holds the lock)."""
+        for stream_id, current in list(self.assignments.items()):
+            owner = self.ring.lookup(stream_id, exclude=self.unhealthy)
+            if owner is not None and owner != current:
+                self._assign(stream_id, current, owner)
+
+    def _assign(self, stream_id: str, old: Optional[str], new: str):
+        self.assignments[stream_id] = new
+        if old is None:
+            return
+        logger.info(f"Stream {stream_id} moved from {old} to {new}")
+        if old in self.urls and old not in self.unhealthy:
+            # Hand the stream's detector state over and free the old copy in the background
+            path = f"/api/streams/{urllib.parse.quote(stream_id, safe='')}"
+            threading.Thread(target=self._hand_off, args=(self.urls[old] + path, self.urls[new] + path),
+                             daemon=True).start()
+        if self.on_move:
+            self.on_move(stream_id, old, new)
+
+    def _hand_off(self, old_url: str, new_url: str):
+        try:
+            with urllib.request.urlopen(f"{old_url}/snapshot", timeout=self.request_timeout) as response:
+                snapshot = response.read()
+            upload = urllib.request.Request(f"{new_url}/snapshot", data=snapshot, method='PUT',
+                                            headers={'Content-Type': 'application/octet-stream'})
+            urllib.request.urlopen(upload, timeout=self.request_timeout).close()
+        except (urllib.error.URLError, OSError) as e:
+            # Worker-process nodes or streams without state; the new node starts fresh
+            logger.warning(f"Could not hand off stream state from {old_url}: {e}")
+        try:
+            urllib.request.urlopen(urllib.request.Request(old_url, method='DELETE'),
+                                   timeout=self.request_timeout).close()
+        except (urllib.error.URLError, OSError) as e:
+            logger.warning(f"Could not release stream at {old_url}: {e}")
+
+    def check_health(self):
+        """Probe every node's /api/health once."""
+        with self._lock:
+            nodes = dict(self.urls)
+        for node_id, url in nodes.items():
+            try:
+                with urllib.request.urlopen(f"{url}/api/health", timeout=self.request_timeout) as response:
+                    health = json.loads(response.read() or b'{}')
+            except (urllib.error.URLError, OSError):
+                self.report_failure(node_id)
+                continue
+            except ValueError:
+                health = {}
+            with self._lock:
+                if node_id in self.urls and health.get("event_store"):
+                    self.stores[node_id] = health["event_store"]
+            self.report_success(node_id)
+
+    def start_health_checks(self):
+        def loop():
+            while not self._stop.wait(self.health_interval):
+                self.check_health()
+        threading.Thread(target=loop, name="router-health", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _stream_id() -> Optional[str]:
+    stream_id = request.args.get('camera_id') or request.headers.get('X-Camera-Id')
+    if stream_id is None and request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        # Cache the body first: form parsing then reads the cached copy
+        # instead of consuming the input stream, so the body can still be forwarded
+        request.get_data(cache=True)
+        stream_id = request.form.get('camera_id')
+    return stream_id or 'default'
+
+
+def create_app(router: StreamRouter) -> Flask:
+    """
+    HTTP front end that forwards API requests to the node owning each stream.
+
+    Detection requests are routed by camera_id. Binary frames messages
+    without an X-Camera-Id header are split by the cameras of their frames,
+    and the nodes' answers merged in frame order. Alerts and analytics are
+    read from one node per event store and merged, clips are looked up on
+    every node, and settings changes are applied on every node; everything
+    else goes to any healthy node. A request that fails to reach its node
+    counts as one failure of that node and is retried once on the next node
+    on the ring; the stream itself only moves once the node is marked
+    unhealthy.
+    """
+    app = Flask(__name__)
+    CORS(app)
+
+    def call(node_id: str, base_url: str, path: str, method: str = 'GET', query: str = '',
+             body: bytes = None) -> Tuple[int, str, bytes]:
+        """
+        Send the current request's headers to a node.
+
+        Returns:
+            Tuple of (status, content type, body); error statuses included
+
+        Raises:
+            urllib.error.URLError, OSError: If the node could not be reached
+        """
+        headers = {key: value for key, value in request.headers.items() if key.lower() in FORWARDED_HEADERS}
+        url = f"{base_url}/api/{path}" + (f"?{query}" if query else "")
+        upstream = urllib.request.Request(url, data=body or None, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(upstream, timeout=router.request_timeout) as response:
+                router.report_success(node_id)
+                return response.status, response.headers.get('Content-Type'), response.read()
+        except urllib.error.HTTPError as e:
+            # The node answered; pass its error through
+            router.report_success(node_id)
+            return e.code, e.headers.get('Content-Type'), e.read()
+
+    def gather(path: str, query: str = '') -> Dict[str, Tuple[int, str, bytes]]:
+        """GET a path from one node per event store; unreachable nodes are left out."""
+        responses = {}
+        for store, (node_id, base_url) in router.store_nodes().items():
+            try:
+                responses[store] = call(node_id, base_url, path, query=query)
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Reading {path} from {node_id} failed: {e}")
+                router.report_failure(node_id)
+        return responses
+
+    def passthrough(response: Tuple[int, str, bytes]) -> Response:
+        status, content_type, data = response
+        return Response(data, status=status, content_type=content_type)
+
+    def error_text(data: bytes) -> str:
+        try:
+            return str(json.loads(data)["error"])
+        except (ValueError, KeyError, TypeError):
+            return data.decode(errors='replace')[:200]
+
+    def forward_frames(path: str, body: bytes) -> Optional[Response]:
+        """
+        Send each camera's frames of a binary message to that camera's node.
+
+        Returns:
+            The merged response, or None if the body is not a frames message
+            (the node it is forwarded to rejects it)
+        """
+        try:
+            names, delta, frames = decode_frames(body)
+        except (ValueError, struct.error):
+            return None
+        if not frames:
+            return None
+        as_json = request.accept_mimetypes.best_match([RESULTS_CONTENT_TYPE, 'application/json']) == 'application/json'
+
+        def error_item(i: int, status: int, error: str):
+            stream_id = frames[i].camera_id or 'default'
+            if as_json:
+                return {"stream_id": stream_id, "status": status, "events": [], "error": error}
+            return FrameResult(stream_id, status, {}, [], error)
+
+        items = [None] * len(frames)
+        pending, failed = list(range(len(frames))), []
+        for _ in range(2):
+            groups: Dict[Tuple[str, str], List[int]] = {}
+            for i in pending:
+                target = router.route(frames[i].camera_id or 'default', exclude=failed)
+                if target is None:
+                    items[i] = error_item(i, 503, "No healthy inference nodes")
+                else:
+                    groups.setdefault(target, []).append(i)
+            pending = []
+            for (node_id, base_url), indices in groups.items():
+                part = body if len(indices) == len(frames) else encode_frames([frames[i] for i in indices], names, delta)
+                try:
+                    response = call(node_id, base_url, path, 'POST', request.query_string.decode(), part)
+                except (urllib.error.URLError, OSError) as e:
+                    logger.warning(f"Forwarding to {node_id} failed: {e}")
+                    router.report_failure(node_id)
+                    failed.append(node_id)
+                    pending += indices
+                    continue
+                if len(indices) == len(frames):
+                    # Every frame went to one node; its answer is the answer
+                    return passthrough(response)
+                status, _, data = response
+                if status == 200:
+                    results = json.loads(data)["results"] if as_json else decode_results(data)
+                    for i, result in zip(indices, results):
+                        items[i] = result
+                else:
+                    for i in indices:
+                        items[i] = error_item(i, status, error_text(data))
+            if not pending:
+                break
+        for i in pending:
+            items[i] = error_item(i, 502, "Inference nodes unreachable")
+
+        if as_json:
+            return jsonify({"results": items})
+        return Response(encode_results(items), content_type=RESULTS_CONTENT_TYPE)
+
+    def alert_owner(alert_id: int) -> Optional[Tuple[str, str, str, int]]:
+        """(store, node_id, base_url, local ID) of a router alert ID."""
+        tag, local_id = split_alert_id(alert_id)
+        for store, (node_id, base_url) in router.store_nodes().items():
+            if store_tag(store) == tag:
+                return store, node_id, base_url, local_id
+        return None
+
+    def with_global_id(store: str, alert: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(alert, id=global_alert_id(store, alert["id"]))
+
+    @app.route('/router/nodes', methods=['GET'])
+    def nodes():
+        with router._lock:
+            return jsonify({
+                "nodes": {node: {"url": url, "healthy": node not in router.unhealthy,
+                                 "event_store": router.stores.get(node)}
+                          for node, url in router.urls.items()},
+                "assignments": dict(router.assignments),
+            })
+
+    @app.route('/router/nodes/<node_id>', methods=['PUT'])
+    def join(node_id):
+        url = (request.get_json(silent=True) or {}).get('url')
+        if not isinstance(url, str) or not url:
+            return jsonify({"error": "Expected a JSON body with the node's url"}), 400
+        router.add_node(node_id, url)
+        return jsonify({"node": node_id, "joined": True})
+
+    @app.route('/router/nodes/<node_id>', methods=['DELETE'])
+    def leave(node_id):
+        router.remove_node(node_id)
+        return jsonify({"node": node_id, "left": True})
+
+    @app.route('/api/alerts', methods=['GET'])
+    def list_alerts():
+        """Merge the newest alerts of every event store into one page."""
+        args = request.args.to_dict()
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        before = request.args.get('before', type=int)
+        args.pop('before', None)
+        args['limit'] = limit
+        if not router.store_nodes():
+            return jsonify({"error": "No healthy inference nodes"}), 503
+
+        # The cursor alert's time pages the other stores
+        owner, cursor_ts = None, None
+        if before is not None:
+            owner = alert_owner(before)
+            if owner is None:
+                return jsonify([])
+            try:
+                response = call(owner[1], owner[2], f"alerts/{owner[3]}")
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Reading alerts from {owner[1]} failed: {e}")
+                router.report_failure(owner[1])
+                return jsonify({"error": "Inference node unreachable"}), 502
+            if response[0] == 404:
+                return jsonify([])
+            if response[0] != 200:
+                return passthrough(response)
+            cursor_ts = json.loads(response[2])["ts"]
+
+        alerts = []
+        for store, (node_id, base_url) in router.store_nodes().items():
+            query = dict(args)
+            if owner is not None:
+                query.update({'before': owner[3]} if store == owner[0] else {'before_ts': cursor_ts})
+            try:
+                response = call(node_id, base_url, 'alerts', query=urllib.parse.urlencode(query))
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Reading alerts from {node_id} failed: {e}")
+                router.report_failure(node_id)
+                continue
+            if response[0] != 200:
+                return passthrough(response)
+            alerts += [with_global_id(store, alert) for alert in json.loads(response[2])]
+
+        alerts.sort(key=lambda alert: (alert["ts"], alert["id"]), reverse=True)
+        return jsonify(alerts[:limit])
+
+    @app.route('/api/alerts/<int:alert_id>', methods=['GET'])
+    @app.route('/api/alerts/<int:alert_id>/status', methods=['PUT'])
+    def alert(alert_id):
+        owner = alert_owner(alert_id)
+        if owner is None:
+            return jsonify({"error": "Alert not found"}), 404
+        store, node_id, base_url, local_id = owner
+        path = f"alerts/{local_id}" + ("/status" if request.method == 'PUT' else "")
+        try:
+            status, content_type, data = call(node_id, base_url, path, request.method, body=request.get_data())
+        except (urllib.error.URLError, OSError) as e:
+            logger.warning(f"Forwarding to {node_id} failed: {e}")
+            router.report_failure(node_id)
+            return jsonify({"error": "Inference node unreachable"}), 502
+        if status != 200:
+            return Response(data, status=status, content_type=content_type)
+        return jsonify(with_global_id(store, json.loads(data)))
+
+    @app.route('/api/analytics', methods=['GET'])
+    def analytics():
+        responses = gather('analytics', request.query_string.decode())
+        if not responses:
+            return jsonify({"error": "No healthy inference nodes"}), 503
+        failed = [response for response in responses.values() if response[0] != 200]
+        if failed:
+            return passthrough(failed[0])
+        return jsonify(merge_analytics([json.loads(response[2]) for response in responses.values()]))
+
+    @app.route('/api/clips/<path:name>', methods=['GET'])
+    def clip(name):
+        """Clips are written by the node that saw the incident; ask each node in turn."""
+        for node_id, base_url in router.healthy_nodes():
+            try:
+                response = call(node_id, base_url, f"clips/{urllib.parse.quote(name)}")
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Looking up clip on {node_id} failed: {e}")
+                router.report_failure(node_id)
+                continue
+            if response[0] != 404:
+                return passthrough(response)
+        return jsonify({"error": "Clip not found"}), 404
+
+    @app.route('/api/settings', methods=['PUT'])
+    def update_settings():
+        """
+        Apply a settings change on every node.
+
+        The first node checks the change (and its version); once it accepts
+        it, the other nodes get the same change without the version check.
+        """
+        nodes = router.healthy_nodes()
+        if not nodes:
+            return jsonify({"error": "No healthy inference nodes"}), 503
+        body = request.get_json(silent=True)
+        statuses = {}
+        first = None
+        for node_id, base_url in nodes:
+            data = request.get_data()
+            if first is not None and isinstance(body, dict):
+                data = json.dumps({key: value for key, value in body.items() if key != 'version'}).encode()
+            try:
+                response = call(node_id, base_url, 'settings', 'PUT', body=data)
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Updating settings on {node_id} failed: {e}")
+                router.report_failure(node_id)
+                statuses[node_id] = 502
+                continue
+            statuses[node_id] = response[0]
+            if first is None:
+                if response[0] != 200:
+                    return passthrough(response)
+                first = response
+            elif response[0] != 200:
+                logger.warning(f"Node {node_id} refused the settings change: {response[2][:200]!r}")
+        if first is None:
+            return jsonify({"error": "Inference nodes unreachable"}), 502
+        return jsonify(dict(json.loads(first[2]), nodes=statuses))
+
+    @app.route('/api/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+    def forward(path):
+        by_stream = path.startswith('detect/')
+        if (by_stream and request.mimetype == FRAMES_CONTENT_TYPE
+                and not (request.args.get('camera_id') or request.headers.get('X-Camera-Id'))):
+            response = forward_frames(path, request.get_data())
+            if response is not None:
+                return response
+        stream_id = _stream_id() if by_stream else None
+        failed = []
+        for _ in range(2):
+            target = router.route(stream_id, exclude=failed) if by_stream else router.any_node(exclude=failed)
+            if target is None:
+                break
+            node_id, base_url = target
+            try:
+                return passthrough(call(node_id, base_url, path, request.method,
+                                        request.query_string.decode(), request.get_data()))
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Forwarding to {node_id} failed: {e}")
+                router.report_failure(node_id)
+                failed.append(node_id)
+
+        if not failed:
+            return jsonify({"error": "No healthy inference nodes"}), 503
+        return jsonify({"error": "Inference nodes unreachable"}), 502
+
+    return app
+
+
+if __name__ == '__main__':
+    # Run from src/ml as: python -m cluster.router
+    # ML_NODES="node-a=http://10.0.0.5:5000,node-b=http://10.0.0.6:5000"
+    nodes = dict(entry.split('=', 1) for entry in os.environ.get('ML_NODES', '').split(',') if entry)
+    router = StreamRouter(nodes)
+    # Learn each node's event store before serving merged reads
+    router.check_health()
+    router.start_health_checks()
+    create_app(router).run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threaded=True)
@@ -1,12 +1,16 @@
 
 import cv2
 import numpy as np
-import tensorflow as tf
 import mediapipe as mp
 import os
 import time
 from typing import Dict, Any, List, Tuple
 
+from detection.model_cache import load_shared_model
+from detection.person_tracker import PersonTracker, Track
+from detection.pipeline import Pipeline, Stage, frame_key, POSE_MIN_HEIGHT
+from detection.thresholds import merge_thresholds
+
 class AccessDetector:
     """
     Unauthorized access detection model.
@@ -17,40 +21,49 @@ class AccessDetector:
     3. Unusual access patterns (time of day, frequency)
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, person_tracker: PersonTracker = None,
+                 thresholds: Dict[str, float] = None):
         """
         Initialize the access detector.
         
         Args:
             model_path: Path to the TensorFlow model (optional)
+            person_tracker: Multi-person tracker, possibly shared with other
+                detectors (optional, a private one is created if omitted)
+            thresholds: Overrides of DEFAULT_THRESHOLDS['access'] (optional)
         """
         # Load default model if not specified
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), 
                                      "../models/access_detection/model.h5")
         
-        # Initialize MediaPipe pose for person detection
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        # Multi-person detection and tracking
+        self.person_tracker = person_tracker or PersonTracker()
         
         # Load TensorFlow model if exists
         self.model = None
         if os.path.exists(model_path):
-            self.model = tf.keras.models.load_model(model_path)
+            self.model = load_shared_model(model_path)
             print(f"Loaded access detection model from {model_path}")
         else:
             print(f"No model found at {model_path}, using rule-based detection")
             
-        # Track people over time
-        self.person_tracker = {}
+        # Person count history over time
         self.last_clean_time = time.time()
         self.persons_history = []
         self.max_history_len = 60  # About 2 seconds at 30fps
+        
+        # Decision thresholds (replaced as a whole when the configuration changes)
+        self.thresholds = merge_thresholds('access', thresholds)
+        
+        # Callback receiving each model input vector, e.g. for training feature extraction
+        self.feature_sink = None
+        
+        # Detection pipeline: tracking and scoring stages
+        self.color_key = frame_key('color', POSE_MIN_HEIGHT)
+        self.observation_key = "access.observation"
+        self.output_key = "access.result"
+        self.pipeline = Pipeline(self.pipeline_stages())
             
     def detect(self, frame: np.ndarray) -> Dict[str, Any]:
         """
@@ -69,15 +82,26 @@ class AccessDetector:
                 "details": Dict with access-specific metrics
             }
         """
-        # Ensure RGB format
-        if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-        # Process with MediaPipe pose
-        results = self.pose.process(frame)
-        
+        inputs = {self.color_key: frame, 'ts': time.time(), 'frame_id': None}
+        return self.pipeline.run(inputs, [self.output_key])[self.output_key]
+    
+    def pipeline_stages(self) -> List[Stage]:
+        """Stages of access detection: person tracking (shared with fight detection) and scoring."""
+        tracking = self.person_tracker.stage(self.color_key)
+        return [
+            tracking,
+            Stage(self.observation_key, self._observe, (tracking.key, "ts"), parallel=False),
+            Stage(self.output_key, self._score, (self.observation_key,), parallel=False),
+        ]
+    
+    def _observe(self, tracks: List[Track], ts: float) -> Dict[str, Any]:
+        """Per-frame inputs of access scoring at frame time ts."""
+        return {"person_count": len(tracks), "ts": ts}
+    
+    def _score(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Update the person count history and score the tracked people."""
         # Default result if no people detected
-        if not results.pose_landmarks:
+        if not observation["person_count"]:
             return {
                 "unauthorized_access": False,
                 "confidence": 0.0,
@@ -86,9 +110,8 @@ class AccessDetector:
                 "details": {}
             }
             
-        # Count people (simplified - in a real system we'd use a proper multi-person detector)
-        # Here we're just using a single pose for demonstration
-        person_count = 1 if results.pose_landmarks else 0
+        # Count confirmed person tracks
+        person_count = observation["person_count"]
         
         # Update person history
         self.persons_history.append(person_count)
@@ -99,23 +122,28 @@ class AccessDetector:
         tailgating_score = self._detect_tailgating()
             
         # Get time-based access score
-        time_based_score = self._time_based_access_score()
+        time_based_score = self._time_based_access_score(observation["ts"])
         
         # Determine access type
         access_type = "normal"
-        if tailgating_score > 0.7:
+        if tailgating_score > self.thresholds['tailgating']:
             access_type = "tailgating"
-        elif time_based_score > 0.7:
+        elif time_based_score > self.thresholds['unusual_time']:
             access_type = "unusual_time"
             
+        if self.feature_sink:
+            self.feature_sink(self._prepare_model_input(person_count, tailgating_score, time_based_score))
+            
         # If model exists, use it; otherwise use rule-based detection
-        if self.model:
+        # Read once: the model can be swapped between frames
+        model = self.model
+        if model:
             # Prepare input features
             features = self._prepare_model_input(person_count, tailgating_score, time_based_score)
             
             # Get prediction
-            prediction = self.model.predict(features, verbose=0)
-            unauthorized_access = bool(prediction[0] > 0.6)
+            prediction = model.predict(features, verbose=0)
+            unauthorized_access = bool(prediction[0] > self.thresholds['model'])
             confidence = float(prediction[0])
         else:
             # Use rule-based detection
@@ -134,6 +162,18 @@ class AccessDetector:
             }
         }
     
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Export temporal state for snapshots (the shared person tracker is saved separately)."""
+        return {
+            "persons_history": np.array(self.persons_history, dtype=np.int16),
+            "last_clean_time": np.array(self.last_clean_time, dtype=np.float64)
+        }
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore temporal state exported by get_state()."""
+        self.persons_history = state["persons_history"].tolist()
+        self.last_clean_time = float(state["last_clean_time"])
+    
     def _detect_tailgating(self) -> float:
         """Detect tailgating behavior from person count history."""
         if len(self.persons_history) < 30:  # Need at least 1 second
@@ -154,10 +194,10 @@ class AccessDetector:
         
         return tailgating_score
     
-    def _time_based_access_score(self) -> float:
+    def _time_based_access_score(self, current_time: float) -> float:
         """Calculate time-based access score."""
         # Get current hour (0-23)
-        current_hour = time.localtime().tm_hour
+        current_hour = time.localtime(current_time).tm_hour
         
         # Define normal hours (e.g., 8 AM to 10 PM)
         normal_start = 8
@@ -189,6 +229,7 @@ class AccessDetector:
             combined_score += 0.2
             
         # Determine if access is unauthorized
-        unauthorized_access = combined_score > 0.6 or tailgating_score > 0.7
+        thresholds = self.thresholds
+        unauthorized_access = combined_score > thresholds['confidence'] or tailgating_score > thresholds['tailgating']
         
         return unauthorized_access, combined_score
@@ -1,11 +1,14 @@
 
 import cv2
 import numpy as np
-import tensorflow as tf
 import mediapipe as mp
 import os
 from typing import Dict, Any, List, Tuple
 
+from detection.model_cache import load_shared_model
+from detection.pipeline import Pipeline, Stage, frame_key, rgb_stage, POSE_MIN_HEIGHT
+from detection.thresholds import merge_thresholds
+
 class BehaviorDetector:
     """
     Behavior anomaly detection model.
@@ -16,26 +19,22 @@ class BehaviorDetector:
     3. Unusual group interactions
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, thresholds: Dict[str, float] = None):
         """
         Initialize the behavior detector.
         
         Args:
             model_path: Path to the TensorFlow model (optional)
+            thresholds: Overrides of DEFAULT_THRESHOLDS['behavior'] (optional)
         """
         # Load default model if not specified
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), 
                                      "../models/behavior_detection/model.h5")
         
-        # Initialize MediaPipe pose and holistic
+        # Initialize MediaPipe holistic (pose landmark names come from mp_pose;
+        # no separate pose graph is needed since holistic includes it)
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
         
         self.mp_holistic = mp.solutions.holistic
         self.holistic = self.mp_holistic.Holistic(
@@ -48,7 +47,7 @@ class BehaviorDetector:
         # Load TensorFlow model if exists
         self.model = None
         if os.path.exists(model_path):
-            self.model = tf.keras.models.load_model(model_path)
+            self.model = load_shared_model(model_path)
             print(f"Loaded behavior detection model from {model_path}")
         else:
             print(f"No model found at {model_path}, using rule-based detection")
@@ -57,6 +56,18 @@ class BehaviorDetector:
         self.pose_history = []
         self.max_history_len = 30  # About 1 second at 30fps
         self.position_history = []
+        
+        # Decision thresholds (replaced as a whole when the configuration changes)
+        self.thresholds = merge_thresholds('behavior', thresholds)
+        
+        # Callback receiving each model input vector, e.g. for training feature extraction
+        self.feature_sink = None
+        
+        # Detection pipeline: holistic pose on the reduced frame, then scoring
+        self.color_key = frame_key('color', POSE_MIN_HEIGHT)
+        self.observation_key = "behavior.observation"
+        self.output_key = "behavior.result"
+        self.pipeline = Pipeline(self.pipeline_stages())
             
     def detect(self, frame: np.ndarray) -> Dict[str, Any]:
         """
@@ -74,15 +85,34 @@ class BehaviorDetector:
                 "details": Dict with behavior-specific metrics
             }
         """
-        # Ensure RGB format
-        if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return self.pipeline.run({self.color_key: frame}, [self.output_key])[self.output_key]
+    
+    def pipeline_stages(self) -> List[Stage]:
+        """Stages of behavior detection: colour conversion, holistic pose and scoring."""
+        rgb = rgb_stage(self.color_key)
+        return [
+            rgb,
+            Stage("behavior.holistic", self.holistic.process, (rgb.key,)),
+            Stage(self.observation_key, self._observe, ("behavior.holistic",), parallel=False),
+            Stage(self.output_key, self._score, (self.observation_key,), parallel=False),
+        ]
+    
+    def _observe(self, holistic_results) -> Dict[str, Any]:
+        """Per-frame inputs of behavior scoring, or None if no person was found."""
+        if not holistic_results.pose_landmarks:
+            return None
             
-        # Process with holistic model
-        holistic_results = self.holistic.process(frame)
-        
+        # Extract pose features and person position (for loitering detection)
+        pose_landmarks = holistic_results.pose_landmarks
+        return {
+            "pose_features": self._extract_pose_features(pose_landmarks),
+            "position": self._calculate_position(pose_landmarks)
+        }
+    
+    def _score(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Update pose and position histories and score behavior."""
         # Default result if no people detected
-        if not holistic_results.pose_landmarks:
+        if observation is None:
             return {
                 "unusual_behavior": False,
                 "confidence": 0.0,
@@ -90,18 +120,12 @@ class BehaviorDetector:
                 "details": {}
             }
             
-        # Extract pose landmarks
-        pose_landmarks = holistic_results.pose_landmarks
-        pose_features = self._extract_pose_features(pose_landmarks)
-        
         # Update tracking history
-        self.pose_history.append(pose_features)
+        self.pose_history.append(observation["pose_features"])
         if len(self.pose_history) > self.max_history_len:
             self.pose_history.pop(0)
             
-        # Calculate person position (for loitering detection)
-        position = self._calculate_position(pose_landmarks)
-        self.position_history.append(position)
+        self.position_history.append(observation["position"])
         if len(self.position_history) > 300:  # Track about 10 seconds
             self.position_history.pop(0)
             
@@ -111,19 +135,24 @@ class BehaviorDetector:
         
         # Determine primary behavior type
         behavior_type = "none"
-        if loitering_score > 0.7:
+        if loitering_score > self.thresholds['loitering']:
             behavior_type = "loitering"
-        elif swaying_score > 0.6:
+        elif swaying_score > self.thresholds['swaying']:
             behavior_type = "potential_intoxication"
             
+        if self.feature_sink and len(self.pose_history) >= 10:
+            self.feature_sink(self._prepare_model_input())
+            
         # If model exists, use it; otherwise use rule-based detection
-        if self.model and len(self.pose_history) >= 10:
+        # Read once: the model can be swapped between frames
+        model = self.model
+        if model and len(self.pose_history) >= 10:
             # Prepare input features
             features = self._prepare_model_input()
             
             # Get prediction
-            prediction = self.model.predict(features, verbose=0)
-            unusual_behavior = bool(prediction[0] > 0.6)
+            prediction = model.predict(features, verbose=0)
+            unusual_behavior = bool(prediction[0] > self.thresholds['model'])
             confidence = float(prediction[0])
             
             # Model might also classify behavior type
@@ -145,6 +174,18 @@ class BehaviorDetector:
             }
         }
     
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Export temporal state for snapshots."""
+        return {
+            "pose_history": np.array(self.pose_history, dtype=np.float32).reshape(len(self.pose_history), 27),
+            "position_history": np.array(self.position_history, dtype=np.float32).reshape(-1, 2)
+        }
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore temporal state exported by get_state()."""
+        self.pose_history = state["pose_history"].tolist()
+        self.position_history = [tuple(position) for position in state["position_history"].tolist()]
+    
     def _extract_pose_features(self, pose_landmarks) -> List[float]:
         """Extract relevant features from pose landmarks."""
         # Simplified feature extraction
@@ -206,12 +247,14 @@ class BehaviorDetector:
         area = (x_max - x_min) * (y_max - y_min)
         
         # Small area over long time indicates loitering
-        # The values here would need calibration for your specific environment
-        if area < 0.01 and len(self.position_history) > 150:  # 5+ seconds in small area
-            return 1.0
-        elif area < 0.03 and len(self.position_history) > 240:  # 8+ seconds in slightly larger area
-            return 0.8
-        elif area < 0.05:
+        # The bands need calibration for your specific environment (see DEFAULT_THRESHOLDS)
+        thresholds = self.thresholds
+        frames = len(self.position_history)
+        if area < thresholds['loitering_tight_area'] and frames > thresholds['loitering_tight_frames']:
+            return 1.0  # 5+ seconds in small area by default
+        elif area < thresholds['loitering_wide_area'] and frames > thresholds['loitering_wide_frames']:
+            return 0.8  # 8+ seconds in slightly larger area by default
+        elif area < thresholds['loitering_area']:
             return 0.5
         else:
             return 0.0
@@ -254,6 +297,6 @@ class BehaviorDetector:
         combined_score = max(loitering_score, swaying_score)
         
         # Determine if behavior is unusual
-        unusual_behavior = combined_score > 0.6
+        unusual_behavior = combined_score > self.thresholds['confidence']
         
         return unusual_behavior, combined_score
@@ -2,11 +2,14 @@
 import cv2
 import numpy as np
 import mediapipe as mp
-import tensorflow as tf
 import os
 import time
 from typing import Dict, Any, List, Tuple
 
+from detection.model_cache import load_shared_model
+from detection.pipeline import Pipeline, Stage, frame_key, rgb_stage
+from detection.thresholds import merge_thresholds
+
 class DrowsinessDetector:
     """
     Drowsiness detection model for security staff.
@@ -17,12 +20,13 @@ class DrowsinessDetector:
     3. Temporal patterns of inactivity
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, thresholds: Dict[str, float] = None):
         """
         Initialize the drowsiness detector.
         
         Args:
             model_path: Path to the TensorFlow model (optional)
+            thresholds: Overrides of DEFAULT_THRESHOLDS['drowsiness'] (optional)
         """
         # Load default model if not specified
         if model_path is None:
@@ -46,7 +50,7 @@ class DrowsinessDetector:
         # Load TensorFlow model if exists
         self.model = None
         if os.path.exists(model_path):
-            self.model = tf.keras.models.load_model(model_path)
+            self.model = load_shared_model(model_path)
             print(f"Loaded drowsiness detection model from {model_path}")
         else:
             print(f"No model found at {model_path}, using rule-based detection")
@@ -56,6 +60,18 @@ class DrowsinessDetector:
         self.head_pose_history = []
         self.last_active_time = time.time()
         self.max_history_len = 30  # About 1 second at 30fps
+        
+        # Decision thresholds (replaced as a whole when the configuration changes)
+        self.thresholds = merge_thresholds('drowsiness', thresholds)
+        
+        # Callback receiving each model input vector, e.g. for training feature extraction
+        self.feature_sink = None
+        
+        # Detection pipeline: face mesh on the full-resolution frame, then scoring
+        self.color_key = frame_key('color', None)
+        self.observation_key = "drowsiness.observation"
+        self.output_key = "drowsiness.result"
+        self.pipeline = Pipeline(self.pipeline_stages())
             
     def detect(self, frame: np.ndarray) -> Dict[str, Any]:
         """
@@ -74,15 +90,36 @@ class DrowsinessDetector:
                 "inactivity_duration": float (seconds)
             }
         """
-        # Ensure RGB format
-        if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        inputs = {self.color_key: frame, 'ts': time.time()}
+        return self.pipeline.run(inputs, [self.output_key])[self.output_key]
+    
+    def pipeline_stages(self) -> List[Stage]:
+        """Stages of drowsiness detection: colour conversion, face mesh and scoring."""
+        rgb = rgb_stage(self.color_key)
+        return [
+            rgb,
+            Stage("drowsiness.face_mesh", self.face_mesh.process, (rgb.key,)),
+            Stage(self.observation_key, self._observe, ("drowsiness.face_mesh", "ts"), parallel=False),
+            Stage(self.output_key, self._score, (self.observation_key,), parallel=False),
+        ]
+    
+    def _observe(self, results, ts: float) -> Dict[str, Any]:
+        """Per-frame inputs of drowsiness scoring at frame time ts, or None if no face was found."""
+        if not results.multi_face_landmarks:
+            return None
             
-        # Process with face mesh
-        results = self.face_mesh.process(frame)
-        
+        # Calculate EAR (Eye Aspect Ratio) and head pose
+        face_landmarks = results.multi_face_landmarks[0]
+        return {
+            "ear": self._calculate_ear(face_landmarks),
+            "head_pose": self._calculate_head_pose(face_landmarks),
+            "ts": ts
+        }
+    
+    def _score(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Update eye and head histories and score drowsiness."""
         # Default result if no face detected
-        if not results.multi_face_landmarks:
+        if observation is None:
             return {
                 "is_drowsy": False,
                 "confidence": 0.0,
@@ -91,12 +128,8 @@ class DrowsinessDetector:
                 "inactivity_duration": 0.0
             }
             
-        # Calculate EAR (Eye Aspect Ratio)
-        face_landmarks = results.multi_face_landmarks[0]
-        ear = self._calculate_ear(face_landmarks)
-        
-        # Calculate head pose
-        head_pose = self._calculate_head_pose(face_landmarks)
+        ear = observation["ear"]
+        head_pose = observation["head_pose"]
         
         # Update history
         self.ear_history.append(ear)
@@ -112,21 +145,26 @@ class DrowsinessDetector:
         head_nodding = self._detect_head_nodding()
         
         # Calculate inactivity
-        inactivity_duration = self._calculate_inactivity()
+        inactivity_duration = self._calculate_inactivity(observation["ts"])
         
         # If eyes are open and head is stable, reset inactivity timer
-        if ear > 0.25 and not head_nodding:
-            self.last_active_time = time.time()
+        if ear > self.thresholds['ear_open'] and not head_nodding:
+            self.last_active_time = observation["ts"]
+            
+        if self.feature_sink:
+            self.feature_sink(self._prepare_model_input(ear, head_pose, inactivity_duration))
             
         # Determine if drowsy
         # If model exists, use it; otherwise use rule-based detection
-        if self.model:
+        # Read once: the model can be swapped between frames
+        model = self.model
+        if model:
             # Prepare input features
             features = self._prepare_model_input(ear, head_pose, inactivity_duration)
             
             # Get prediction
-            prediction = self.model.predict(features, verbose=0)
-            is_drowsy = bool(prediction[0] > 0.6)
+            prediction = model.predict(features, verbose=0)
+            is_drowsy = bool(prediction[0] > self.thresholds['model'])
             confidence = float(prediction[0])
         else:
             # Use rule-based detection
@@ -140,6 +178,20 @@ class DrowsinessDetector:
             "inactivity_duration": inactivity_duration
         }
     
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Export temporal state for snapshots."""
+        return {
+            "ear_history": np.array(self.ear_history, dtype=np.float32),
+            "head_pose_history": np.array(self.head_pose_history, dtype=np.float32).reshape(-1, 2),
+            "last_active_time": np.array(self.last_active_time, dtype=np.float64)
+        }
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore temporal state exported by get_state()."""
+        self.ear_history = state["ear_history"].tolist()
+        self.head_pose_history = state["head_pose_history"].tolist()
+        self.last_active_time = float(state["last_active_time"])
+    
     def _calculate_ear(self, face_landmarks) -> float:
         """Calculate Eye Aspect Ratio (EAR)."""
         # Extract coordinates for left and right eyes
@@ -216,11 +268,10 @@ class DrowsinessDetector:
         variance = np.var(head_tilts)
         
         # High variance indicates head movement
-        return variance > 0.01
+        return variance > self.thresholds['nodding_variance']
     
-    def _calculate_inactivity(self) -> float:
+    def _calculate_inactivity(self, current_time: float) -> float:
         """Calculate inactivity duration in seconds."""
-        current_time = time.time()
         return current_time - self.last_active_time
         
     def _prepare_model_input(self, ear: float, head_pose: List[float], inactivity: float):
@@ -231,8 +282,9 @@ class DrowsinessDetector:
     def _rule_based_detection(self, ear: float, head_nodding: bool, inactivity: float) -> Tuple[bool, float]:
         """Rule-based drowsiness detection when no ML model is available."""
         # Thresholds determined through testing
-        ear_threshold = 0.2  # Closed eyes threshold
-        inactivity_threshold = 5.0  # 5 seconds
+        thresholds = self.thresholds
+        ear_threshold = thresholds['ear']  # Closed eyes threshold
+        inactivity_threshold = thresholds['inactivity']
         
         # Calculate confidence based on multiple factors
         ear_factor = max(0, 1 - (ear / ear_threshold)) if ear < ear_threshold else 0
@@ -243,6 +295,6 @@ class DrowsinessDetector:
         confidence = 0.5 * ear_factor + 0.3 * inactivity_factor + 0.2 * nodding_factor
         
         # Determine drowsiness
-        is_drowsy = confidence > 0.6 or ear < ear_threshold or inactivity > inactivity_threshold
+        is_drowsy = confidence > thresholds['confidence'] or ear < ear_threshold or inactivity > inactivity_threshold
         
         return is_drowsy, confidence
@@ -1,11 +1,16 @@
 
 import cv2
 import numpy as np
-import tensorflow as tf
 import mediapipe as mp
 import os
 from typing import Dict, Any, List, Tuple
 
+from detection.model_cache import load_shared_model
+from detection.person_tracker import PersonTracker, Track
+from detection.pipeline import (Pipeline, Stage, ensure_rgb, frame_key, resize_stage,
+                                POSE_MIN_HEIGHT, MOTION_MIN_HEIGHT)
+from detection.thresholds import merge_thresholds
+
 class FightDetector:
     """
     Fight detection model using pose estimation and motion analysis.
@@ -16,45 +21,64 @@ class FightDetector:
     3. Proximity analysis between individuals
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, person_tracker: PersonTracker = None,
+                 thresholds: Dict[str, float] = None):
         """
         Initialize the fight detector.
         
         Args:
             model_path: Path to the TensorFlow model (optional)
+            person_tracker: Multi-person tracker, possibly shared with other
+                detectors (optional, a private one is created if omitted)
+            thresholds: Overrides of DEFAULT_THRESHOLDS['fight'] (optional)
         """
         # Load default model if not specified
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), 
                                      "../models/fight_detection/model.h5")
         
-        # Initialize MediaPipe pose estimation
+        # MediaPipe pose landmark definitions
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        
+        # Person detection, tracking and per-person pose estimation
+        self.person_tracker = person_tracker or PersonTracker()
         
         # Load TensorFlow model if exists
         self.model = None
         if os.path.exists(model_path):
-            self.model = tf.keras.models.load_model(model_path)
+            self.model = load_shared_model(model_path)
             print(f"Loaded fight detection model from {model_path}")
         else:
             print(f"No model found at {model_path}, using rule-based detection")
             
-        # Motion history for tracking
+        # Motion history for tracking (optical flow only compares the last two frames)
         self.motion_history = []
-        self.max_history_len = 10
+        self.max_history_len = 2
+        
+        # Decision thresholds (replaced as a whole when the configuration changes)
+        self.thresholds = merge_thresholds('fight', thresholds)
+        
+        # Callback receiving each model input vector, e.g. for training feature extraction
+        self.feature_sink = None
+        
+        # Detection pipeline: tracking, motion and scoring stages
+        self.color_key = frame_key('color', POSE_MIN_HEIGHT)
+        self.gray_key = frame_key('gray', MOTION_MIN_HEIGHT)
+        self.observation_key = "fight.observation"
+        self.output_key = "fight.result"
+        self.pipeline = Pipeline(self.pipeline_stages())
             
-    def detect(self, frame: np.ndarray) -> Dict[str, Any]:
+    def detect(self, frame: np.ndarray, frame_gray: np.ndarray = None,
+               output_size: Tuple[int, int] = None) -> Dict[str, Any]:
         """
         Detect fights in a video frame.
         
         Args:
             frame: RGB image as numpy array
+            frame_gray: Grayscale frame for motion analysis (optional, e.g. decoded
+                directly by the server); derived from frame when not given
+            output_size: (height, width) that bounding boxes are reported in
+                (optional, defaults to the size of frame)
             
         Returns:
             Dictionary with detection results:
@@ -65,15 +89,55 @@ class FightDetector:
                 "persons_involved": Number of people detected in altercation
             }
         """
-        # Ensure RGB format
-        if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-        # Get pose estimation
-        pose_results = self.pose.process(frame)
+        inputs = {self.color_key: frame, 'size': output_size or frame.shape[:2], 'frame_id': None}
+        if frame_gray is None:
+            frame_gray = cv2.cvtColor(ensure_rgb(frame), cv2.COLOR_RGB2GRAY)
+        inputs[self.gray_key] = frame_gray
+        return self.pipeline.run(inputs, [self.output_key])[self.output_key]
+    
+    def pipeline_stages(self) -> List[Stage]:
+        """
+        Stages of fight detection.
+        
+        Person tracking is keyed by the tracker, so it runs once per frame for
+        all detectors sharing it. Optical flow needs only the downscaled
+        grayscale frame, so it runs concurrently with tracking; its score is
+        dropped in the observation when no poses were found.
+        """
+        tracking = self.person_tracker.stage(self.color_key)
+        motion_frame = resize_stage(self.gray_key, MOTION_MIN_HEIGHT)
+        return [
+            tracking,
+            Stage("fight.features", self._extract_track_features, (tracking.key,), parallel=False),
+            motion_frame,
+            Stage("fight.motion", self._analyze_motion, (motion_frame.key,)),
+            Stage(self.observation_key, self._observe, (tracking.key, "fight.features", "fight.motion", "size"),
+                  parallel=False),
+            Stage(self.output_key, self._score, (self.observation_key,), parallel=False),
+        ]
+    
+    def _extract_track_features(self, tracks: List[Track]) -> List[List[float]]:
+        """Pose features of every tracked person with landmarks."""
+        return [self._extract_pose_features(track.pose_landmarks)
+                for track in tracks if track.pose_landmarks is not None]
+    
+    def _observe(self, tracks: List[Track], landmarks: List[List[float]], motion_score: float,
+                 frame_size: Tuple[int, int]) -> Dict[str, Any]:
+        """Per-frame inputs of fight scoring."""
+        return {
+            "landmarks": landmarks,
+            # Motion without people in view is not evidence of a fight
+            "motion_score": motion_score if landmarks else 0.0,
+            "bounding_boxes": self._get_bounding_boxes(frame_size, tracks) if landmarks else []
+        }
+    
+    def _score(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine pose and motion features into the detection result."""
+        landmarks = observation["landmarks"]
+        motion_score = observation["motion_score"]
         
         # If no poses detected, return negative
-        if not pose_results.pose_landmarks:
+        if not landmarks:
             return {
                 "is_fight": False,
                 "confidence": 0.0,
@@ -81,32 +145,27 @@ class FightDetector:
                 "persons_involved": 0
             }
             
-        # Extract pose landmarks for all detected people
-        landmarks = []
-        if pose_results.pose_landmarks:
-            landmark = pose_results.pose_landmarks
-            landmarks.append(self._extract_pose_features(landmark))
-            
-        # Analyze motion
-        frame_gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-        motion_score = self._analyze_motion(frame_gray)
+        if self.feature_sink:
+            self.feature_sink(self._prepare_model_input(landmarks, motion_score))
             
         # Determine if this is a fight
         # If model exists, use it; otherwise use rule-based detection
-        if self.model:
+        # Read once: the model can be swapped between frames
+        model = self.model
+        if model:
             # Prepare input features from landmarks and motion
             features = self._prepare_model_input(landmarks, motion_score)
             
             # Get prediction
-            prediction = self.model.predict(features, verbose=0)
-            is_fight = bool(prediction[0] > 0.6)
+            prediction = model.predict(features, verbose=0)
+            is_fight = bool(prediction[0] > self.thresholds['model'])
             confidence = float(prediction[0])
         else:
             # Use rule-based detection
             is_fight, confidence = self._rule_based_detection(landmarks, motion_score)
             
         # Get bounding boxes
-        bounding_boxes = self._get_bounding_boxes(frame, pose_results)
+        bounding_boxes = observation["bounding_boxes"]
             
         return {
             "is_fight": is_fight,
@@ -115,6 +174,22 @@ class FightDetector:
             "persons_involved": len(bounding_boxes)
         }
     
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """
+        Export temporal state for snapshots.
+        
+        Only the newest motion frame is kept, since optical flow only ever
+        compares the current frame with the previous one.
+        """
+        state = {}
+        if self.motion_history:
+            state["motion_last"] = self.motion_history[-1]
+        return state
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore temporal state exported by get_state()."""
+        self.motion_history = [state["motion_last"]] if "motion_last" in state else []
+    
     def _extract_pose_features(self, landmark) -> List[float]:
         """Extract relevant features from pose landmarks."""
         # Simplified feature extraction
@@ -152,15 +227,14 @@ class FightDetector:
         if len(self.motion_history) < 2:
             return 0.0
             
-        # Calculate optical flow between consecutive frames
+        # Calculate optical flow between consecutive frames (already
+        # downscaled by the pipeline's resize stage)
         prev_frame = self.motion_history[-2]
         curr_frame = self.motion_history[-1]
         
-        # Resize frames if they're too large (for performance)
-        if prev_frame.shape[0] > 480:
-            scale = 480 / prev_frame.shape[0]
-            prev_frame = cv2.resize(prev_frame, None, fx=scale, fy=scale)
-            curr_frame = cv2.resize(curr_frame, None, fx=scale, fy=scale)
+        # Frame size changed (new camera resolution); start over from this frame
+        if prev_frame.shape != curr_frame.shape:
+            return 0.0
         
         # Calculate dense optical flow
         flow = cv2.calcOpticalFlowFarneback(
@@ -186,7 +260,7 @@ class FightDetector:
     def _rule_based_detection(self, landmarks: List[List[float]], motion_score: float) -> Tuple[bool, float]:
         """Rule-based fight detection when no ML model is available."""
         # These thresholds would ideally be determined through analysis
-        motion_threshold = 0.4
+        motion_threshold = self.thresholds['motion']
         
         # High motion is a strong indicator of fighting
         if motion_score > motion_threshold:
@@ -196,26 +270,23 @@ class FightDetector:
         # Low motion, likely not a fight
         return False, motion_score
         
-    def _get_bounding_boxes(self, frame: np.ndarray, pose_results) -> List[List[int]]:
-        """Get bounding boxes around detected people."""
+    def _get_bounding_boxes(self, frame_size: Tuple[int, int], tracks: List[Track]) -> List[List[int]]:
+        """Get bounding boxes around tracked people."""
         bounding_boxes = []
         
-        if pose_results.pose_landmarks:
-            # Get frame dimensions
-            h, w, _ = frame.shape
-            
-            # Get all landmark points
-            landmarks = pose_results.pose_landmarks.landmark
-            
-            # Find min/max coordinates to create bounding box
-            x_min = min(landmark.x for landmark in landmarks if landmark.visibility > 0.5)
-            y_min = min(landmark.y for landmark in landmarks if landmark.visibility > 0.5)
-            x_max = max(landmark.x for landmark in landmarks if landmark.visibility > 0.5)
-            y_max = max(landmark.y for landmark in landmarks if landmark.visibility > 0.5)
+        # Get frame dimensions
+        h, w = frame_size
+        
+        # Tracker boxes are in pixels of the frame it processed
+        track_h, track_w = self.person_tracker.frame_size
+        scale_x, scale_y = w / max(track_w, 1), h / max(track_h, 1)
+        
+        for track in tracks:
+            x_min, y_min, x_max, y_max = track.box
             
-            # Convert to pixel coordinates
-            x_min, y_min = int(x_min * w), int(y_min * h)
-            x_max, y_max = int(x_max * w), int(y_max * h)
+            # Convert to output pixel coordinates
+            x_min, y_min = int(x_min * scale_x), int(y_min * scale_y)
+            x_max, y_max = int(x_max * scale_x), int(y_max * scale_y)
             
             # Add some padding
             padding = 20
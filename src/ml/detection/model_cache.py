@@ -0,0 +1,47 @@
+import os
+import threading
+import tensorflow as tf
+
+_models = {}
+_lock = threading.Lock()
+
+def _key(model_path: str) -> str:
+    # Detectors build paths like ".../detection/../models/x/model.h5"
+    return os.path.realpath(model_path)
+
+
+def load_shared_model(model_path: str):
+    """
+    Load a Keras model once per process and share it between detector instances.
+
+    Detectors are created per camera stream, and their weights are read-only
+    at inference time, so every stream can use the same model object.
+    """
+    with _lock:
+        model = _models.get(_key(model_path))
+        if model is None:
+            model = tf.keras.models.load_model(model_path)
+            _models[_key(model_path)] = model
+        return model
+
+
+def replace_shared_model(model_path: str, model):
+    """
+    Make `model` the shared model for a path, so detectors created from now on use it.
+
+    Args:
+        model_path: Model file the model was loaded from
+        model: The new Keras model, or None to forget the path
+    """
+    with _lock:
+        if model is None:
+            _models.pop(_key(model_path), None)
+        else:
+            _models[_key(model_path)] = model
+
+
+def shared_model_bytes() -> dict:
+    """Weight memory of every cached model, by model path."""
+    with _lock:
+        models = dict(_models)
+    return {path: int(sum(w.nbytes for w in model.get_weights())) for path, model in models.items()}
@@ -0,0 +1,321 @@
+import cv2
+import numpy as np
+import mediapipe as mp
+import os
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from detection.pipeline import Stage
+
+class PoseLandmark(NamedTuple):
+    """Single pose landmark in full-frame normalized coordinates."""
+    x: float
+    y: float
+    z: float
+    visibility: float
+
+
+class PoseLandmarks:
+    """
+    Pose landmarks of one tracked person.
+
+    Mirrors the `.landmark[index]` access of MediaPipe results so the
+    detectors' existing feature extraction works on tracked poses unchanged.
+    """
+
+    def __init__(self, landmark: List[PoseLandmark]):
+        self.landmark = landmark
+
+
+class Track:
+    """A tracked person with a stable ID and per-track histories."""
+
+    def __init__(self, track_id: int, box: np.ndarray, history_len: int):
+        self.track_id = track_id
+        self.box = box  # [x1, y1, x2, y2] in pixels of the tracked frame
+        self.hits = 1
+        self.missed = 0
+        self.pose_landmarks: Optional[PoseLandmarks] = None
+        self.pose_age = 0
+        self.position_history = deque(maxlen=history_len)
+        self.pose_history = deque(maxlen=30)
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        x1, y1, x2, y2 = self.box
+        return (float(x1 + x2) / 2, float(y1 + y2) / 2)
+
+
+def _landmarks_array(landmarks: PoseLandmarks) -> np.ndarray:
+    return np.array([tuple(lm) for lm in landmarks.landmark], dtype=np.float32)
+
+
+def _landmarks_from_array(values: np.ndarray) -> PoseLandmarks:
+    return PoseLandmarks([PoseLandmark(*(float(v) for v in row)) for row in values])
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between two sets of [x1, y1, x2, y2] boxes."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+class PersonTracker:
+    """
+    Multi-person detection and tracking stage shared by the detectors.
+
+    Each frame goes through:
+    1. Person detection (MobileNet-SSD if available, otherwise OpenCV HOG)
+    2. IoU association to existing tracks, which keeps track IDs stable
+    3. Pose estimation on person crops, only for tracks whose pose is stale
+
+    The tracker caches the result for the last frame it saw, so several
+    detectors sharing one tracker pay for a single update per frame.
+    """
+
+    def __init__(self, model_path: str = None, iou_threshold: float = 0.3,
+                 max_missed: int = 15, min_hits: int = 2, pose_refresh_interval: int = 5,
+                 history_len: int = 300):
+        """
+        Initialize the person tracker.
+
+        Args:
+            model_path: Directory with the MobileNet-SSD person model (optional)
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_missed: Frames a track survives without a matching detection
+            min_hits: Matches needed before a track counts as confirmed
+            pose_refresh_interval: Frames between pose updates of a track
+            history_len: Length of each track's position history
+        """
+        # Load default model if not specified
+        if model_path is None:
+            model_path = os.path.join(os.path.dirname(__file__),
+                                      "../models/person_detection")
+
+        prototxt = os.path.join(model_path, "deploy.prototxt")
+        weights = os.path.join(model_path, "mobilenet_ssd.caffemodel")
+        self.net = None
+        if os.path.exists(prototxt) and os.path.exists(weights):
+            self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+            print(f"Loaded person detection model from {model_path}")
+        else:
+            print(f"No model found at {model_path}, using HOG person detection")
+            self.hog = cv2.HOGDescriptor()
+            self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+        # One static-mode pose graph is shared by all person crops
+        self.mp_pose = mp.solutions.pose
+        self.pose = self.mp_pose.Pose(
+            static_image_mode=True,
+            model_complexity=1,
+            min_detection_confidence=0.5
+        )
+
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.pose_refresh_interval = pose_refresh_interval
+        self.history_len = history_len
+
+        self.tracks: List[Track] = []
+        self.next_id = 1
+        self.frame_size = (0, 0)
+        self._last_frame = None
+        self._last_frame_id = None
+        self._lock = threading.Lock()
+
+    def update(self, frame: np.ndarray, frame_id: bytes = None) -> List[Track]:
+        """
+        Advance the tracker by one frame.
+
+        Calling update() again with the same frame returns the cached tracks
+        instead of reprocessing it. Frames are matched by frame_id when one
+        is given (the same upload posted to several endpoints is decoded
+        once per request), otherwise by object identity.
+
+        Args:
+            frame: BGR or RGB image as numpy array
+            frame_id: Fingerprint of the encoded frame (optional, see DecodedFrame.fingerprint)
+
+        Returns:
+            Confirmed tracks visible in this frame
+        """
+        with self._lock:
+            same = frame_id == self._last_frame_id if frame_id is not None else frame is self._last_frame
+            if not same:
+                # Keep a reference so the identity check stays valid
+                self._last_frame, self._last_frame_id = frame, frame_id
+                self._step(frame)
+            return self.confirmed_tracks()
+
+    def shrink_histories(self, history_len: int):
+        """Keep only the newest history_len positions (and poses) of every track, now and for new tracks."""
+        with self._lock:
+            self.history_len = history_len
+            for track in self.tracks:
+                track.position_history = deque(track.position_history, maxlen=history_len)
+                track.pose_history = deque(track.pose_history, maxlen=min(history_len, track.pose_history.maxlen))
+
+    def stage(self, frame_key: str) -> Stage:
+        """
+        Pipeline stage running update() on a frame variant.
+
+        The key names this tracker, so detectors sharing it share the stage.
+        It reads the "frame_id" input (None when the caller has no encoded frame).
+        """
+        return Stage(f"tracks[{id(self):x}]<{frame_key}", self.update, (frame_key, 'frame_id'))
+
+    def confirmed_tracks(self) -> List[Track]:
+        """Tracks matched in the current frame that have enough hits."""
+        return [t for t in self.tracks if t.missed == 0 and t.hits >= self.min_hits]
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """
+        Export tracks and their histories as flat arrays for snapshots.
+
+        Per-track histories have different lengths, so they are stored
+        concatenated along with each track's length.
+        """
+        tracks = self.tracks
+        no_pose = np.full((33, 4), np.nan, dtype=np.float32)
+        return {
+            "next_id": np.array(self.next_id, dtype=np.int64),
+            "frame_size": np.array(self.frame_size, dtype=np.int32),
+            "ids": np.array([t.track_id for t in tracks], dtype=np.int64),
+            "boxes": np.array([t.box for t in tracks], dtype=np.float32).reshape(-1, 4),
+            "counters": np.array([[t.hits, t.missed, t.pose_age] for t in tracks], dtype=np.int32).reshape(-1, 3),
+            "landmarks": np.array([_landmarks_array(t.pose_landmarks) if t.pose_landmarks else no_pose
+                                   for t in tracks], dtype=np.float32).reshape(-1, 33, 4),
+            "position_lengths": np.array([len(t.position_history) for t in tracks], dtype=np.int32),
+            "positions": np.array([p for t in tracks for p in t.position_history], dtype=np.float32).reshape(-1, 2),
+            "pose_lengths": np.array([len(t.pose_history) for t in tracks], dtype=np.int32),
+            "poses": np.array([_landmarks_array(p) for t in tracks for p in t.pose_history],
+                              dtype=np.float32).reshape(-1, 33, 4),
+        }
+
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore tracks exported by get_state()."""
+        with self._lock:
+            self.next_id = int(state["next_id"])
+            self.frame_size = tuple(int(v) for v in state["frame_size"])
+            self.tracks = []
+            self._last_frame = None
+            self._last_frame_id = None
+
+            positions = np.split(state["positions"], np.cumsum(state["position_lengths"])[:-1])
+            poses = np.split(state["poses"], np.cumsum(state["pose_lengths"])[:-1])
+            for i, track_id in enumerate(state["ids"]):
+                track = Track(int(track_id), state["boxes"][i], self.history_len)
+                track.hits, track.missed, track.pose_age = (int(v) for v in state["counters"][i])
+                if not np.isnan(state["landmarks"][i]).any():
+                    track.pose_landmarks = _landmarks_from_array(state["landmarks"][i])
+                track.position_history.extend(tuple(p) for p in positions[i].tolist())
+                track.pose_history.extend(_landmarks_from_array(p) for p in poses[i])
+                self.tracks.append(track)
+
+    def _step(self, frame: np.ndarray):
+        # Ensure RGB format
+        if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w = frame.shape[:2]
+        self.frame_size = (h, w)
+
+        detections = self._detect_people(frame)
+        self._associate(detections)
+
+        # Pose only for tracks that need refreshing
+        for track in self.tracks:
+            if track.missed > 0:
+                continue
+            track.pose_age += 1
+            if track.pose_landmarks is None or track.pose_age >= self.pose_refresh_interval:
+                landmarks = self._estimate_pose(frame, track.box)
+                if landmarks is not None:
+                    track.pose_landmarks = landmarks
+                    track.pose_age = 0
+
+            cx, cy = track.center
+            track.position_history.append((cx / w, cy / h))
+            if track.pose_landmarks is not None:
+                track.pose_history.append(track.pose_landmarks)
+
+    def _detect_people(self, frame: np.ndarray) -> np.ndarray:
+        """Detect person boxes as an (N, 4) array of [x1, y1, x2, y2] pixels."""
+        h, w = frame.shape[:2]
+
+        if self.net is not None:
+            blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 0.007843,
+                                         (300, 300), 127.5, swapRB=True)
+            self.net.setInput(blob)
+            output = self.net.forward()[0, 0]
+            # Class 15 is "person" in the VOC label set
+            people = output[(output[:, 1] == 15) & (output[:, 2] > 0.5)]
+            boxes = people[:, 3:7] * np.array([w, h, w, h])
+            return np.clip(boxes, 0, [w, h, w, h]).astype(np.float32)
+
+        # HOG is expensive at full resolution; detect on a downscaled copy
+        scale = min(1.0, 640 / w)
+        small = cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1.0 else frame
+        rects, _ = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return np.zeros((0, 4), dtype=np.float32)
+        rects = np.array(rects, dtype=np.float32) / scale
+        rects[:, 2:] += rects[:, :2]
+        return rects
+
+    def _associate(self, detections: np.ndarray):
+        """Greedy IoU matching of detections to tracks."""
+        matched_tracks = set()
+        unmatched = set(range(len(detections)))
+
+        if self.tracks and len(detections):
+            track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32)
+            ious = _iou(track_boxes, detections)
+            for flat in np.argsort(-ious, axis=None):
+                ti, di = np.unravel_index(flat, ious.shape)
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di not in unmatched:
+                    continue
+                track = self.tracks[ti]
+                track.box = detections[di]
+                track.hits += 1
+                track.missed = 0
+                matched_tracks.add(ti)
+                unmatched.discard(di)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        for di in sorted(unmatched):
+            self.tracks.append(Track(self.next_id, detections[di], self.history_len))
+            self.next_id += 1
+
+    def _estimate_pose(self, frame: np.ndarray, box: np.ndarray) -> Optional[PoseLandmarks]:
+        """Run pose on a padded person crop and map landmarks back to the frame."""
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = box
+        pad_x, pad_y = 0.1 * (x2 - x1), 0.1 * (y2 - y1)
+        x1, y1 = int(max(0, x1 - pad_x)), int(max(0, y1 - pad_y))
+        x2, y2 = int(min(w, x2 + pad_x)), int(min(h, y2 + pad_y))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+
+        results = self.pose.process(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+        if not results.pose_landmarks:
+            return None
+
+        cw, ch = x2 - x1, y2 - y1
+        return PoseLandmarks([
+            PoseLandmark((x1 + lm.x * cw) / w, (y1 + lm.y * ch) / h, lm.z, lm.visibility)
+            for lm in results.pose_landmarks.landmark
+        ])
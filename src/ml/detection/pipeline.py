@@ -0,0 +1,205 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Minimum frame height each consumer needs. None means full resolution.
+# MediaPipe pose and holistic resize to 256px internally, so 480px input loses
+# nothing; face mesh works on small face crops and keeps the full frame.
+POSE_MIN_HEIGHT = 480
+MOTION_MIN_HEIGHT = 480
+
+class Stage(NamedTuple):
+    """
+    One node of a detection pipeline.
+
+    Stages are identified by key: when several detectors declare a stage
+    with the same key, it runs once per frame and its value is shared.
+    Stateful stages (trackers, MediaPipe graphs, histories) therefore put
+    their owner in the key, so they are only shared by detectors that share
+    the underlying object.
+    """
+    key: str
+    fn: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    # Heavy stages run on the pipeline thread pool alongside independent
+    # branches; cheap ones (feature extraction, scoring) run inline
+    parallel: bool = True
+
+
+def frame_key(kind: str, min_height: Optional[int]) -> str:
+    """Key of a decoded frame variant, e.g. "color@480" or "gray@full"."""
+    return f"{kind}@{min_height or 'full'}"
+
+
+def ensure_rgb(frame: np.ndarray) -> np.ndarray:
+    """Convert a BGR frame to RGB, detected by comparing channel means."""
+    if frame.shape[2] == 3 and frame[..., 0].mean() > frame[..., 2].mean():
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return frame
+
+
+def rgb_stage(source: str) -> Stage:
+    """Colour conversion of a decoded frame variant."""
+    return Stage(f"rgb<{source}", ensure_rgb, (source,))
+
+
+def resize_stage(source: str, max_height: int) -> Stage:
+    """Downscale a frame variant to at most max_height rows, keeping its aspect ratio."""
+    def resize(frame: np.ndarray) -> np.ndarray:
+        if frame.shape[0] <= max_height:
+            return frame
+        scale = max_height / frame.shape[0]
+        return cv2.resize(frame, None, fx=scale, fy=scale)
+    return Stage(f"{source}>{max_height}", resize, (source,))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Stage each thread is currently running, by thread ident, for the sampling profiler
+active_stages: Dict[int, str] = {}
+
+def _run_stage(key: str, fn: Callable[..., Any], *args) -> Any:
+    ident = threading.get_ident()
+    outer = active_stages.get(ident)
+    active_stages[ident] = key
+    try:
+        return fn(*args)
+    finally:
+        if outer is None:
+            del active_stages[ident]
+        else:
+            active_stages[ident] = outer
+
+
+def stage_owner(key: str) -> str:
+    """Detector a stage belongs to ("fight.motion" -> "fight"); shared stages are "tracking" or "decode"."""
+    if key.startswith("tracks["):
+        return "tracking"
+    if "." in key:
+        return key.split(".", 1)[0]
+    return "decode"
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="pipeline")
+        return _executor
+
+
+class Pipeline:
+    """
+    Per-frame DAG of detection stages.
+
+    The graph is the union of the stages declared by a set of detectors,
+    deduplicated by key, so adding a detector only adds its own stages to
+    the per-frame cost. run() evaluates just the stages the requested
+    outputs depend on, starting every stage as soon as its inputs are ready;
+    independent branches (e.g. face mesh, holistic and person tracking with
+    optical flow) run concurrently on a shared thread pool. OpenCV,
+    MediaPipe and TensorFlow release the GIL while they work.
+    """
+
+    def __init__(self, stages: Iterable[Stage], executor: ThreadPoolExecutor = None):
+        """
+        Args:
+            stages: Stages of all participating detectors; duplicate keys keep the first
+            executor: Thread pool for parallel stages (optional, a process-wide pool by default)
+        """
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            self.stages.setdefault(stage.key, stage)
+        self.executor = executor
+        self._plans: Dict[Tuple[Tuple[str, ...], frozenset], List[str]] = {}
+
+    def plan(self, targets: Iterable[str], provided: Iterable[str] = ()) -> List[str]:
+        """
+        Stages needed for the targets, in dependency order.
+
+        Args:
+            targets: Output keys
+            provided: Keys supplied as inputs; their stages are skipped
+
+        Returns:
+            Stage keys in topological order
+        """
+        cache_key = (tuple(targets), frozenset(provided))
+        order = self._plans.get(cache_key)
+        if order is not None:
+            return order
+
+        order = []
+        done = set(cache_key[1])
+        visiting = set()
+
+        def visit(key: str):
+            if key in done:
+                return
+            if key in visiting:
+                raise ValueError(f"Pipeline cycle through stage {key}")
+            stage = self.stages.get(key)
+            if stage is None:
+                raise KeyError(f"No pipeline stage or input provides {key}")
+            visiting.add(key)
+            for dependency in stage.inputs:
+                visit(dependency)
+            visiting.discard(key)
+            done.add(key)
+            order.append(key)
+
+        for target in cache_key[0]:
+            visit(target)
+        self._plans[cache_key] = order
+        return order
+
+    def run(self, inputs: Dict[str, Any], targets: Iterable[str]) -> Dict[str, Any]:
+        """
+        Evaluate the graph for one frame.
+
+        Args:
+            inputs: Values of source keys (e.g. {"encoded": DecodedFrame}); a
+                stage key given here is treated as already computed
+            targets: Output keys to compute
+
+        Returns:
+            Every computed value by key, including the targets
+        """
+        values = dict(inputs)
+        remaining = list(self.plan(targets, values))
+        running = {}
+        executor = self.executor or _shared_executor()
+
+        try:
+            while remaining or running:
+                ready = [key for key in remaining if all(dep in values for dep in self.stages[key].inputs)]
+                for key in ready:
+                    remaining.remove(key)
+
+                # Offload all but one parallel stage; the calling thread takes the last
+                offload = [key for key in ready if self.stages[key].parallel]
+                inline = [key for key in ready if not self.stages[key].parallel]
+                if offload:
+                    inline.append(offload.pop())
+                for key in offload:
+                    stage = self.stages[key]
+                    running[executor.submit(_run_stage, key, stage.fn, *(values[dep] for dep in stage.inputs))] = key
+                for key in inline:
+                    stage = self.stages[key]
+                    values[key] = _run_stage(key, stage.fn, *(values[dep] for dep in stage.inputs))
+
+                finished = [future for future in running if future.done()]
+                if not finished and not inline and running:
+                    finished = wait(running, return_when=FIRST_COMPLETED).done
+                for future in finished:
+                    values[running.pop(future)] = future.result()
+        finally:
+            # Never leave stages of this frame running into the next one
+            if running:
+                wait(running)
+
+        return values
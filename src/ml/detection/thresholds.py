@@ -0,0 +1,64 @@
+import math
+from typing import Any, Dict
+
+# Decision thresholds of each detector's model head and rule-based fallback.
+# The rule engine applies the same values to batched streams. Live values can
+# be changed at runtime (runtime/config_registry.py), which swaps in a new
+# dict per detector rather than editing one in place.
+DEFAULT_THRESHOLDS = {
+    'fight': {
+        'model': 0.6,                    # Model output above which a frame is a fight
+        'motion': 0.4,                   # Optical-flow motion score above which a frame is a fight
+    },
+    'drowsiness': {
+        'model': 0.6,
+        'confidence': 0.6,               # Combined rule score above which the guard is drowsy
+        'ear': 0.2,                      # Eye aspect ratio below which eyes count as closed
+        'ear_open': 0.25,                # EAR above which (without nodding) the guard counts as active
+        'inactivity': 5.0,               # Seconds without activity that count as drowsy
+        'nodding_variance': 0.01,        # Head tilt variance over 10 frames that counts as nodding
+    },
+    'behavior': {
+        'model': 0.6,
+        'confidence': 0.6,               # Loitering or swaying score above which behavior is unusual
+        'loitering': 0.7,                # Score above which the type is reported as loitering
+        'swaying': 0.6,                  # Score above which the type is reported as potential intoxication
+        'loitering_tight_area': 0.01,    # Loitering bands: movement area (fraction of the frame)...
+        'loitering_tight_frames': 150,   # ...held for more than this many frames scores 1.0
+        'loitering_wide_area': 0.03,
+        'loitering_wide_frames': 240,    # Scores 0.8
+        'loitering_area': 0.05,          # Any stay in a smaller area scores 0.5
+    },
+    'access': {
+        'model': 0.6,
+        'confidence': 0.6,               # Combined rule score above which access is unauthorized
+        'tailgating': 0.7,               # Tailgating score that is unauthorized on its own
+        'unusual_time': 0.7,             # Time score above which the type is reported as unusual time
+    },
+}
+
+
+def merge_thresholds(detector: str, overrides: Dict[str, Any] = None) -> Dict[str, float]:
+    """
+    A detector's default thresholds with some of them replaced.
+
+    Args:
+        detector: Detector name
+        overrides: {threshold name: value} (optional)
+
+    Returns:
+        New {threshold name: value} dict
+
+    Raises:
+        ValueError: On an unknown threshold or a negative, non-finite or non-numeric value
+    """
+    defaults = DEFAULT_THRESHOLDS[detector]
+    merged = dict(defaults)
+    for key, value in (overrides or {}).items():
+        if key not in defaults:
+            raise ValueError(f"Unknown {detector} threshold '{key}'")
+        # NaN would make every comparison False and silently switch the rule off
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            raise ValueError(f"{detector} threshold '{key}' must be a finite non-negative number")
+        merged[key] = float(value)
+    return merged
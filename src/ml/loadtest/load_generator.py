@@ -0,0 +1,379 @@
+import argparse
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from runtime.protocol import (DETECTORS, FRAMES_CONTENT_TYPE, RESULTS_CONTENT_TYPE, FrameRequest,
+                              decode_results, encode_frames)
+
+logger = logging.getLogger('hostel-security-ai')
+
+# What mlConnection.ts sends per captured frame: the four detector endpoints in parallel
+BROWSER_ENDPOINTS = ['/api/detect/fight', '/api/detect/drowsiness', '/api/detect/behavior', '/api/detect/access']
+
+# Responses meaning the server deliberately turned the frame away
+SHED_STATUSES = (429, 503)
+
+# Keep-alive connections of each sending thread, one per server; cameras share
+# the executor's threads, so a step opens at most one connection per thread
+_thread_connections = threading.local()
+
+def _connection(scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+    connections = getattr(_thread_connections, 'connections', None)
+    if connections is None:
+        connections = _thread_connections.connections = {}
+    connection = connections.get((scheme, netloc))
+    if connection is None:
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connections[(scheme, netloc)] = cls(netloc, timeout=timeout)
+    return connection
+
+
+def load_video_frames(path: str, width: int, height: int, max_frames: int = 300,
+                      quality: int = 95) -> List[bytes]:
+    """
+    Read and JPEG-encode the first frames of a video, resized as a camera would send them.
+
+    Frames are encoded up front so the generator's own CPU goes to sending,
+    not to encoding.
+    """
+    capture = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frame = cv2.resize(frame, (width, height))
+            frames.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    finally:
+        capture.release()
+    if not frames:
+        raise ValueError(f"No frames read from {path}")
+    return frames
+
+
+def synthetic_frames(width: int, height: int, count: int = 60, quality: int = 95, seed: int = 0) -> List[bytes]:
+    """
+    JPEG frames of a textured scene with moving blobs.
+
+    Noise keeps the JPEG size close to real footage, and motion keeps the
+    optical-flow and tracking stages busy.
+    """
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        for k in range(3):
+            x = int((0.2 + 0.3 * k + 0.1 * np.sin(2 * np.pi * (i / count + k / 3))) * width)
+            y = int((0.5 + 0.2 * np.cos(2 * np.pi * (i / count + k / 5))) * height)
+            cv2.ellipse(frame, (x, y), (width // 16, height // 5), 0, 0, 360, (60 + 60 * k, 90, 200 - 50 * k), -1)
+        frame = cv2.add(frame, rng.integers(0, 12, frame.shape, dtype=np.uint8))
+        frames.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return frames
+
+
+def multipart_body(fields: Dict[str, str], frame: bytes) -> Tuple[bytes, str]:
+    """Encode a frame upload the way the browser's FormData does."""
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="frame"; filename="blob"\r\n'
+             f'Content-Type: image/jpeg\r\n\r\n'.encode() + frame + b'\r\n']
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class LoadStats:
+    """Thread-safe request and frame outcomes of one load step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.latencies: List[float] = []
+            self.requests = 0
+            self.errors = 0
+            self.shed = 0
+            self.frames_sent = 0
+            self.frames_done = 0
+            self.frames_skipped = 0
+            self.status_counts: Dict[str, int] = {}
+
+    def request(self, status: Any, latency: float):
+        with self._lock:
+            self.requests += 1
+            self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+            if status in SHED_STATUSES:
+                self.shed += 1
+            elif not isinstance(status, int) or status >= 400:
+                self.errors += 1
+            else:
+                self.latencies.append(latency)
+
+    def frame(self, sent: bool, done: bool = False):
+        with self._lock:
+            if sent:
+                self.frames_sent += 1
+                self.frames_done += done
+            else:
+                self.frames_skipped += 1
+
+    def summary(self, offered_fps: float) -> Dict[str, Any]:
+        """Throughput, latency percentiles (ms) and error and shed rates since the last reset."""
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            latencies = np.array(self.latencies) * 1000
+            percentiles = (np.percentile(latencies, [50, 90, 95, 99]).round(1).tolist()
+                           if len(latencies) else [None] * 4)
+            return {
+                "elapsed": round(elapsed, 1),
+                "offered_fps": round(offered_fps, 1),
+                "achieved_fps": round(self.frames_done / elapsed, 1) if elapsed else 0.0,
+                "requests_per_second": round(self.requests / elapsed, 1) if elapsed else 0.0,
+                "latency_ms": dict(zip(("p50", "p90", "p95", "p99"), percentiles),
+                                   max=round(float(latencies.max()), 1) if len(latencies) else None),
+                "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+                "shed_rate": round(self.shed / self.requests, 4) if self.requests else 0.0,
+                "skipped_frame_rate": round(self.frames_skipped / (self.frames_sent + self.frames_skipped), 4)
+                if self.frames_sent + self.frames_skipped else 0.0,
+                "statuses": dict(self.status_counts),
+            }
+
+
+class Camera(threading.Thread):
+    """
+    One simulated camera.
+
+    Like the dashboard, a camera captures frames on a timer and posts each
+    frame to every endpoint in parallel, as multipart uploads or, in
+    binary mode, as one packed frames message. In closed-loop mode (the browser's
+    behaviour) a capture is skipped while the previous frame is still in
+    flight; in open-loop mode frames are sent on schedule regardless, so
+    requests queue up on an overloaded server. Latency is measured from the
+    frame's scheduled capture time, so time a request spends waiting for a
+    sending thread counts too (no coordinated omission).
+    """
+
+    def __init__(self, camera_id: int, base_url: str, endpoints: List[str], frames: List[bytes], fps: float,
+                 stats: LoadStats, executor: ThreadPoolExecutor, stop: threading.Event,
+                 open_loop: bool = False, binary: bool = False, timeout: float = 30.0):
+        super().__init__(name=f"camera-{camera_id}", daemon=True)
+        self.camera_id = camera_id
+        self.url = urlsplit(base_url)
+        self.endpoints = endpoints
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.stats = stats
+        self.executor = executor
+        self.stop = stop
+        self.open_loop = open_loop
+        self.binary = binary
+        self.timeout = timeout
+        self.fields = {"camera_id": str(camera_id), "camera_name": f"Load camera {camera_id}",
+                       "location": "Load test", "delta": "1"}
+
+    def _post(self, endpoint: str, frame: bytes, captured: float) -> bool:
+        if self.binary:
+            body = encode_frames([FrameRequest(self.fields["camera_id"], self.fields["camera_name"],
+                                               self.fields["location"], None, frame)], list(DETECTORS), delta=True)
+            headers = {'Content-Type': FRAMES_CONTENT_TYPE, 'Accept': RESULTS_CONTENT_TYPE,
+                       'X-Camera-Id': self.fields["camera_id"]}
+        else:
+            body, content_type = multipart_body(self.fields, frame)
+            headers = {'Content-Type': content_type}
+        connection = _connection(self.url.scheme, self.url.netloc, self.timeout)
+        try:
+            connection.request('POST', self.url.path.rstrip('/') + endpoint, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+            status = response.status
+            if self.binary and status == 200:
+                # Frames carry their own status (e.g. 503 for a rejected stream)
+                status = decode_results(data)[0].status
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            status = type(e).__name__
+        self.stats.request(status, time.perf_counter() - captured)
+        return status == 200
+
+    def run(self):
+        # Cameras start at random phases, as real ones are not synchronised
+        index = random.randrange(len(self.frames))
+        next_capture = time.perf_counter() + random.uniform(0, self.interval)
+        in_flight = []
+        while not self.stop.is_set():
+            delay = next_capture - time.perf_counter()
+            if delay > 0 and self.stop.wait(delay):
+                break
+            captured = next_capture
+            # Browser timers drift by a few percent
+            next_capture += self.interval * random.uniform(0.97, 1.03)
+
+            in_flight = [futures for futures in in_flight if not all(future.done() for future in futures)]
+            if in_flight and not self.open_loop:
+                self.stats.frame(sent=False)
+                continue
+
+            frame = self.frames[index % len(self.frames)]
+            index += 1
+            in_flight.append(self._send(frame, captured))
+
+    def _send(self, frame: bytes, captured: float) -> list:
+        """Post one frame to every endpoint; the frame counts as done when all succeed."""
+        futures = [self.executor.submit(self._post, endpoint, frame, captured) for endpoint in self.endpoints]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def finished(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.stats.frame(sent=True, done=all(future.result() for future in futures))
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return futures
+
+
+def run_step(base_url: str, cameras: int, fps: float, duration: float, frames: List[List[bytes]],
+             endpoints: List[str], warmup: float = 5.0, open_loop: bool = False, binary: bool = False,
+             first_camera_id: int = 1000) -> Dict[str, Any]:
+    """
+    Drive `cameras` simulated cameras for one measurement window.
+
+    Args:
+        base_url: Server URL, e.g. http://127.0.0.1:5000
+        cameras: Number of cameras
+        fps: Capture rate of each camera
+        duration: Measured seconds (after warmup)
+        frames: Encoded frame sequences; cameras take them round-robin
+        endpoints: Paths each frame is posted to
+        warmup: Seconds of load before measuring, so streams exist and caches are warm
+        open_loop: Send on schedule even when the previous frame has not returned
+        binary: Send packed frames messages instead of multipart uploads
+        first_camera_id: camera_id of the first camera
+
+    Returns:
+        LoadStats summary plus the step's camera count
+    """
+    stats = LoadStats()
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=cameras * len(endpoints) * (4 if open_loop else 1),
+                                  thread_name_prefix="load")
+    threads = [Camera(first_camera_id + i, base_url, endpoints, frames[i % len(frames)], fps,
+                      stats, executor, stop, open_loop, binary) for i in range(cameras)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(warmup)
+        stats.reset()
+        time.sleep(duration)
+        summary = stats.summary(cameras * fps)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        executor.shutdown(wait=True)
+    summary["cameras"] = cameras
+    return summary
+
+
+def is_saturated(summary: Dict[str, Any], latency_slo_ms: float, max_error_rate: float) -> bool:
+    """Whether a step missed its offered frame rate, the p99 latency objective or the error budget."""
+    p99 = summary["latency_ms"]["p99"]
+    return (summary["achieved_fps"] < 0.95 * summary["offered_fps"] or p99 is None or p99 > latency_slo_ms or
+            summary["error_rate"] + summary["shed_rate"] > max_error_rate)
+
+
+def _format(summary: Dict[str, Any]) -> str:
+    latency = summary["latency_ms"]
+    return (f"{summary['cameras']:>4} cameras  offered {summary['offered_fps']:>7.1f} fps  "
+            f"achieved {summary['achieved_fps']:>7.1f} fps  {summary['requests_per_second']:>7.1f} req/s  "
+            f"p50 {latency['p50']} ms  p99 {latency['p99']} ms  max {latency['max']} ms  "
+            f"errors {summary['error_rate']:.2%}  shed {summary['shed_rate']:.2%}  "
+            f"skipped {summary['skipped_frame_rate']:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate camera streams against a detection server and find its saturation point.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Server (or stream router) base URL")
+    parser.add_argument('--cameras', type=int, default=4, help="Cameras in the first (or only) step")
+    parser.add_argument('--max-cameras', type=int, default=None, help="Ramp up to this many cameras")
+    parser.add_argument('--step', type=int, default=4, help="Cameras added per ramp step")
+    parser.add_argument('--fps', type=float, default=5.0, help="Frames per second per camera")
+    parser.add_argument('--width', type=int, default=1280, help="Frame width")
+    parser.add_argument('--height', type=int, default=720, help="Frame height")
+    parser.add_argument('--quality', type=int, default=95, help="JPEG quality (the dashboard uses 95)")
+    parser.add_argument('--video', action='append', default=[], help="Video file to replay (repeatable; synthetic frames if omitted)")
+    parser.add_argument('--endpoints', default=None,
+                        help="Comma-separated paths each frame is posted to (default: the four detector "
+                             "endpoints, or /api/detect/all with --binary)")
+    parser.add_argument('--binary', action='store_true', help="Use the binary frames protocol")
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds per step")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Unmeasured seconds at the start of each step")
+    parser.add_argument('--open-loop', action='store_true', help="Do not skip frames while the previous one is in flight")
+    parser.add_argument('--latency-slo', type=float, default=1000.0, help="p99 latency objective in ms")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="Error plus shed rate budget")
+    parser.add_argument('--output', help="Write all step summaries to this JSON file")
+    args = parser.parse_args()
+    if args.step < 1:
+        parser.error("--step must be at least 1")
+    if args.max_cameras is not None and args.max_cameras < args.cameras:
+        parser.error("--max-cameras must be at least --cameras")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.video:
+        frames = [load_video_frames(path, args.width, args.height, quality=args.quality) for path in args.video]
+    else:
+        frames = [synthetic_frames(args.width, args.height, quality=args.quality, seed=seed) for seed in range(4)]
+    if args.endpoints:
+        endpoints = [endpoint for endpoint in args.endpoints.split(',') if endpoint]
+    else:
+        endpoints = ['/api/detect/all'] if args.binary else BROWSER_ENDPOINTS
+    logger.info(f"Frames of {np.mean([len(f) for sequence in frames for f in sequence]) / 1024:.0f} KiB "
+                f"to {', '.join(endpoints)}")
+
+    steps = []
+    saturation = None
+    for cameras in range(args.cameras, (args.max_cameras or args.cameras) + 1, args.step):
+        summary = run_step(args.url, cameras, args.fps, args.duration, frames, endpoints,
+                           warmup=args.warmup, open_loop=args.open_loop, binary=args.binary)
+        steps.append(summary)
+        logger.info(_format(summary))
+        if is_saturated(summary, args.latency_slo, args.max_error_rate):
+            saturation = cameras
+            break
+
+    sustained = [step["cameras"] for step in steps if not is_saturated(step, args.latency_slo, args.max_error_rate)]
+    if saturation is not None:
+        logger.info(f"Saturated at {saturation} cameras; sustained {max(sustained) if sustained else 0} "
+                    f"cameras at {args.fps} fps within a {args.latency_slo:.0f} ms p99")
+    else:
+        logger.info(f"Not saturated up to {steps[-1]['cameras']} cameras at {args.fps} fps")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"config": vars(args), "steps": steps, "saturated_at": saturation,
+                       "max_sustained_cameras": max(sustained) if sustained else 0}, f, indent=2)
+
+
+if __name__ == '__main__':
+    # Run from src/ml as: python -m loadtest.load_generator --url http://127.0.0.1:5000 --cameras 4 --max-cameras 64 --step 4
+    main()
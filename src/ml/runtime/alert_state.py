@@ -0,0 +1,232 @@
+import threading
+import time
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple
+
+from runtime.alerts import ALERT_THRESHOLDS, build_alert
+
+class AlertPolicy(NamedTuple):
+    """Debounce settings for one detector's incidents."""
+    open_threshold: float      # Confidence a positive verdict needs to start an incident
+    close_threshold: float     # Confidence below which an open incident starts closing
+    min_duration: float        # Seconds the condition must hold before the incident opens
+    close_delay: float         # Seconds below close_threshold before the incident closes
+    cooldown: float            # Seconds after closing during which no new incident opens
+    update_interval: float     # Minimum seconds between update transitions
+
+
+DEFAULT_POLICIES = {
+    'fight': AlertPolicy(ALERT_THRESHOLDS['fight'], 0.45, 0.5, 2.0, 30.0, 5.0),
+    'drowsiness': AlertPolicy(ALERT_THRESHOLDS['drowsiness'], 0.5, 2.0, 3.0, 60.0, 15.0),
+    'behavior': AlertPolicy(ALERT_THRESHOLDS['behavior'], 0.45, 2.0, 3.0, 60.0, 15.0),
+    'access': AlertPolicy(ALERT_THRESHOLDS['access'], 0.45, 0.5, 2.0, 30.0, 10.0),
+}
+
+IDLE = 'idle'
+PENDING = 'pending'
+OPEN = 'open'
+CLOSING = 'closing'
+
+class _IncidentState:
+    def __init__(self):
+        self.phase = IDLE
+        self.since = 0.0          # Start of the current phase
+        self.cooldown_until = 0.0
+        self.incident = 0
+        self.opened_at = 0.0
+        self.last_update = 0.0
+        self.peak_confidence = 0.0
+        self.reported_peak = 0.0    # Peak confidence as of the last open/update event
+        self.severity = None
+        self.last_ts = 0.0          # Timestamp of the last observed frame
+        self.last_seen = 0.0        # Wall-clock time that frame arrived
+
+
+class AlertTracker:
+    """
+    Per-stream, per-detector incident state machine.
+
+    Detectors return a verdict on every frame; this turns that stream of
+    verdicts into incidents and reports only their transitions:
+
+    - open: the condition held for min_duration (and no cooldown is active)
+    - update: the incident is still open and its severity or peak confidence
+      changed, at most once per update_interval
+    - close: confidence stayed below close_threshold for close_delay
+
+    Using a lower close than open threshold (hysteresis) keeps an incident
+    from flapping when confidence hovers around the alert threshold.
+
+    Transitions are timed by the frames' capture timestamps. A stream that
+    stops sending frames cannot close its own incidents, so expire() (run
+    periodically after start()) closes them once no frame has arrived for
+    close_delay.
+    """
+
+    def __init__(self, policies: Dict[str, AlertPolicy] = None):
+        """
+        Args:
+            policies: Debounce settings per detector (optional, defaults to DEFAULT_POLICIES)
+        """
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        self._states: Dict[Tuple[str, str], _IncidentState] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def observe(self, stream_id: str, detector: str, result: Dict[str, Any],
+                now: float = None) -> List[Dict[str, Any]]:
+        """
+        Feed one detector result and collect the resulting transitions.
+
+        Args:
+            stream_id: Camera/stream the frame came from
+            detector: Detector name
+            result: The detector's result dictionary
+            now: Capture time of the frame (defaults to the current time)
+
+        Returns:
+            List of transition events (usually empty)
+        """
+        arrived = time.time()
+        now = arrived if now is None else now
+        policy = self.policies[detector]
+        confidence = float(result.get('confidence', 0.0))
+        alert = build_alert(detector, result, policy.open_threshold)
+
+        with self._lock:
+            state = self._states.setdefault((stream_id, detector), _IncidentState())
+            state.last_ts, state.last_seen = now, arrived
+            return self._advance(state, policy, stream_id, detector, result, alert, confidence, now)
+
+    def _advance(self, state: _IncidentState, policy: AlertPolicy, stream_id: str, detector: str,
+                 result: Dict[str, Any], alert: Optional[Dict[str, Any]], confidence: float,
+                 now: float) -> List[Dict[str, Any]]:
+        triggered = alert is not None and confidence >= policy.open_threshold
+        sustained = confidence >= policy.close_threshold
+
+        if state.phase == IDLE:
+            if triggered and now >= state.cooldown_until:
+                state.phase, state.since = PENDING, now
+                state.peak_confidence = confidence
+            else:
+                return []
+
+        if state.phase == PENDING:
+            if not triggered:
+                state.phase = IDLE
+                return []
+            state.peak_confidence = max(state.peak_confidence, confidence)
+            if now - state.since < policy.min_duration:
+                return []
+            state.phase = OPEN
+            state.incident += 1
+            state.opened_at = state.last_update = now
+            state.reported_peak = state.peak_confidence
+            state.severity = alert["severity"]
+            return [self._event('open', state, stream_id, detector, confidence, now, alert)]
+
+        if state.phase == CLOSING and sustained:
+            state.phase = OPEN
+
+        if state.phase == OPEN:
+            if not sustained:
+                state.phase, state.since = CLOSING, now
+                return []
+            severity = alert["severity"] if alert else state.severity
+            state.peak_confidence = max(state.peak_confidence, confidence)
+            changed = state.peak_confidence > state.reported_peak or severity != state.severity
+            if changed and now - state.last_update >= policy.update_interval:
+                state.last_update = now
+                state.reported_peak = state.peak_confidence
+                state.severity = severity
+                return [self._event('update', state, stream_id, detector, confidence, now, alert)]
+            return []
+
+        # CLOSING and still below the close threshold
+        if now - state.since < policy.close_delay:
+            return []
+        state.phase = IDLE
+        state.cooldown_until = now + policy.cooldown
+        return [self._event('close', state, stream_id, detector, confidence, now, None)]
+
+    @staticmethod
+    def _event(kind: str, state: _IncidentState, stream_id: str, detector: str, confidence: float,
+               now: float, alert: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "event": kind,
+            "incident_id": f"{stream_id}:{detector}:{state.incident}",
+            "stream_id": stream_id,
+            "detector": detector,
+            "confidence": confidence,
+            "peak_confidence": state.peak_confidence,
+            "started_at": state.opened_at,
+            "duration": now - state.opened_at,
+            "alert": alert,
+        }
+
+    def expire(self, now: float = None) -> List[Dict[str, Any]]:
+        """
+        Close the incidents of streams that stopped sending frames.
+
+        An open or closing incident is closed once no frame of its stream has
+        arrived for its detector's close_delay, and its cooldown starts; a
+        pending one is dropped. Idleness is measured by arrival time, so
+        clients whose clocks differ from the server's are treated alike.
+
+        Args:
+            now: Current wall-clock time (defaults to time.time())
+
+        Returns:
+            Close events, timed in the stream's frame clock (last frame
+            timestamp plus the time since it arrived)
+        """
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            for (stream_id, detector), state in self._states.items():
+                idle = now - state.last_seen
+                if state.phase == IDLE or idle < self.policies[detector].close_delay:
+                    continue
+                if state.phase == PENDING:
+                    state.phase = IDLE
+                    continue
+                frame_now = state.last_ts + idle
+                state.phase = IDLE
+                state.cooldown_until = frame_now + self.policies[detector].cooldown
+                events.append(self._event('close', state, stream_id, detector, 0.0, frame_now, None))
+        return events
+
+    def start(self, interval: float = 1.0, on_expired: Callable[[List[Dict[str, Any]]], Any] = None):
+        """
+        Run expire() every interval seconds in a background thread.
+
+        Args:
+            interval: Seconds between sweeps
+            on_expired: Callback(events) for the close events of each sweep (optional)
+        """
+        def loop():
+            while not self._stop.wait(interval):
+                events = self.expire()
+                if events and on_expired:
+                    on_expired(events)
+        threading.Thread(target=loop, name="incident-expiry", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def set_open_threshold(self, detector: str, threshold: float):
+        """
+        Change the confidence at which a detector's results become alerts and open incidents.
+
+        Raises:
+            ValueError: If the threshold is not above the detector's close threshold
+        """
+        policy = self.policies[detector]
+        if not policy.close_threshold < threshold <= 1.0:
+            raise ValueError(f"{detector} alert threshold must be above {policy.close_threshold} and at most 1")
+        self.policies[detector] = policy._replace(open_threshold=threshold)
+
+    def reset(self, stream_id: str):
+        """Forget all incident state of a stream (e.g. when it moves elsewhere)."""
+        with self._lock:
+            for key in [key for key in self._states if key[0] == stream_id]:
+                del self._states[key]
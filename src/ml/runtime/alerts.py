@@ -0,0 +1,99 @@
+from typing import Dict, Any, Optional
+
+# Confidence a positive verdict needs before it becomes an alert. These match
+# the thresholds the dashboard applied client-side in mlConnection.ts.
+ALERT_THRESHOLDS = {
+    'fight': 0.65,
+    'drowsiness': 0.7,
+    'behavior': 0.6,
+    'access': 0.65,
+}
+
+# Frontend AlertType for each detector
+ALERT_TYPES = {
+    'fight': 'altercation',
+    'drowsiness': 'staff',
+    'behavior': 'behavioral',
+    'access': 'unauthorized',
+}
+
+def is_positive(detector: str, result: Dict[str, Any], threshold: float = None) -> bool:
+    """Whether a detector result is a positive verdict above its alert threshold (default ALERT_THRESHOLDS)."""
+    flag = {
+        'fight': 'is_fight',
+        'drowsiness': 'is_drowsy',
+        'behavior': 'unusual_behavior',
+        'access': 'unauthorized_access',
+    }[detector]
+    if threshold is None:
+        threshold = ALERT_THRESHOLDS[detector]
+    return bool(result.get(flag)) and result.get('confidence', 0.0) > threshold
+
+
+def build_alert(detector: str, result: Dict[str, Any], threshold: float = None) -> Optional[Dict[str, Any]]:
+    """
+    Turn a detector result into an alert record.
+
+    Args:
+        detector: Detector name
+        result: The detector's result dictionary
+        threshold: Alert threshold (optional, defaults to ALERT_THRESHOLDS)
+
+    Returns:
+        Dictionary with type, title, description, severity and confidence,
+        or None if the result does not warrant an alert
+    """
+    if not is_positive(detector, result, threshold):
+        return None
+
+    confidence = float(result.get('confidence', 0.0))
+    alert = {
+        "type": ALERT_TYPES[detector],
+        "detector": detector,
+        "confidence": confidence,
+    }
+
+    if detector == 'fight':
+        alert["title"] = "Physical altercation detected"
+        alert["description"] = (f"AI detected aggressive physical movement patterns between "
+                                f"{result.get('persons_involved', 0)} individuals")
+        alert["severity"] = 'high' if confidence > 0.85 else 'medium'
+
+    elif detector == 'drowsiness':
+        inactivity = result.get('inactivity_duration', 0.0)
+        state = 'sleeping' if inactivity > 30 else 'drowsy'
+        alert["title"] = "Guard inattention detected"
+        alert["description"] = (f"Security staff appears to be {state} at post. "
+                                f"No activity detected for {round(inactivity)} seconds.")
+        alert["severity"] = 'high' if inactivity > 60 else 'medium'
+
+    elif detector == 'behavior':
+        behavior_type = result.get('behavior_type')
+        if behavior_type == 'loitering':
+            alert["title"] = "Suspicious loitering detected"
+            alert["description"] = "Individual observed spending excessive time in area without clear purpose."
+            alert["severity"] = 'low'
+        elif behavior_type == 'potential_intoxication':
+            alert["title"] = "Possible intoxication detected"
+            alert["description"] = "AI detected unsteady movement and swaying indicative of potential intoxication."
+            alert["severity"] = 'medium'
+        else:
+            alert["title"] = "Unusual behavior detected"
+            alert["description"] = "AI detected behavioral patterns that require attention."
+            alert["severity"] = 'low'
+
+    else:
+        access_type = result.get('access_type')
+        if access_type == 'tailgating':
+            alert["title"] = "Tailgating detected"
+            alert["description"] = (f"{result.get('person_count', 0)} individuals entered through access "
+                                    f"point at once. Possible tailgating behavior.")
+        elif access_type == 'unusual_time':
+            alert["title"] = "After-hours access detected"
+            alert["description"] = "Entry detected during restricted hours."
+        else:
+            alert["title"] = "Unauthorized access detected"
+            alert["description"] = "Suspicious entry detected by security system."
+        alert["severity"] = 'medium'
+
+    return alert
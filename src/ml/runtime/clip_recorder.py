@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger('hostel-security-ai')
+
+class FrameRingBuffer:
+    """
+    Bounded buffer of a stream's most recent compressed frames.
+
+    Frames are kept as the original JPEG bytes (no decode, no copy), and the
+    oldest are evicted once either the time window or the byte budget is
+    exceeded. A frame larger than the whole budget is not kept.
+    """
+
+    def __init__(self, max_seconds: float, max_bytes: int):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.frames: deque = deque()
+        self.nbytes = 0
+        # Keep every stride-th frame; raised to downsample under memory pressure
+        self.stride = 1
+        self._skipped = 0
+
+    def append(self, ts: float, data: bytes) -> Optional[Tuple[float, bytes]]:
+        """
+        Buffer a frame.
+
+        Returns:
+            The stored (ts, data) entry, or None if the frame was not kept
+            (a repeat of the last frame, skipped by the stride or over budget)
+        """
+        # The browser posts the same frame to every detector endpoint; keep it once
+        if self.frames and len(self.frames[-1][1]) == len(data) and self.frames[-1][1] == data:
+            return None
+        if len(data) > self.max_bytes:
+            return None
+        self._skipped += 1
+        if self._skipped < self.stride:
+            return None
+        self._skipped = 0
+        entry = (ts, data)
+        self.frames.append(entry)
+        self.nbytes += len(data)
+        while self.frames and (self.nbytes > self.max_bytes or ts - self.frames[0][0] > self.max_seconds):
+            _, old = self.frames.popleft()
+            self.nbytes -= len(old)
+        return entry
+
+    def since(self, ts: float) -> List[Tuple[float, bytes]]:
+        return [frame for frame in self.frames if frame[0] >= ts]
+
+    def downsample(self):
+        """Halve the buffered frame rate, keeping the same time window."""
+        self.stride *= 2
+        self.frames = deque(list(self.frames)[::-1][::2][::-1])
+        self.nbytes = sum(len(data) for _, data in self.frames)
+
+
+class _Capture:
+    def __init__(self, path: str, stream_id: str, incident_id: str, trigger_ts: float,
+                 end_ts: float, frames: List[Tuple[float, bytes]]):
+        self.path = path
+        self.stream_id = stream_id
+        self.incident_id = incident_id
+        self.trigger_ts = trigger_ts
+        self.end_ts = end_ts
+        self.frames = frames
+        self.last_frame_ts = frames[-1][0] if frames else trigger_ts
+
+
+class ClipRecorder:
+    """
+    Incident clip capture from per-stream pre-event ring buffers.
+
+    Every uploaded frame is appended to its stream's ring buffer as the
+    original compressed bytes. When an incident triggers, the buffered
+    pre-event frames and the following post-event frames are written by a
+    background thread as an MJPEG stream (concatenated JPEGs, playable with
+    ffmpeg/VLC) plus a JSON index of frame timestamps and offsets. Nothing is
+    decoded or re-encoded, so the inference path only pays for a deque append.
+    """
+
+    def __init__(self, clip_dir: str, pre_seconds: float = 10.0, post_seconds: float = 10.0,
+                 max_buffer_bytes: int = 32 * 1024 * 1024, stale_after: float = 5.0):
+        """
+        Args:
+            clip_dir: Directory clips are written to
+            pre_seconds: Footage kept before the trigger
+            post_seconds: Footage captured after the trigger
+            max_buffer_bytes: Memory budget of each stream's ring buffer
+            stale_after: Seconds without frames after which a capture is written early
+        """
+        self.clip_dir = clip_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_buffer_bytes = max_buffer_bytes
+        self.stale_after = stale_after
+        os.makedirs(clip_dir, exist_ok=True)
+
+        self._buffers: Dict[str, FrameRingBuffer] = {}
+        self._captures: List[_Capture] = []
+        self._lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="clip-writer", daemon=True)
+        self._writer.start()
+
+    def add_frame(self, stream_id: str, data: bytes, ts: float = None):
+        """Buffer a compressed frame and feed any captures waiting for post-event footage."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            buffer = self._buffers.get(stream_id)
+            if buffer is None:
+                buffer = self._buffers[stream_id] = FrameRingBuffer(self.pre_seconds, self.max_buffer_bytes)
+            entry = buffer.append(ts, data)
+
+            if entry is not None:
+                for capture in self._captures:
+                    if capture.stream_id == stream_id and entry[0] > capture.last_frame_ts:
+                        capture.frames.append(entry)
+                        capture.last_frame_ts = entry[0]
+            self._finish_captures(ts)
+
+    def trigger(self, stream_id: str, incident_id: str, ts: float = None) -> Optional[str]:
+        """
+        Start capturing a clip around an incident.
+
+        Returns:
+            Path the clip will be written to, or None if the stream has no footage
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            buffer = self._buffers.get(stream_id)
+            if buffer is None or not buffer.frames:
+                return None
+            name = f"{incident_id}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(ts))}"
+            path = os.path.join(self.clip_dir, "".join(c if c.isalnum() or c in "-_" else "_" for c in name))
+            self._captures.append(_Capture(path, stream_id, incident_id, ts, ts + self.post_seconds,
+                                           buffer.since(ts - self.pre_seconds)))
+        return path + ".mjpeg"
+
+    def _finish_captures(self, now: float):
+        """Hand completed or stalled captures to the writer (caller holds the lock)."""
+        pending = []
+        for capture in self._captures:
+            if capture.last_frame_ts >= capture.end_ts or now - capture.last_frame_ts > self.stale_after:
+                self._writes.put(capture)
+            else:
+                pending.append(capture)
+        self._captures = pending
+
+    def _write_loop(self):
+        while True:
+            try:
+                capture = self._writes.get(timeout=1.0)
+            except queue.Empty:
+                # Streams that stopped sending frames still get their clips written
+                with self._lock:
+                    self._finish_captures(time.time())
+                continue
+            try:
+                self._write(capture)
+            except OSError as e:
+                logger.error(f"Error writing clip {capture.path}: {e}")
+
+    def _write(self, capture: _Capture):
+        index = []
+        offset = 0
+        with open(capture.path + ".mjpeg", "wb") as f:
+            for ts, data in capture.frames:
+                f.write(data)
+                index.append({"ts": ts, "offset": offset, "size": len(data)})
+                offset += len(data)
+        with open(capture.path + ".json", "w") as f:
+            json.dump({
+                "stream_id": capture.stream_id,
+                "incident_id": capture.incident_id,
+                "trigger_ts": capture.trigger_ts,
+                "frames": index,
+            }, f)
+        logger.info(f"Wrote {len(index)}-frame clip for incident {capture.incident_id}")
+
+    def downsample(self, stream_id: str, max_stride: int = 8) -> bool:
+        """
+        Halve a stream's buffered frame rate to save memory.
+
+        Returns:
+            False if the stream has no buffer or is already at max_stride
+        """
+        with self._lock:
+            buffer = self._buffers.get(stream_id)
+            if buffer is None or buffer.stride >= max_stride:
+                return False
+            buffer.downsample()
+            return True
+
+    def release(self, stream_id: str):
+        """Drop a stream's buffered frames."""
+        with self._lock:
+            self._buffers.pop(stream_id, None)
+
+    def buffered_bytes(self, stream_id: str = None) -> int:
+        """Memory held by ring buffers (one stream, or all streams)."""
+        with self._lock:
+            if stream_id is not None:
+                buffer = self._buffers.get(stream_id)
+                return buffer.nbytes if buffer else 0
+            return sum(buffer.nbytes for buffer in self._buffers.values())
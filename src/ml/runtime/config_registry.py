@@ -0,0 +1,343 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from detection.model_cache import replace_shared_model
+from detection.thresholds import DEFAULT_THRESHOLDS, merge_thresholds
+from runtime.alert_state import DEFAULT_POLICIES
+
+logger = logging.getLogger('hostel-security-ai')
+
+DETECTORS = ('fight', 'drowsiness', 'behavior', 'access')
+
+class VersionConflict(Exception):
+    """A settings update was based on a configuration version that is no longer current."""
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(size, mtime in ns) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def warm_up(model, runs: int = 2):
+    """Run predictions on zeros so the first real frame does not pay for building the predict function."""
+    shapes = model.input_shape if isinstance(model.input_shape, list) else [model.input_shape]
+    inputs = [np.zeros((1,) + tuple(dim or 1 for dim in shape[1:])) for shape in shapes]
+    for _ in range(runs):
+        model.predict(inputs if len(inputs) > 1 else inputs[0], verbose=0)
+
+
+def default_config() -> Dict[str, Any]:
+    return {
+        "version": 0,
+        "enabled": True,
+        "detectors": {
+            name: {
+                "enabled": True,
+                "alert_threshold": DEFAULT_POLICIES[name].open_threshold,
+                "thresholds": dict(DEFAULT_THRESHOLDS[name]),
+            }
+            for name in DETECTORS
+        },
+    }
+
+
+def _flag(value: Any, what: str) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError(f"{what} must be true or false")
+    return value
+
+
+def validate_config(raw: Any) -> Dict[str, Any]:
+    """
+    Check a configuration and fill in defaults for everything it leaves out.
+
+    Args:
+        raw: Parsed JSON, {"enabled", "detectors": {name: {"enabled",
+            "alert_threshold", "thresholds": {...}}}}; every key is optional
+
+    Returns:
+        A complete configuration (without version)
+
+    Raises:
+        ValueError: On unknown keys or detectors and out-of-range values
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Configuration must be a JSON object")
+    unknown = set(raw) - {"version", "enabled", "detectors"}
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    detectors = raw.get("detectors") or {}
+    if not isinstance(detectors, dict) or set(detectors) - set(DETECTORS):
+        raise ValueError(f"Detectors must be an object keyed by {', '.join(DETECTORS)}")
+
+    config = {"enabled": _flag(raw.get("enabled", True), "enabled"), "detectors": {}}
+    for name in DETECTORS:
+        entry = detectors.get(name) or {}
+        if not isinstance(entry, dict):
+            raise ValueError(f"Settings of {name} must be an object")
+        unknown = set(entry) - {"enabled", "alert_threshold", "thresholds"}
+        if unknown:
+            raise ValueError(f"Unknown {name} settings: {', '.join(sorted(unknown))}")
+
+        policy = DEFAULT_POLICIES[name]
+        alert_threshold = entry.get("alert_threshold", policy.open_threshold)
+        if (isinstance(alert_threshold, bool) or not isinstance(alert_threshold, (int, float))
+                or not policy.close_threshold < alert_threshold <= 1.0):
+            raise ValueError(f"{name} alert_threshold must be above {policy.close_threshold} and at most 1")
+        if not isinstance(entry.get("thresholds") or {}, dict):
+            raise ValueError(f"{name} thresholds must be an object")
+
+        config["detectors"][name] = {
+            "enabled": _flag(entry.get("enabled", True), f"{name} enabled"),
+            "alert_threshold": float(alert_threshold),
+            "thresholds": merge_thresholds(name, entry.get("thresholds")),
+        }
+    return config
+
+
+class ConfigRegistry:
+    """
+    Versioned detector configuration and models, changed without a restart.
+
+    The configuration is a JSON file of enabled flags, alert thresholds and
+    decision thresholds (see detection/thresholds.py). It changes through
+    update() (the settings API) or by editing the file, which a background
+    thread polls along with every detector's model file. Each accepted
+    change bumps the version. A configuration is validated as a whole
+    before it is applied; an invalid file is logged and the running
+    configuration stays.
+
+    Thresholds are applied by giving every live detector, the rule engine
+    and the alert tracker a new dict per detector; detectors in worker
+    processes get theirs through the workers' inboxes. A changed model file is
+    loaded on the watcher thread once its size and modification time have
+    stayed the same for one poll, so a file still being copied is not read.
+    It is warmed up with a prediction before it replaces the shared model and
+    then each live stream's model, between two of that stream's frames.
+    Detector histories are kept, so streams carry on through the change with
+    no warm-up gap. A model that fails to load or predict is reported in
+    settings() and the previous model stays in service. Deleting a model
+    file switches its detector to rule-based detection.
+    """
+
+    def __init__(self, path: str, model_paths: Dict[str, str], registry=None, alert_tracker=None,
+                 poll_interval: float = 5.0, workers=None):
+        """
+        Args:
+            path: Configuration file (need not exist; it is written on the first update)
+            model_paths: Model file of each detector, as the detectors load it
+            registry: StreamRegistry whose streams are reconfigured (optional,
+                None when detectors run in worker processes)
+            alert_tracker: AlertTracker whose alert thresholds are configured (optional)
+            poll_interval: Seconds between checks of the configuration and model files
+            workers: DetectorProcessGroup whose workers' thresholds are configured
+                (optional; their models are loaded when the workers start)
+        """
+        self.path = path
+        self.model_paths = model_paths
+        self.registry = registry
+        self.alert_tracker = alert_tracker
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.config = default_config()
+        self._config_signature = None
+        self._models = {name: {"path": model_path, "signature": _file_signature(model_path), "pending": None,
+                               "version": 1 if os.path.exists(model_path) else 0,
+                               "loaded_at": None, "error": None}
+                        for name, model_path in model_paths.items()}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._load_file()
+        self._apply(self.config)
+
+    @property
+    def version(self) -> int:
+        return self.config["version"]
+
+    def enabled(self, name: str) -> bool:
+        """Whether a detector is switched on."""
+        config = self.config
+        return config["enabled"] and config["detectors"][name]["enabled"]
+
+    def settings(self) -> Dict[str, Any]:
+        """The running configuration with its version, the defaults, the detector mode and each model's state."""
+        return dict(copy.deepcopy(self.config),
+                    defaults=default_config()["detectors"],
+                    mode="workers" if self.workers is not None else "in-process",
+                    models={name: {key: value for key, value in state.items() if key not in ("signature", "pending")}
+                            for name, state in self._models.items()})
+
+    def update(self, changes: Dict[str, Any], expected_version: int = None) -> Dict[str, Any]:
+        """
+        Change part of the configuration, save it and apply it to live streams.
+
+        Args:
+            changes: Settings to change, in the configuration format; detector
+                thresholds not mentioned keep their current values
+            expected_version: Version the changes were based on (optional);
+                the update is refused if the configuration changed since
+
+        Returns:
+            The new settings()
+
+        Raises:
+            ValueError: If the resulting configuration is invalid
+            VersionConflict: If expected_version is not the current version
+        """
+        with self._lock:
+            if expected_version is not None and expected_version != self.version:
+                raise VersionConflict(f"Settings changed since version {expected_version} "
+                                      f"(now version {self.version})")
+            if not isinstance(changes, dict):
+                raise ValueError("Settings must be a JSON object")
+            unknown = set(changes) - {"enabled", "detectors"}
+            if unknown:
+                raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+            merged = copy.deepcopy(self.config)
+            if "enabled" in changes:
+                merged["enabled"] = changes["enabled"]
+            detectors = changes.get("detectors") or {}
+            if not isinstance(detectors, dict):
+                raise ValueError("Detectors must be an object")
+            for name, entry in detectors.items():
+                if name not in merged["detectors"] or not isinstance(entry, dict):
+                    raise ValueError(f"Unknown detector '{name}'")
+                target = merged["detectors"][name]
+                for key, value in entry.items():
+                    if key == "thresholds" and isinstance(value, dict):
+                        target[key] = dict(target[key], **value)
+                    else:
+                        target[key] = value
+
+            config = validate_config(merged)
+            config["version"] = self.version + 1
+            self._write_file(config)
+            self._apply(config)
+        logger.info(f"Detector settings updated to version {config['version']}")
+        return self.settings()
+
+    def configure(self, context):
+        """Give a newly created stream's detectors the running thresholds."""
+        config = self.config
+        for name, detector in context.detectors.items():
+            detector.thresholds = config["detectors"][name]["thresholds"]
+
+    # Watching
+
+    def start(self):
+        def loop():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    logger.error(f"Error checking detector settings and models: {e}")
+        threading.Thread(target=loop, name="config-watcher", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """Apply a changed configuration file and swap in changed model files."""
+        with self._lock:
+            if _file_signature(self.path) != self._config_signature and self._load_file():
+                self._apply(self.config)
+                logger.info(f"Detector settings reloaded from {self.path} (version {self.version})")
+
+        for name, state in self._models.items():
+            signature = _file_signature(state["path"])
+            if signature == state["signature"]:
+                state["pending"] = None
+            elif signature != state["pending"]:
+                # Wait for the file to stop changing
+                state["pending"] = signature
+            else:
+                self._swap_model(name, signature)
+
+    def _load_file(self) -> bool:
+        """Read the configuration file into self.config; False if it is missing or invalid."""
+        signature = _file_signature(self.path)
+        self._config_signature = signature
+        if signature is None:
+            return False
+        try:
+            with open(self.path) as f:
+                raw = json.load(f)
+            config = validate_config(raw)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring invalid detector settings in {self.path}: {e}")
+            return False
+        # Hand edits need not bump the version
+        version = raw.get("version")
+        config["version"] = max(version if isinstance(version, int) else 0, self.version + 1)
+        self.config = config
+        return True
+
+    def _write_file(self, config: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._config_signature = _file_signature(self.path)
+
+    def _apply(self, config: Dict[str, Any]):
+        # Publish first: streams created from now on pick up the new thresholds in configure()
+        self.config = config
+        thresholds = {name: entry["thresholds"] for name, entry in config["detectors"].items()}
+        if self.alert_tracker is not None:
+            for name, entry in config["detectors"].items():
+                self.alert_tracker.set_open_threshold(name, entry["alert_threshold"])
+        if self.workers is not None:
+            self.workers.set_thresholds(thresholds)
+        if self.registry is None:
+            return
+        if self.registry.rule_engine is not None:
+            self.registry.rule_engine.thresholds = thresholds
+        for stream_id in self.registry.stream_ids():
+            context = self.registry.peek(stream_id)
+            if context is not None:
+                for name, detector in context.detectors.items():
+                    detector.thresholds = thresholds[name]
+
+    def _swap_model(self, name: str, signature: Optional[Tuple[int, int]]):
+        state = self._models[name]
+        state["signature"], state["pending"] = signature, None
+        model = None
+        if signature is not None:
+            try:
+                started = time.perf_counter()
+                model = tf.keras.models.load_model(state["path"])
+                warm_up(model)
+            except Exception as e:
+                state["error"] = f"{type(e).__name__}: {e}"
+                logger.error(f"Keeping the current {name} model; {state['path']} failed to load: {e}")
+                return
+            logger.info(f"Loaded and warmed up {name} model in {time.perf_counter() - started:.1f}s")
+
+        replace_shared_model(state["path"], model)
+        if self.registry is not None:
+            for stream_id in self.registry.stream_ids():
+                context = self.registry.peek(stream_id)
+                if context is not None and name in context.detectors:
+                    # Between two of the stream's frames
+                    with context.lock:
+                        context.set_model(name, model)
+
+        state["version"] += 1
+        state["loaded_at"] = time.time()
+        state["error"] = None
+        logger.info(f"Swapped in {name} model version {state['version']}" if model is not None
+                    else f"{state['path']} removed; {name} detection is rule-based now")
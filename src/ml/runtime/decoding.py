@@ -0,0 +1,163 @@
+import hashlib
+import struct
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from detection.pipeline import Stage, frame_key, POSE_MIN_HEIGHT, MOTION_MIN_HEIGHT
+
+# Reduced-resolution decode flags by scale factor. For JPEG, OpenCV performs
+# the reduction in the DCT domain, so a /2 or /4 decode is much cheaper than
+# a full decode followed by cv2.resize.
+_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+_GRAY_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Colour frame height each detector reads (worker processes get a single
+# shared-memory frame). In-process detection takes its variants from the
+# pipeline graph instead, see decode_stages().
+DECODE_PLAN = {
+    'fight': {'color': POSE_MIN_HEIGHT},
+    'drowsiness': {'color': None},
+    'behavior': {'color': POSE_MIN_HEIGHT},
+    'access': {'color': POSE_MIN_HEIGHT},
+}
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read (height, width) from a JPEG header without decoding the image.
+
+    Returns:
+        Image dimensions, or None if the data is not a parseable JPEG
+    """
+    if len(data) < 4 or data[0:2] != b'\xff\xd8':
+        return None
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        # Fill bytes and standalone markers carry no length
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+
+        (length,) = struct.unpack('>H', data[pos + 2:pos + 4])
+        # SOF0-SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return height, width
+        pos += 2 + length
+
+    return None
+
+
+def reduction_factor(height: int, min_height: Optional[int]) -> int:
+    """Largest supported decode reduction that keeps the frame at least min_height tall."""
+    if min_height is None:
+        return 1
+    for factor in (8, 4, 2):
+        if height // factor >= min_height:
+            return factor
+    return 1
+
+
+class DecodedFrame:
+    """
+    Lazily decoded view of one uploaded frame.
+
+    Each decode variant (full or reduced, colour or grayscale) is produced
+    at most once and then shared by every detector that asks for it.
+    """
+
+    def __init__(self, data: bytes):
+        """
+        Wrap encoded frame bytes.
+
+        Args:
+            data: Encoded image bytes (JPEG from the browser, or any format cv2 reads)
+        """
+        self.data = data
+        self._buffer = np.frombuffer(data, np.uint8)
+        self._variants: Dict[Tuple[str, int], np.ndarray] = {}
+        self._size = jpeg_dimensions(data)
+        self._fingerprint = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Original (height, width) of the encoded image."""
+        if self._size is None:
+            # Not a JPEG we could parse; the full decode tells us
+            self._size = self.color().shape[:2]
+        return self._size
+
+    @property
+    def fingerprint(self) -> bytes:
+        """
+        Digest of the encoded bytes.
+
+        The browser posts the same frame to several detector endpoints, each
+        request decoding its own DecodedFrame; stateful stages shared by those
+        detectors use this to recognise a frame they already processed.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.blake2b(self.data, digest_size=16).digest()
+        return self._fingerprint
+
+    def color(self, min_height: Optional[int] = None) -> np.ndarray:
+        """BGR frame, reduced in the decoder when min_height allows it."""
+        return self._decode('color', min_height)
+
+    def gray(self, min_height: Optional[int] = None) -> np.ndarray:
+        """Grayscale frame decoded directly, skipping chroma and colour conversion."""
+        return self._decode('gray', min_height)
+
+    def _decode(self, kind: str, min_height: Optional[int]) -> np.ndarray:
+        # Without header dimensions we cannot pick a safe reduction
+        factor = reduction_factor(self._size[0], min_height) if self._size else 1
+
+        key = (kind, factor)
+        if key not in self._variants:
+            flags = (_COLOR_FLAGS if kind == 'color' else _GRAY_FLAGS)[factor]
+            img = cv2.imdecode(self._buffer, flags)
+            if img is None:
+                raise ValueError("Could not decode frame")
+            self._variants[key] = img
+        return self._variants[key]
+
+    def smallest_color_for(self, names) -> np.ndarray:
+        """Colour variant large enough for every named detector."""
+        heights = [DECODE_PLAN[name]['color'] for name in names]
+        if any(height is None for height in heights):
+            return self.color()
+        return self.color(max(heights))
+
+
+def decode_stages() -> List[Stage]:
+    """
+    Pipeline stages producing the frame variants detectors consume.
+
+    Each stage reads the "encoded" DecodedFrame input; only the variants the
+    requested detectors depend on are decoded.
+    """
+    stages = [Stage('size', lambda encoded: encoded.size, ('encoded',), parallel=False),
+              Stage('frame_id', lambda encoded: encoded.fingerprint, ('encoded',), parallel=False)]
+    for height in sorted({None, POSE_MIN_HEIGHT, MOTION_MIN_HEIGHT}, key=lambda h: h or 0):
+        stages.append(Stage(frame_key('color', height), lambda encoded, h=height: encoded.color(h), ('encoded',)))
+        stages.append(Stage(frame_key('gray', height), lambda encoded, h=height: encoded.gray(h), ('encoded',)))
+    return stages
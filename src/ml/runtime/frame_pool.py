@@ -0,0 +1,227 @@
+import threading
+import time
+import cv2
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+class PoolExhausted(RuntimeError):
+    """Every slot of the frame pool is in use."""
+
+
+class FrameHandle(NamedTuple):
+    """
+    Lightweight reference to a frame stored in a SharedFramePool slot.
+
+    This is the only thing that crosses process boundaries, so it must stay
+    small and cheap to pickle.
+    """
+    pool_name: str
+    slot: int
+    shape: Tuple[int, ...]
+
+
+class SharedFramePool:
+    """
+    Fixed-size pool of shared-memory frame slots.
+
+    Ingest decodes or copies a frame into a free slot once, and inference
+    processes map the same memory instead of receiving a pickled copy.
+    Each slot carries a reference count; a slot becomes free again when the
+    last holder (ingest or a detector worker) releases it.
+    """
+
+    def __init__(self, num_slots: int = 16, max_shape: Tuple[int, int, int] = (1080, 1920, 3)):
+        """
+        Create a new frame pool.
+
+        Args:
+            num_slots: Number of frames that can be in flight at once
+            max_shape: Largest frame (height, width, channels) a slot can hold
+        """
+        self.num_slots = num_slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+
+        self._frames = shared_memory.SharedMemory(create=True, size=self.slot_bytes * num_slots)
+        self._refs = shared_memory.SharedMemory(create=True, size=4 * num_slots)
+        # Spawn context so the lock can be handed to spawned worker processes
+        self._lock = mp.get_context('spawn').Lock()
+        self._owner = True
+        self._attach()
+        self._refcounts[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self._frames.name
+
+    def _attach(self):
+        """Build the numpy views over the shared blocks."""
+        self._buffer = np.ndarray((self.num_slots, self.slot_bytes), dtype=np.uint8,
+                                  buffer=self._frames.buf)
+        self._refcounts = np.ndarray((self.num_slots,), dtype=np.int32, buffer=self._refs.buf)
+        # Wakes local waiters in acquire(); remote releases are picked up by polling
+        self._slot_freed = threading.Condition()
+
+    def __getstate__(self):
+        # Shared blocks are reattached by name; the lock is inherited on spawn
+        return {
+            "num_slots": self.num_slots,
+            "max_shape": self.max_shape,
+            "slot_bytes": self.slot_bytes,
+            "frames_name": self._frames.name,
+            "refs_name": self._refs.name,
+            "lock": self._lock,
+        }
+
+    def __setstate__(self, state):
+        self.num_slots = state["num_slots"]
+        self.max_shape = state["max_shape"]
+        self.slot_bytes = state["slot_bytes"]
+        self._frames = shared_memory.SharedMemory(name=state["frames_name"])
+        self._refs = shared_memory.SharedMemory(name=state["refs_name"])
+        self._lock = state["lock"]
+        self._owner = False
+        self._attach()
+
+    def acquire(self, shape: Tuple[int, ...], timeout: Optional[float] = 1.0) -> Tuple[FrameHandle, np.ndarray]:
+        """
+        Reserve a free slot for a frame of the given shape.
+
+        The caller holds one reference and must release it when done.
+
+        Args:
+            shape: Frame shape, must fit within max_shape
+            timeout: Seconds to wait for a free slot (None waits forever)
+
+        Returns:
+            Tuple of (handle, writable view into the slot)
+
+        Raises:
+            PoolExhausted: If no slot became free within the timeout
+        """
+        size = int(np.prod(shape))
+        if size > self.slot_bytes:
+            raise ValueError(f"Frame of shape {shape} does not fit pool slot {self.max_shape}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                free = np.flatnonzero(self._refcounts == 0)
+                if len(free):
+                    slot = int(free[0])
+                    self._refcounts[slot] = 1
+                    handle = FrameHandle(self.name, slot, tuple(shape))
+                    return handle, self._view(handle, writeable=True)
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise PoolExhausted("No free frame slots in shared pool")
+            with self._slot_freed:
+                self._slot_freed.wait(0.005 if remaining is None else min(0.005, remaining))
+
+    def retain(self, handle: FrameHandle, count: int = 1):
+        """Add references to a slot, e.g. one per detector it is handed to."""
+        with self._lock:
+            self._refcounts[handle.slot] += count
+
+    def release(self, handle: FrameHandle):
+        """Drop one reference; the slot is recycled when the count reaches zero."""
+        with self._lock:
+            remaining = self._refcounts[handle.slot] - 1
+            self._refcounts[handle.slot] = max(0, remaining)
+        if remaining <= 0:
+            with self._slot_freed:
+                self._slot_freed.notify()
+
+    def view(self, handle: FrameHandle) -> np.ndarray:
+        """Read-only ndarray over the frame referenced by a handle (no copy)."""
+        return self._view(handle, writeable=False)
+
+    def _view(self, handle: FrameHandle, writeable: bool) -> np.ndarray:
+        size = int(np.prod(handle.shape))
+        frame = self._buffer[handle.slot, :size].reshape(handle.shape)
+        frame.flags.writeable = writeable
+        return frame
+
+    def fit(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Downscale a frame larger than a slot so it fits, keeping its aspect ratio.
+
+        Frames that already fit are returned as they are.
+        """
+        if frame.size <= self.slot_bytes:
+            return frame
+        scale = (self.slot_bytes / frame.size) ** 0.5
+        height, width = frame.shape[:2]
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def put(self, frame: np.ndarray, timeout: Optional[float] = 1.0) -> FrameHandle:
+        """Copy an already decoded frame into a free slot."""
+        handle, slot_view = self.acquire(frame.shape, timeout=timeout)
+        np.copyto(slot_view, frame)
+        return handle
+
+    def in_use(self) -> int:
+        """Number of slots currently referenced."""
+        with self._lock:
+            return int(np.count_nonzero(self._refcounts))
+
+    def close(self):
+        """Detach from shared memory, unlinking it if this process created it."""
+        self._buffer = None
+        self._refcounts = None
+        self._frames.close()
+        self._refs.close()
+        if self._owner:
+            self._frames.unlink()
+            self._refs.unlink()
+
+
+def decode_into_pool(pool: SharedFramePool, data: bytes, flags: int = None) -> FrameHandle:
+    """
+    Decode a compressed image and copy it into a pool slot.
+
+    cv2.imdecode cannot write into a preallocated array, so the frame is
+    decoded into process memory first and copied once into shared memory.
+
+    Args:
+        pool: Destination frame pool
+        data: Encoded image bytes (e.g. an uploaded JPEG)
+        flags: cv2.imdecode flags (defaults to IMREAD_COLOR)
+
+    Returns:
+        Handle to the decoded frame, holding one reference for the caller
+    """
+    if flags is None:
+        flags = cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if img is None:
+        raise ValueError("Could not decode frame")
+    return pool.put(img)
+
+
+def read_into_pool(capture, pool: SharedFramePool) -> Optional[FrameHandle]:
+    """
+    Read the next frame of a cv2.VideoCapture straight into a pool slot.
+
+    VideoCapture.read() writes into a preallocated output array of matching
+    size, so local video sources avoid the intermediate copy entirely.
+
+    Returns:
+        Handle to the frame, or None when the capture is exhausted
+    """
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    handle, slot_view = pool.acquire((height, width, 3))
+    ok, frame = capture.read(slot_view)
+    if not ok:
+        pool.release(handle)
+        return None
+    if frame is not None and not np.shares_memory(frame, slot_view):
+        # Backend ignored the output buffer (e.g. size mismatch); fall back to a copy
+        pool.release(handle)
+        return pool.put(frame)
+    return handle
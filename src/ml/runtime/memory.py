@@ -0,0 +1,250 @@
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from detection.model_cache import shared_model_bytes
+
+logger = logging.getLogger('hostel-security-ai')
+
+# Detector attributes holding per-stream temporal state
+HISTORY_ATTRS = ('motion_history', 'ear_history', 'head_pose_history', 'pose_history',
+                 'position_history', 'persons_history')
+
+# Approximate native memory of one instance of each graph or network type.
+# MediaPipe and OpenCV allocate these outside the Python heap, so they are
+# accounted by type; the figures are typical RSS growth per instance on x86-64.
+NATIVE_BYTES = {
+    'FaceMesh': 40 * 1024 * 1024,
+    'Holistic': 120 * 1024 * 1024,
+    'Pose': 60 * 1024 * 1024,
+    'Net': 25 * 1024 * 1024,
+    'dnn_Net': 25 * 1024 * 1024,
+    'HOGDescriptor': 1024 * 1024,
+}
+
+def deep_sizeof(obj: Any, seen: set = None) -> int:
+    """Bytes held by a history container: nested lists, tuples, deques, dicts, arrays and numbers."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        # Views share their base's buffer
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, deque, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, 'landmark'):
+        # Tracked pose landmarks
+        size += deep_sizeof(obj.landmark, seen)
+    return size
+
+
+def native_bytes(obj: Any) -> int:
+    """Estimated native memory of the graphs and networks an object holds directly."""
+    return sum(NATIVE_BYTES.get(type(value).__name__, 0) for value in vars(obj).values())
+
+
+def process_rss() -> int:
+    """Current resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No procfs (macOS): fall back to the peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def detector_usage(detector, seen: set) -> Dict[str, int]:
+    history = sum(deep_sizeof(getattr(detector, attr), seen) for attr in HISTORY_ATTRS if hasattr(detector, attr))
+    return {"history": history, "native": native_bytes(detector)}
+
+
+def tracker_usage(tracker, seen: set) -> Dict[str, int]:
+    history = sum(deep_sizeof(track.position_history, seen) + deep_sizeof(track.pose_history, seen)
+                  for track in tracker.tracks)
+    # The tracker keeps its last frame for its same-frame check
+    frame = deep_sizeof(tracker._last_frame, seen) if tracker._last_frame is not None else 0
+    return {"history": history, "frame": frame, "native": native_bytes(tracker)}
+
+
+def stream_usage(context, clip_recorder=None) -> Dict[str, Any]:
+    """
+    Memory accounted to one camera stream (caller holds the stream's lock).
+
+    Returns:
+        {"detectors": {name: {component: bytes}}, "tracker", "rule_engine",
+         "frame_buffer", "total"}
+    """
+    seen = set()
+    usage = {"detectors": {}, "tracker": {}, "rule_engine": 0, "frame_buffer": 0}
+    tracker = None
+    for name, detector in context.detectors.items():
+        usage["detectors"][name] = detector_usage(detector, seen)
+        tracker = tracker or getattr(detector, 'person_tracker', None)
+    if tracker is not None:
+        usage["tracker"] = tracker_usage(tracker, seen)
+    if context.batched:
+        usage["rule_engine"] = context.rule_engine.row_nbytes
+    if clip_recorder is not None:
+        usage["frame_buffer"] = clip_recorder.buffered_bytes(context.stream_id)
+
+    usage["total"] = (sum(sum(parts.values()) for parts in usage["detectors"].values()) +
+                      sum(usage["tracker"].values()) + usage["rule_engine"] + usage["frame_buffer"])
+    return usage
+
+
+class MemoryGovernor:
+    """
+    Per-stream memory accounting with enforced budgets.
+
+    Every check accounts each stream's histories, frames, frame buffer and
+    native graphs, then:
+
+    1. Streams over the per-stream budget are downsampled: their clip ring
+       buffer keeps every other frame and their tracker histories are halved.
+       Detector histories are left alone: they are short fixed windows (at
+       most 300 entries) that the scoring rules need whole, e.g. access
+       compares the last 10 person counts with the 20 before them.
+    2. If process RSS is over the process budget, the least recently seen
+       streams idle for at least `min_idle` seconds are evicted until the
+       accounted memory freed covers the excess.
+    3. While RSS stays over budget, new streams are rejected (admit()
+       returns False); streams already on the node keep running.
+    """
+
+    def __init__(self, registry, clip_recorder=None, stream_budget: int = 0, process_budget: int = 0,
+                 check_interval: float = 10.0, min_idle: float = 30.0,
+                 on_evict: Callable[[str], Any] = None):
+        """
+        Args:
+            registry: StreamRegistry being governed
+            clip_recorder: ClipRecorder holding per-stream frame buffers (optional)
+            stream_budget: Bytes per stream before downsampling (0 disables)
+            process_budget: Process RSS bytes before eviction and rejection (0 disables)
+            check_interval: Seconds between background checks
+            min_idle: Seconds without frames before a stream may be evicted
+            on_evict: Callback(stream_id) just before a stream is evicted, e.g. to snapshot it
+        """
+        self.registry = registry
+        self.clip_recorder = clip_recorder
+        self.stream_budget = stream_budget
+        self.process_budget = process_budget
+        self.check_interval = check_interval
+        self.min_idle = min_idle
+        self.on_evict = on_evict
+        self.over_budget = False
+        self.evicted = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+
+    def report(self) -> Dict[str, Any]:
+        """Accounting for every stream plus process-wide figures."""
+        streams = {}
+        for stream_id in self.registry.stream_ids():
+            context = self.registry.peek(stream_id)
+            if context is not None:
+                with context.lock:
+                    streams[stream_id] = stream_usage(context, self.clip_recorder)
+        return {
+            "rss": process_rss(),
+            "models": shared_model_bytes(),
+            "streams": streams,
+            "streams_total": sum(usage["total"] for usage in streams.values()),
+            "budgets": {"stream": self.stream_budget, "process": self.process_budget},
+            "over_budget": self.over_budget,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+        }
+
+    def admit(self, stream_id: str) -> bool:
+        """Whether a frame of this stream may be processed."""
+        if not self.over_budget or self.registry.peek(stream_id) is not None:
+            return True
+        self.rejected += 1
+        return False
+
+    def enforce(self) -> List[str]:
+        """
+        Apply the budgets once.
+
+        Returns:
+            IDs of evicted streams
+        """
+        usage = {}
+        for stream_id in self.registry.stream_ids():
+            context = self.registry.peek(stream_id)
+            if context is None:
+                continue
+            with context.lock:
+                usage[stream_id] = stream_usage(context, self.clip_recorder)["total"]
+                if self.stream_budget and usage[stream_id] > self.stream_budget:
+                    self._downsample(context)
+
+        evicted = []
+        if self.process_budget:
+            excess = process_rss() - self.process_budget
+            if excess > 0:
+                evicted = self._evict(excess, usage)
+            # Freed memory is not always returned to the OS at once; measure again
+            self.over_budget = process_rss() > self.process_budget
+        return evicted
+
+    def _downsample(self, context):
+        downsampled = []
+        if self.clip_recorder is not None and self.clip_recorder.downsample(context.stream_id):
+            downsampled.append("clip buffer")
+        tracker = next((d.person_tracker for d in context.detectors.values()
+                        if getattr(d, 'person_tracker', None) is not None), None)
+        if tracker is not None and tracker.history_len > 30:
+            tracker.shrink_histories(tracker.history_len // 2)
+            downsampled.append("tracker histories")
+        if downsampled:
+            logger.info(f"Stream {context.stream_id} over its memory budget; "
+                        f"downsampled its {' and '.join(downsampled)}")
+
+    def _evict(self, excess: int, usage: Dict[str, int]) -> List[str]:
+        cutoff = time.time() - self.min_idle
+        candidates = []
+        for stream_id in usage:
+            context = self.registry.peek(stream_id)
+            if context is not None and context.last_seen < cutoff:
+                candidates.append((context.last_seen, stream_id))
+
+        evicted = []
+        for _, stream_id in sorted(candidates):
+            if excess <= 0:
+                break
+            if self.on_evict:
+                self.on_evict(stream_id)
+            self.registry.remove(stream_id)
+            if self.clip_recorder is not None:
+                self.clip_recorder.release(stream_id)
+            excess -= usage[stream_id]
+            evicted.append(stream_id)
+        if evicted:
+            self.evicted += len(evicted)
+            logger.warning(f"Process over its memory budget; evicted streams {', '.join(evicted)}")
+        return evicted
+
+    def start(self):
+        def loop():
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.enforce()
+                except Exception as e:
+                    logger.error(f"Error enforcing memory budgets: {e}")
+        threading.Thread(target=loop, name="memory-governor", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
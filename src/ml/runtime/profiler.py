@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Tuple
+
+from detection.pipeline import active_stages, stage_owner
+
+# Leaf frames of threads that are blocked waiting rather than working
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    ("thread.py", "_worker"),
+    ("_base.py", "wait"),
+    ("_base.py", "result"),
+}
+
+class SamplingProfiler:
+    """
+    Statistical profiler over every thread of the process.
+
+    A background thread samples the Python stack of all other threads at a
+    fixed interval (sys._current_frames) and counts identical stacks.
+    Nothing is instrumented, so threads being profiled are only slowed by
+    the sampler holding the GIL for a few microseconds per sample; native
+    work (OpenCV, MediaPipe, TensorFlow) is charged to the Python frame
+    that called it.
+
+    Each sample is attributed to the detector whose pipeline stage the
+    thread was running (see detection.pipeline.active_stages), or to the
+    thread's name outside the pipeline (rule engine, writers, request
+    handling).
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        """
+        Args:
+            interval: Seconds between samples
+            include_idle: Also count threads blocked in waits, selects and queue gets
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = 0
+        self.duration = 0.0
+        self._stacks: Counter = Counter()
+        self._labels: Dict[Any, str] = {}
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        """Sample for `seconds` on a background thread and wait for it to finish."""
+        sampler = threading.Thread(target=self._sample_loop, args=(seconds,), name="profiler", daemon=True)
+        sampler.start()
+        sampler.join()
+        return self
+
+    def _sample_loop(self, seconds: float):
+        me = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if not self.include_idle and codes and self._is_idle(codes[0]):
+                    continue
+                stage = active_stages.get(ident)
+                self._stacks[(stage, names.get(ident, "unknown"), tuple(reversed(codes)))] += 1
+            self.samples += 1
+
+            next_sample += self.interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if next_sample > now:
+                time.sleep(next_sample - now)
+        self.duration = time.perf_counter() - start
+
+    def _is_idle(self, code) -> bool:
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)})"
+        return label
+
+    @staticmethod
+    def _thread_group(name: str) -> str:
+        # "pipeline_3" and "Thread-12 (process_request_thread)" group with their peers
+        return re.sub(r"[-_]\d+", "", name)
+
+    def _root(self, stage: str, thread: str) -> Tuple[str, ...]:
+        if stage is not None:
+            return (stage_owner(stage), stage)
+        return ("other", self._thread_group(thread))
+
+    def collapsed(self) -> str:
+        """
+        Aggregated stacks in the collapsed format read by flamegraph.pl and speedscope.
+
+        Each line is "owner;stage-or-thread;outermost frame;...;innermost frame count",
+        so the flame graph's first level splits time by detector.
+        """
+        lines = Counter()
+        for (stage, thread, codes), count in self._stacks.items():
+            frames = self._root(stage, thread) + tuple(self._label(code) for code in codes)
+            lines[";".join(frame.replace(";", ":") for frame in frames)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(lines.items()))
+
+    def attribution(self) -> Dict[str, Any]:
+        """Busy-thread samples per owner (detector, "tracking", "decode" or "other") and per stage or thread."""
+        owners = Counter()
+        parts = Counter()
+        for (stage, thread, _), count in self._stacks.items():
+            owner, part = self._root(stage, thread)
+            owners[owner] += count
+            parts[(owner, part)] += count
+        total = sum(owners.values()) or 1
+        return {
+            owner: {
+                "samples": count,
+                "share": round(count / total, 4),
+                # Average number of threads busy on this owner's work
+                "threads": round(count / self.samples, 3) if self.samples else 0.0,
+                "parts": {part: parts[(owner, part)] for (o, part) in sorted(parts) if o == owner},
+            }
+            for owner, count in owners.most_common()
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "duration": round(self.duration, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "attribution": self.attribution(),
+            "collapsed": self.collapsed(),
+        }
@@ -0,0 +1,237 @@
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from runtime.alerts import ALERT_TYPES
+
+# Binary alternative to multipart uploads and JSON results, selected by content type
+FRAMES_CONTENT_TYPE = 'application/x-hostel-frames'
+RESULTS_CONTENT_TYPE = 'application/x-hostel-results'
+
+REQUEST_MAGIC = b'HSF1'
+RESPONSE_MAGIC = b'HSR1'
+
+# Bit i of a detector mask selects DETECTORS[i]
+DETECTORS = ('fight', 'drowsiness', 'behavior', 'access')
+DELTA_FLAG = 0x01
+
+BEHAVIOR_TYPES = ('none', 'loitering', 'potential_intoxication', 'suspicious_interaction')
+ACCESS_TYPES = ('none', 'normal', 'tailgating', 'unusual_time')
+EVENT_KINDS = ('open', 'update', 'close')
+SEVERITIES = ('low', 'medium', 'high')
+
+# All integers little-endian. Strings are UTF-8 with a u8 (short) or u16 (long) length prefix.
+#
+# Request:  magic, u16 frame count, u8 detector mask, u8 flags, then per frame:
+#           str camera_id, str camera_name, str location, f64 capture time
+#           (0 = on arrival), u32 JPEG length, JPEG bytes
+# Response: magic, u16 frame count, then per frame:
+#           u16 status, u8 result mask, str stream id; if status is not 200 a
+#           long str error; otherwise one record per result bit, u16 event
+#           count and the events
+_REQUEST_HEAD = struct.Struct('<4sHBB')
+_FRAME_TAIL = struct.Struct('<dI')
+_RESPONSE_HEAD = struct.Struct('<4sH')
+_RESULT_HEAD = struct.Struct('<HB')
+
+_FIGHT = struct.Struct('<BfBB')        # flags (is_fight), confidence, persons involved, box count
+_BOX = struct.Struct('<4H')            # x_min, y_min, x_max, y_max
+_DROWSINESS = struct.Struct('<Bfff')   # flags (is_drowsy, head_nodding), confidence, EAR, inactivity
+_BEHAVIOR = struct.Struct('<BfBff')    # flags (unusual, has details), confidence, type, loitering, swaying
+_ACCESS = struct.Struct('<BfBHff')     # flags (unauthorized, has details), confidence, type, persons, tailgating, time
+_EVENT = struct.Struct('<BBBffdfI')    # kind, detector, flags (alert, clip), confidence, peak, started, duration, incident
+_ALERT = struct.Struct('<Bf')          # severity, confidence
+
+class FrameRequest(NamedTuple):
+    camera_id: str
+    camera_name: str
+    location: str
+    ts: Optional[float]
+    data: bytes
+
+
+class FrameResult(NamedTuple):
+    stream_id: str
+    status: int
+    results: Dict[str, Dict[str, Any]]
+    events: List[Dict[str, Any]]
+    error: str = ''
+
+
+def detector_mask(names: List[str]) -> int:
+    return sum(1 << DETECTORS.index(name) for name in names)
+
+
+def mask_detectors(mask: int) -> List[str]:
+    return [name for i, name in enumerate(DETECTORS) if mask & (1 << i)]
+
+
+def _short(text: str) -> bytes:
+    # Truncate on a character boundary
+    data = text.encode()[:255].decode(errors='ignore').encode()
+    return bytes((len(data),)) + data
+
+
+def _long(text: str) -> bytes:
+    data = text.encode()[:65535].decode(errors='ignore').encode()
+    return struct.pack('<H', len(data)) + data
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, n: int) -> memoryview:
+        if self.pos + n > len(self.data):
+            raise ValueError("Truncated message")
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        return layout.unpack(self.take(layout.size))
+
+    def short(self) -> str:
+        return bytes(self.take(self.take(1)[0])).decode(errors='replace')
+
+    def long(self) -> str:
+        return bytes(self.take(struct.unpack('<H', self.take(2))[0])).decode(errors='replace')
+
+
+def encode_frames(frames: List[FrameRequest], names: List[str], delta: bool = False) -> bytes:
+    """Pack frames of one or more cameras for a batch of detectors into a request body."""
+    parts = [_REQUEST_HEAD.pack(REQUEST_MAGIC, len(frames), detector_mask(names), DELTA_FLAG if delta else 0)]
+    for frame in frames:
+        parts += [_short(frame.camera_id), _short(frame.camera_name), _short(frame.location),
+                  _FRAME_TAIL.pack(frame.ts or 0.0, len(frame.data)), frame.data]
+    return b''.join(parts)
+
+
+def decode_frames(body: bytes) -> Tuple[List[str], bool, List[FrameRequest]]:
+    """
+    Unpack a request body.
+
+    Returns:
+        (detector names, delta flag, frames)
+
+    Raises:
+        ValueError: If the body is not a well-formed frames message
+    """
+    reader = _Reader(body)
+    magic, count, mask, flags = reader.unpack(_REQUEST_HEAD)
+    if magic != REQUEST_MAGIC:
+        raise ValueError("Not a frames message")
+    frames = []
+    for _ in range(count):
+        camera_id, camera_name, location = reader.short(), reader.short(), reader.short()
+        ts, length = reader.unpack(_FRAME_TAIL)
+        frames.append(FrameRequest(camera_id, camera_name, location, ts or None, bytes(reader.take(length))))
+    return mask_detectors(mask), bool(flags & DELTA_FLAG), frames
+
+
+def _encode_result(name: str, result: Dict[str, Any]) -> bytes:
+    if name == 'fight':
+        boxes = result.get("bounding_boxes", [])[:255]
+        return _FIGHT.pack(bool(result["is_fight"]), result["confidence"], min(result["persons_involved"], 255),
+                           len(boxes)) + b''.join(_BOX.pack(*(min(max(int(v), 0), 65535) for v in box))
+                                                  for box in boxes)
+    if name == 'drowsiness':
+        flags = bool(result["is_drowsy"]) | bool(result["head_nodding"]) << 1
+        return _DROWSINESS.pack(flags, result["confidence"], result["eye_closure_ratio"],
+                                result["inactivity_duration"])
+    details = result.get("details") or {}
+    if name == 'behavior':
+        flags = bool(result["unusual_behavior"]) | bool(details) << 1
+        return _BEHAVIOR.pack(flags, result["confidence"], BEHAVIOR_TYPES.index(result["behavior_type"]),
+                              details.get("loitering_score", 0.0), details.get("swaying_score", 0.0))
+    flags = bool(result["unauthorized_access"]) | bool(details) << 1
+    return _ACCESS.pack(flags, result["confidence"], ACCESS_TYPES.index(result["access_type"]),
+                        min(result["person_count"], 65535), details.get("tailgating_score", 0.0),
+                        details.get("time_based_score", 0.0))
+
+
+def _decode_result(name: str, reader: _Reader) -> Dict[str, Any]:
+    if name == 'fight':
+        flags, confidence, persons, count = reader.unpack(_FIGHT)
+        return {"is_fight": bool(flags & 1), "confidence": confidence,
+                "bounding_boxes": [list(reader.unpack(_BOX)) for _ in range(count)], "persons_involved": persons}
+    if name == 'drowsiness':
+        flags, confidence, ear, inactivity = reader.unpack(_DROWSINESS)
+        return {"is_drowsy": bool(flags & 1), "confidence": confidence, "eye_closure_ratio": ear,
+                "head_nodding": bool(flags & 2), "inactivity_duration": inactivity}
+    if name == 'behavior':
+        flags, confidence, kind, loitering, swaying = reader.unpack(_BEHAVIOR)
+        details = {"loitering_score": loitering, "swaying_score": swaying} if flags & 2 else {}
+        return {"unusual_behavior": bool(flags & 1), "confidence": confidence,
+                "behavior_type": BEHAVIOR_TYPES[kind], "details": details}
+    flags, confidence, kind, persons, tailgating, time_score = reader.unpack(_ACCESS)
+    details = {"tailgating_score": tailgating, "time_based_score": time_score} if flags & 2 else {}
+    return {"unauthorized_access": bool(flags & 1), "confidence": confidence, "access_type": ACCESS_TYPES[kind],
+            "person_count": persons, "details": details}
+
+
+def _encode_event(event: Dict[str, Any]) -> bytes:
+    alert, clip = event.get("alert"), event.get("clip")
+    incident = int(event["incident_id"].rsplit(':', 1)[1])
+    parts = [_EVENT.pack(EVENT_KINDS.index(event["event"]), DETECTORS.index(event["detector"]),
+                         bool(alert) | bool(clip) << 1, event["confidence"], event["peak_confidence"],
+                         event["started_at"], event["duration"], incident)]
+    if alert:
+        parts += [_ALERT.pack(SEVERITIES.index(alert["severity"]), alert["confidence"]),
+                  _long(alert["title"]), _long(alert["description"])]
+    if clip:
+        parts.append(_short(clip))
+    return b''.join(parts)
+
+
+def _decode_event(reader: _Reader, stream_id: str) -> Dict[str, Any]:
+    kind, detector, flags, confidence, peak, started, duration, incident = reader.unpack(_EVENT)
+    name = DETECTORS[detector]
+    event = {"event": EVENT_KINDS[kind], "incident_id": f"{stream_id}:{name}:{incident}", "stream_id": stream_id,
+             "detector": name, "confidence": confidence, "peak_confidence": peak, "started_at": started,
+             "duration": duration, "alert": None}
+    if flags & 1:
+        severity, alert_confidence = reader.unpack(_ALERT)
+        event["alert"] = {"type": ALERT_TYPES[name], "detector": name, "confidence": alert_confidence,
+                          "title": reader.long(), "description": reader.long(), "severity": SEVERITIES[severity]}
+    if flags & 2:
+        event["clip"] = reader.short()
+    return event
+
+
+def encode_results(items: List[FrameResult]) -> bytes:
+    """Pack per-frame detector results and incident events into a response body."""
+    parts = [_RESPONSE_HEAD.pack(RESPONSE_MAGIC, len(items))]
+    for item in items:
+        parts += [_RESULT_HEAD.pack(item.status, detector_mask(list(item.results))), _short(item.stream_id)]
+        if item.status != 200:
+            parts.append(_long(item.error))
+            continue
+        parts += [_encode_result(name, item.results[name]) for name in DETECTORS if name in item.results]
+        parts.append(struct.pack('<H', len(item.events)))
+        parts += [_encode_event(event) for event in item.events]
+    return b''.join(parts)
+
+
+def decode_results(body: bytes) -> List[FrameResult]:
+    """
+    Unpack a response body (for clients and tests).
+
+    Floats come back at single precision.
+    """
+    reader = _Reader(body)
+    magic, count = reader.unpack(_RESPONSE_HEAD)
+    if magic != RESPONSE_MAGIC:
+        raise ValueError("Not a results message")
+    items = []
+    for _ in range(count):
+        status, mask = reader.unpack(_RESULT_HEAD)
+        stream_id = reader.short()
+        if status != 200:
+            items.append(FrameResult(stream_id, status, {}, [], reader.long()))
+            continue
+        results = {name: _decode_result(name, reader) for name in mask_detectors(mask)}
+        (events,) = struct.unpack('<H', reader.take(2))
+        items.append(FrameResult(stream_id, status, results,
+                                 [_decode_event(reader, stream_id) for _ in range(events)]))
+    return items
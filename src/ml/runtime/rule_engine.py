@@ -0,0 +1,434 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from detection.thresholds import DEFAULT_THRESHOLDS
+
+# History windows, matching the scalar detectors
+EAR_WINDOW = 30
+POSE_WINDOW = 30
+POSITION_WINDOW = 300
+PERSONS_WINDOW = 60
+
+RULE_DETECTORS = ('fight', 'drowsiness', 'behavior', 'access')
+
+class _History:
+    """
+    Fixed-window history of every stream as one array.
+
+    Row r holds the stream's last `count[r]` values right-aligned (newest in
+    the last column), so a window of the k newest values is the slice
+    [..., -k:] for every row at once.
+    """
+
+    def __init__(self, window: int, shape: Tuple[int, ...] = (), dtype=np.float64, capacity: int = 64):
+        self.window = window
+        self.values = np.zeros((capacity, window) + shape, dtype)
+        self.count = np.zeros(capacity, np.int64)
+
+    def grow(self, capacity: int):
+        values = np.zeros((capacity,) + self.values.shape[1:], self.values.dtype)
+        values[:len(self.values)] = self.values
+        count = np.zeros(capacity, np.int64)
+        count[:len(self.count)] = self.count
+        self.values, self.count = values, count
+
+    def push(self, rows: np.ndarray, values: np.ndarray):
+        """Append one value to each of the (distinct) rows."""
+        self.values[rows, :-1] = self.values[rows, 1:]
+        self.values[rows, -1] = values
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+
+    def clear(self, row: int):
+        self.values[row] = 0
+        self.count[row] = 0
+
+    def get(self, row: int) -> np.ndarray:
+        return self.values[row, self.window - self.count[row]:]
+
+    def set(self, row: int, values: np.ndarray):
+        values = values[-self.window:]
+        self.clear(row)
+        if len(values):
+            self.values[row, -len(values):] = values
+        self.count[row] = len(values)
+
+
+def _by_length(counts: np.ndarray):
+    """Group row positions by history length, so each group is one rectangular slice."""
+    for length in np.unique(counts):
+        yield int(length), np.flatnonzero(counts == length)
+
+
+class RuleEngine:
+    """
+    Rule-based scoring of all camera streams in one vectorized pass per tick.
+
+    The rule fallbacks of the four detectors keep their temporal state
+    (EAR and head-pose, pose and position, person-count histories) in
+    per-stream Python lists and score one stream at a time. Here the same
+    state is held column-wise, one row per stream, and each tick applies a
+    batch of observations with NumPy array operations over every stream
+    that produced a frame, so the cost per tick grows with the number of
+    streams only through array sizes, not Python loops.
+
+    Observations are the dicts produced by each detector's observation
+    stage; results are identical to the detectors' scalar _score().
+    """
+
+    def __init__(self, capacity: int = 64, tick_interval: float = 0.005):
+        """
+        Args:
+            capacity: Initial number of stream rows (grows as needed)
+            tick_interval: Seconds a tick waits to collect observations from other streams
+        """
+        self.capacity = capacity
+        self.tick_interval = tick_interval
+        # Same thresholds as the scalar detectors; each detector's dict is replaced as a whole on change
+        self.thresholds = {name: dict(DEFAULT_THRESHOLDS[name]) for name in RULE_DETECTORS}
+        self.rows: Dict[str, int] = {}
+        self._free: List[int] = []
+
+        self.ear = _History(EAR_WINDOW, capacity=capacity)
+        self.head_pose = _History(EAR_WINDOW, (2,), capacity=capacity)
+        self.last_active = np.zeros(capacity)
+        self.pose = _History(POSE_WINDOW, (27,), capacity=capacity)
+        self.position = _History(POSITION_WINDOW, (2,), capacity=capacity)
+        self.persons = _History(PERSONS_WINDOW, dtype=np.int64, capacity=capacity)
+
+        self._pending: List[Tuple[str, str, Any, Future]] = []
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._tick_loop, name="rule-engine", daemon=True)
+        self._thread.start()
+
+    # Stream rows
+
+    def _row(self, stream_id: str) -> int:
+        row = self.rows.get(stream_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self.rows)
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+        for history in (self.ear, self.head_pose, self.pose, self.position, self.persons):
+            history.clear(row)
+        self.last_active[row] = time.time()
+        self.rows[stream_id] = row
+        return row
+
+    def _grow(self, capacity: int):
+        for history in (self.ear, self.head_pose, self.pose, self.position, self.persons):
+            history.grow(capacity)
+        last_active = np.zeros(capacity)
+        last_active[:self.capacity] = self.last_active
+        self.last_active = last_active
+        self.capacity = capacity
+
+    def release(self, stream_id: str):
+        """Free a stream's row."""
+        with self._lock:
+            row = self.rows.pop(stream_id, None)
+            if row is not None:
+                self._free.append(row)
+
+    @property
+    def row_nbytes(self) -> int:
+        """Memory each stream row takes across all history arrays."""
+        histories = (self.ear, self.head_pose, self.pose, self.position, self.persons)
+        return sum(h.values[0].nbytes + h.count.itemsize for h in histories) + self.last_active.itemsize
+
+    def export_state(self, stream_id: str) -> Dict[str, Dict[str, np.ndarray]]:
+        """A stream's histories in the detectors' get_state() format."""
+        with self._lock:
+            row = self.rows.get(stream_id)
+            if row is None:
+                return {}
+            return {
+                'drowsiness': {
+                    "ear_history": self.ear.get(row).astype(np.float32),
+                    "head_pose_history": self.head_pose.get(row).astype(np.float32),
+                    "last_active_time": np.array(self.last_active[row]),
+                },
+                'behavior': {
+                    "pose_history": self.pose.get(row).astype(np.float32),
+                    "position_history": self.position.get(row).astype(np.float32),
+                },
+                'access': {
+                    "persons_history": self.persons.get(row).astype(np.int16),
+                },
+            }
+
+    def import_state(self, stream_id: str, states: Dict[str, Dict[str, np.ndarray]]):
+        """Load histories exported by detectors' get_state() (e.g. from a snapshot)."""
+        with self._lock:
+            row = self._row(stream_id)
+            if 'drowsiness' in states:
+                self.ear.set(row, states['drowsiness']["ear_history"])
+                self.head_pose.set(row, states['drowsiness']["head_pose_history"])
+                self.last_active[row] = float(states['drowsiness']["last_active_time"])
+            if 'behavior' in states:
+                self.pose.set(row, states['behavior']["pose_history"])
+                self.position.set(row, states['behavior']["position_history"])
+            if 'access' in states:
+                self.persons.set(row, states['access']["persons_history"])
+
+    # Scoring
+
+    def score(self, stream_id: str, observations: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Score one stream's observations in the next tick, together with other streams.
+
+        Args:
+            stream_id: Camera stream
+            observations: {detector_name: observation}
+
+        Returns:
+            {detector_name: result}
+        """
+        futures = {}
+        with self._cond:
+            for name, observation in observations.items():
+                futures[name] = Future()
+                self._pending.append((stream_id, name, observation, futures[name]))
+            self._cond.notify()
+        return {name: future.result() for name, future in futures.items()}
+
+    def score_batch(self, items: List[Tuple[str, str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Score a batch of (stream_id, detector_name, observation) synchronously.
+
+        Observations of the same stream and detector are applied in order.
+
+        Returns:
+            Results in the order of items
+        """
+        results: List[Dict[str, Any]] = [None] * len(items)
+        with self._lock:
+            rows = [self._row(stream_id) for stream_id, _, _ in items]
+            # Each pass takes at most one observation per stream and detector
+            remaining = list(range(len(items)))
+            while remaining:
+                seen = set()
+                batch, later = [], []
+                for i in remaining:
+                    key = (rows[i], items[i][1])
+                    (later if key in seen else batch).append(i)
+                    seen.add(key)
+                for name in RULE_DETECTORS:
+                    group = [i for i in batch if items[i][1] == name]
+                    if group:
+                        scored = getattr(self, f"_score_{name}")(
+                            np.array([rows[i] for i in group], np.int64), [items[i][2] for i in group])
+                        for i, result in zip(group, scored):
+                            results[i] = result
+                remaining = later
+        return results
+
+    def _tick_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+            # Let other streams' observations join this tick
+            time.sleep(self.tick_interval)
+            with self._cond:
+                pending, self._pending = self._pending, []
+            try:
+                results = self.score_batch([(stream_id, name, obs) for stream_id, name, obs, _ in pending])
+                for (_, _, _, future), result in zip(pending, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, _, future in pending:
+                    future.set_exception(e)
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    # Per-detector vectorized rules (see each detector's _score and _rule_based_detection)
+
+    def _score_fight(self, rows: np.ndarray, observations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        motion = np.array([obs["motion_score"] for obs in observations], np.float64)
+        has_people = np.array([bool(obs["landmarks"]) for obs in observations])
+
+        is_fight = motion > self.thresholds['fight']['motion']
+        confidence = np.where(is_fight, np.minimum(1.0, motion * 1.5), motion)
+
+        results = []
+        for i, obs in enumerate(observations):
+            if not has_people[i]:
+                results.append({"is_fight": False, "confidence": 0.0, "bounding_boxes": [], "persons_involved": 0})
+                continue
+            results.append({
+                "is_fight": bool(is_fight[i]),
+                "confidence": float(confidence[i]),
+                "bounding_boxes": obs["bounding_boxes"],
+                "persons_involved": len(obs["bounding_boxes"])
+            })
+        return results
+
+    def _score_drowsiness(self, rows: np.ndarray, observations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        thresholds = self.thresholds['drowsiness']
+        present = np.array([obs is not None for obs in observations])
+        face_rows = rows[present]
+        faces = [obs for obs in observations if obs is not None]
+
+        ear = np.array([obs["ear"] for obs in faces], np.float64)
+        head_pose = np.array([obs["head_pose"] for obs in faces], np.float64).reshape(-1, 2)
+        now = np.array([obs["ts"] for obs in faces], np.float64)
+
+        self.ear.push(face_rows, ear)
+        self.head_pose.push(face_rows, head_pose)
+
+        # Head nodding: variance of the last 10 head tilts
+        head_nodding = np.zeros(len(faces), bool)
+        full = self.head_pose.count[face_rows] >= 10
+        if full.any():
+            tilts = np.ascontiguousarray(self.head_pose.values[face_rows[full], -10:, 1])
+            head_nodding[full] = np.var(tilts, axis=1) > thresholds['nodding_variance']
+
+        inactivity = now - self.last_active[face_rows]
+        active = (ear > thresholds['ear_open']) & ~head_nodding
+        self.last_active[face_rows[active]] = now[active]
+
+        ear_threshold = thresholds['ear']
+        inactivity_threshold = thresholds['inactivity']
+        ear_factor = np.where(ear < ear_threshold, np.maximum(0, 1 - (ear / ear_threshold)), 0)
+        inactivity_factor = np.minimum(1.0, inactivity / inactivity_threshold)
+        nodding_factor = np.where(head_nodding, 0.7, 0)
+        confidence = 0.5 * ear_factor + 0.3 * inactivity_factor + 0.2 * nodding_factor
+        is_drowsy = (confidence > thresholds['confidence']) | (ear < ear_threshold) | (inactivity > inactivity_threshold)
+
+        results = []
+        j = 0
+        for obs in observations:
+            if obs is None:
+                results.append({"is_drowsy": False, "confidence": 0.0, "eye_closure_ratio": 0.0,
+                                "head_nodding": False, "inactivity_duration": 0.0})
+                continue
+            results.append({
+                "is_drowsy": bool(is_drowsy[j]),
+                "confidence": float(confidence[j]),
+                "eye_closure_ratio": float(ear[j]),
+                "head_nodding": bool(head_nodding[j]),
+                "inactivity_duration": float(inactivity[j])
+            })
+            j += 1
+        return results
+
+    def _score_behavior(self, rows: np.ndarray, observations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        thresholds = self.thresholds['behavior']
+        present = np.array([obs is not None for obs in observations])
+        person_rows = rows[present]
+        people = [obs for obs in observations if obs is not None]
+
+        self.pose.push(person_rows, np.array([obs["pose_features"] for obs in people], np.float64).reshape(-1, 27))
+        self.position.push(person_rows, np.array([obs["position"] for obs in people], np.float64).reshape(-1, 2))
+
+        # Loitering: area of the bounding box of all recorded positions
+        n_positions = self.position.count[person_rows]
+        valid = np.arange(POSITION_WINDOW) >= (POSITION_WINDOW - n_positions)[:, None]
+        positions = self.position.values[person_rows]
+        x, y = positions[..., 0], positions[..., 1]
+        area = ((np.where(valid, x, -np.inf).max(axis=1) - np.where(valid, x, np.inf).min(axis=1)) *
+                (np.where(valid, y, -np.inf).max(axis=1) - np.where(valid, y, np.inf).min(axis=1)))
+        loitering = np.select(
+            [n_positions < 60,
+             (area < thresholds['loitering_tight_area']) & (n_positions > thresholds['loitering_tight_frames']),
+             (area < thresholds['loitering_wide_area']) & (n_positions > thresholds['loitering_wide_frames']),
+             area < thresholds['loitering_area']],
+            [0.0, 1.0, 0.8, 0.5], 0.0)
+
+        # Swaying: spread of nose x and shoulder y over the pose history
+        swaying = np.zeros(len(people))
+        for length, group in _by_length(self.pose.count[person_rows]):
+            if length < 15:
+                continue
+            poses = self.pose.values[person_rows[group], -length:]
+            nose_x = np.ascontiguousarray(poses[..., 0])
+            shoulders_y = (poses[..., 10] + poses[..., 13]) / 2
+            sway_score = np.std(nose_x, axis=1) * 5.0
+            sway_score += np.std(shoulders_y, axis=1) * 3.0
+            swaying[group] = np.minimum(1.0, sway_score)
+
+        behavior_type = np.where(loitering > thresholds['loitering'], "loitering",
+                                 np.where(swaying > thresholds['swaying'], "potential_intoxication", "none"))
+        combined = np.maximum(loitering, swaying)
+        unusual = combined > thresholds['confidence']
+
+        results = []
+        j = 0
+        for obs in observations:
+            if obs is None:
+                results.append({"unusual_behavior": False, "confidence": 0.0, "behavior_type": "none", "details": {}})
+                continue
+            results.append({
+                "unusual_behavior": bool(unusual[j]),
+                "confidence": float(combined[j]),
+                "behavior_type": str(behavior_type[j]),
+                "details": {
+                    "loitering_score": float(loitering[j]),
+                    "swaying_score": float(swaying[j])
+                }
+            })
+            j += 1
+        return results
+
+    def _score_access(self, rows: np.ndarray, observations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        thresholds = self.thresholds['access']
+        counts = np.array([obs["person_count"] for obs in observations], np.int64)
+        present = counts > 0
+        person_rows = rows[present]
+        counts = counts[present]
+        hours = np.array([time.localtime(obs["ts"]).tm_hour for obs in observations], np.int64)[present]
+
+        self.persons.push(person_rows, counts)
+
+        # Tailgating: rise of the mean count over the last 10 frames against the 20 before
+        tailgating = np.zeros(len(counts))
+        full = self.persons.count[person_rows] >= 30
+        if full.any():
+            history = self.persons.values[person_rows[full]]
+            avg_recent = history[:, -10:].sum(axis=1) / 10
+            avg_previous = history[:, -30:-10].sum(axis=1) / 20
+            increase = np.maximum(0, avg_recent - avg_previous)
+            tailgating[full] = np.minimum(1.0, increase / 2.0)
+
+        time_score = np.select([(hours >= 8) & (hours < 22), (hours >= 22) | (hours < 5)], [0.1, 0.8], 0.5)
+
+        access_type = np.where(tailgating > thresholds['tailgating'], "tailgating",
+                               np.where(time_score > thresholds['unusual_time'], "unusual_time", "normal"))
+        combined = 0.5 * tailgating + 0.3 * time_score
+        combined = np.where(counts > 1, combined + 0.2, combined)
+        unauthorized = (combined > thresholds['confidence']) | (tailgating > thresholds['tailgating'])
+
+        results = []
+        j = 0
+        for obs in observations:
+            if not obs["person_count"]:
+                results.append({"unauthorized_access": False, "confidence": 0.0, "access_type": "none",
+                                "person_count": 0, "details": {}})
+                continue
+            results.append({
+                "unauthorized_access": bool(unauthorized[j]),
+                "confidence": float(combined[j]),
+                "access_type": str(access_type[j]),
+                "person_count": int(counts[j]),
+                "details": {
+                    "tailgating_score": float(tailgating[j]),
+                    "time_based_score": float(time_score[j])
+                }
+            })
+            j += 1
+        return results
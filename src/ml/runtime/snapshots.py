@@ -0,0 +1,243 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger('hostel-security-ai')
+
+SNAPSHOT_VERSION = 2
+
+# Wall-clock fields of detector state; they are stored relative to the save
+# time and rebased on restore, so idle timers do not count the time offline
+# or the clock difference between two nodes
+TIME_FIELDS = {
+    "drowsiness": ("last_active_time",),
+    "access": ("last_clean_time",),
+}
+
+def encode_snapshot(detectors: Dict[str, object], frames: int = 0,
+                    overrides: Dict[str, Dict[str, np.ndarray]] = None, stream_id: str = "") -> bytes:
+    """
+    Serialize a stream's detector state into a compact binary blob.
+
+    The blob is an uncompressed .npz archive of plain arrays (no pickled
+    objects), keyed "<detector>.<field>". The shared person tracker is stored
+    once under "tracker".
+
+    Args:
+        detectors: {name: detector} of one stream
+        frames: Frames the stream has processed so far
+        overrides: {name: state} replacing detector fields held elsewhere
+            (the rule engine's histories)
+        stream_id: Stream the state belongs to, checked on restore
+
+    Returns:
+        Snapshot bytes
+    """
+    saved_at = time.time()
+    arrays = {
+        "meta.version": np.array(SNAPSHOT_VERSION),
+        "meta.saved_at": np.array(saved_at),
+        "meta.frames": np.array(frames),
+        "meta.stream_id": np.array(stream_id),
+    }
+    tracker = None
+    for name, detector in detectors.items():
+        state = detector.get_state()
+        state.update((overrides or {}).get(name, {}))
+        for field in TIME_FIELDS.get(name, ()):
+            if field in state:
+                state[field] = np.array(float(state[field]) - saved_at)
+        for key, value in state.items():
+            arrays[f"{name}.{key}"] = value
+        tracker = tracker or getattr(detector, "person_tracker", None)
+    if tracker is not None:
+        for key, value in tracker.get_state().items():
+            arrays[f"tracker.{key}"] = value
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def read_meta(data: bytes) -> Dict[str, object]:
+    """
+    Version, save time, frame count and stream id of a snapshot, without its state.
+
+    Raises:
+        ValueError: If the data is not a snapshot of this version
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        if "meta.version" not in archive.files:
+            raise ValueError("Not a stream snapshot")
+        version = int(archive["meta.version"])
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        return {"version": version, "saved_at": float(archive["meta.saved_at"]),
+                "frames": int(archive["meta.frames"]), "stream_id": str(archive["meta.stream_id"])}
+
+
+def decode_snapshot(data: bytes, detectors: Dict[str, object], stream_id: str = None) -> int:
+    """
+    Restore detector state from a snapshot produced by encode_snapshot().
+
+    Detectors missing from the snapshot keep their current (fresh) state.
+    Wall-clock fields are rebased to the current time.
+
+    Args:
+        data: Snapshot bytes
+        detectors: {name: detector} of the stream being restored
+        stream_id: Stream being restored (optional); a snapshot of another stream is refused
+
+    Returns:
+        Frame count recorded in the snapshot
+
+    Raises:
+        ValueError: If the snapshot has another version or belongs to another stream
+    """
+    meta = read_meta(data)
+    if stream_id is not None and meta["stream_id"] != stream_id:
+        raise ValueError(f"Snapshot belongs to stream {meta['stream_id']!r}, not {stream_id!r}")
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        states: Dict[str, Dict[str, np.ndarray]] = {}
+        for key in archive.files:
+            owner, field = key.split(".", 1)
+            states.setdefault(owner, {})[field] = archive[key]
+
+    now = time.time()
+    for name, detector in detectors.items():
+        if name in states:
+            for field in TIME_FIELDS.get(name, ()):
+                if field in states[name]:
+                    states[name][field] = np.array(now + float(states[name][field]))
+            detector.set_state(states[name])
+    tracker = next((d.person_tracker for d in detectors.values()
+                    if getattr(d, "person_tracker", None) is not None), None)
+    if tracker is not None and "tracker" in states:
+        tracker.set_state(states["tracker"])
+    return meta["frames"]
+
+
+class SnapshotManager:
+    """
+    Periodic on-disk snapshots of every stream's detector state.
+
+    Each stream is written to "<directory>/<stream>-<hash>.snap" (atomically,
+    via a temporary file) every `interval` seconds if it has processed frames
+    since the last save. The hash of the raw stream id keeps ids that
+    sanitize to the same name apart. A stream created after a restart, or on
+    a node taking it over from another node sharing the directory, resumes
+    from its snapshot instead of re-learning its histories from scratch,
+    unless the snapshot is older than max_age.
+    """
+
+    def __init__(self, registry, directory: str, interval: float = 30.0, max_age: float = 3600.0):
+        """
+        Args:
+            registry: StreamRegistry whose streams are snapshotted
+            directory: Directory snapshot files are kept in
+            interval: Seconds between periodic saves
+            max_age: Seconds after which a snapshot file is too stale to restore
+        """
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.max_age = max_age
+        self._saved_frames: Dict[str, int] = {}
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, stream_id: str) -> str:
+        name = "".join(c if c.isalnum() or c in "-_" else "_" for c in stream_id)
+        digest = hashlib.sha1(stream_id.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory, f"{name}-{digest}.snap")
+
+    def export(self, stream_id: str) -> Optional[bytes]:
+        """Current state of a live stream, or None if it is not on this node."""
+        context = self.registry.peek(stream_id)
+        if context is None:
+            return None
+        with context.lock:
+            return encode_snapshot(context.detectors, context.frames, context.rule_state(), stream_id)
+
+    def load(self, context, data: bytes):
+        """
+        Apply snapshot bytes to a stream context.
+
+        Raises:
+            ValueError: If the snapshot is invalid or belongs to another stream
+        """
+        with context.lock:
+            context.frames = decode_snapshot(data, context.detectors, context.stream_id)
+            context.load_rule_state()
+        self._saved_frames[context.stream_id] = context.frames
+
+    def restore(self, context) -> bool:
+        """Restore a newly created stream from its snapshot file, if one exists."""
+        path = self.path(context.stream_id)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            age = time.time() - read_meta(data)["saved_at"]
+            if age > self.max_age:
+                logger.info(f"Ignoring snapshot {path}: saved {age:.0f}s ago (limit {self.max_age:.0f}s)")
+                return False
+            self.load(context, data)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return False
+        logger.info(f"Restored stream {context.stream_id} from snapshot ({context.frames} frames)")
+        return True
+
+    def save(self, stream_id: str) -> bool:
+        data = self.export(stream_id)
+        if data is None:
+            return False
+        path = self.path(stream_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def save_all(self) -> int:
+        """Save every stream that processed frames since its last save."""
+        saved = 0
+        for stream_id in self.registry.stream_ids():
+            context = self.registry.peek(stream_id)
+            if context is None or context.frames == self._saved_frames.get(stream_id):
+                continue
+            try:
+                if self.save(stream_id):
+                    self._saved_frames[stream_id] = context.frames
+                    saved += 1
+            except OSError as e:
+                logger.error(f"Error saving snapshot of stream {stream_id}: {e}")
+        return saved
+
+    def forget(self, stream_id: str):
+        """
+        Stop tracking a released stream.
+
+        The snapshot file is kept: with a shared directory it is the state the
+        stream's new node resumes from.
+        """
+        self._saved_frames.pop(stream_id, None)
+
+    def start(self):
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.save_all()
+        threading.Thread(target=loop, name="stream-snapshots", daemon=True).start()
+
+    def stop(self):
+        """Stop periodic saving and write a final snapshot of every stream."""
+        self._stop.set()
+        self.save_all()
@@ -0,0 +1,207 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+from detection.fight_detector import FightDetector
+from detection.drowsiness_detector import DrowsinessDetector
+from detection.behavior_detector import BehaviorDetector
+from detection.access_detector import AccessDetector
+from detection.person_tracker import PersonTracker
+from detection.pipeline import Pipeline
+from runtime.decoding import DecodedFrame, decode_stages
+from runtime.rule_engine import RuleEngine, RULE_DETECTORS
+
+def create_detectors(names: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    Build one camera's detector set, with a person tracker shared by fight and access.
+
+    Args:
+        names: Detectors to build (optional, all four by default)
+    """
+    names = {'fight', 'drowsiness', 'behavior', 'access'} if names is None else set(names)
+    person_tracker = PersonTracker() if names & {'fight', 'access'} else None
+    factories = {
+        'fight': lambda: FightDetector(person_tracker=person_tracker),
+        'drowsiness': DrowsinessDetector,
+        'behavior': BehaviorDetector,
+        'access': lambda: AccessDetector(person_tracker=person_tracker),
+    }
+    return {name: factory() for name, factory in factories.items() if name in names}
+
+
+class StreamContext:
+    """Temporal detection state of one camera stream on this node."""
+
+    def __init__(self, stream_id: str, detectors: Dict[str, Any], rule_engine: RuleEngine = None):
+        self.stream_id = stream_id
+        self.detectors = detectors
+        # One graph over all detectors: shared decodes and tracking run once per frame
+        self.pipeline = Pipeline(decode_stages() + [stage for detector in detectors.values()
+                                                    for stage in detector.pipeline_stages()])
+        # Rule-based detectors are scored by the multi-stream engine, which holds their histories
+        self.rule_engine = rule_engine
+        self.batched = [name for name, detector in detectors.items()
+                        if rule_engine is not None and name in RULE_DETECTORS and detector.model is None]
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.frames = 0
+        # Frames of one stream are processed in order (reentrant: the registry
+        # holds it while on_create restores the stream)
+        self.lock = threading.RLock()
+
+    def detect(self, decoded: DecodedFrame, names: List[str], ts: float = None) -> Dict[str, Any]:
+        """
+        Run one uploaded frame through the named detectors (caller holds the lock).
+        
+        Args:
+            decoded: The encoded frame
+            names: Detectors to run
+            ts: Capture time of the frame (optional, defaults to now)
+
+        Returns:
+            {detector_name: result}
+        """
+        keys = {name: self.detectors[name].observation_key if name in self.batched
+                else self.detectors[name].output_key for name in names}
+        outputs = self.pipeline.run({'encoded': decoded, 'ts': time.time() if ts is None else ts},
+                                    list(keys.values()))
+
+        scored = {}
+        observations = {name: outputs[keys[name]] for name in names if name in self.batched}
+        if observations:
+            scored = self.rule_engine.score(self.stream_id, observations)
+        return {name: scored[name] if name in scored else outputs[keys[name]] for name in names}
+
+    def set_model(self, name: str, model):
+        """
+        Swap a detector's model between frames (caller holds the lock).
+
+        Histories stay where they are, except when the detector switches
+        between a model and rule-based scoring by the rule engine: then they
+        move between the detector and the engine, so the stream keeps its
+        temporal state.
+
+        Args:
+            name: Detector name
+            model: The new Keras model, or None for rule-based detection
+        """
+        detector = self.detectors[name]
+        if self.rule_engine is not None and name in RULE_DETECTORS:
+            if model is not None and name in self.batched:
+                state = self.rule_engine.export_state(self.stream_id).get(name)
+                if state is not None:
+                    detector.set_state(state)
+                self.batched.remove(name)
+            elif model is None and name not in self.batched:
+                self.rule_engine.import_state(self.stream_id, {name: detector.get_state()})
+                self.batched.append(name)
+        detector.model = model
+
+    def rule_state(self) -> Dict[str, Dict[str, Any]]:
+        """Histories held by the rule engine, in the detectors' get_state() format."""
+        if not self.batched:
+            return {}
+        states = self.rule_engine.export_state(self.stream_id)
+        return {name: state for name, state in states.items() if name in self.batched}
+
+    def load_rule_state(self):
+        """Hand histories restored into the detectors over to the rule engine."""
+        if self.batched:
+            self.rule_engine.import_state(self.stream_id, {name: self.detectors[name].get_state()
+                                                           for name in self.batched})
+
+
+class StreamRegistry:
+    """
+    Per-stream detector instances, created on a stream's first frame.
+
+    Detector histories (motion, pose, positions, person counts) only make
+    sense within one camera, so each stream gets its own detectors; Keras
+    models are shared between them through the model cache.
+    """
+
+    def __init__(self, factory=create_detectors, idle_timeout: float = 600.0,
+                 on_create: Callable[[StreamContext], Any] = None, rule_engine: RuleEngine = None):
+        """
+        Args:
+            factory: Callable returning a {name: detector} dict for a new stream
+            idle_timeout: Seconds without frames after which a stream is dropped
+            on_create: Callback(context) for every new stream, e.g. to restore a snapshot
+            rule_engine: Multi-stream engine scoring rule-based detectors (optional)
+        """
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.on_create = on_create
+        self.rule_engine = rule_engine
+        self._streams: Dict[str, StreamContext] = {}
+        # Streams whose detectors are being built, resolved once they are published
+        self._creating: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_id: str) -> StreamContext:
+        """
+        Return the stream's context, creating its detectors if needed.
+
+        Detectors are built outside the registry lock, so a new stream does
+        not hold up frames of the others; concurrent first frames of the same
+        stream wait for the one context being built. on_create runs with the
+        new context's lock held, before any frame of the stream is detected.
+        """
+        with self._lock:
+            context = self._streams.get(stream_id)
+            if context is not None:
+                context.last_seen = time.time()
+                return context
+            pending = self._creating.get(stream_id)
+            creating = pending is None
+            if creating:
+                pending = self._creating[stream_id] = Future()
+
+        if not creating:
+            context = pending.result()
+            context.last_seen = time.time()
+            return context
+
+        try:
+            context = StreamContext(stream_id, self.factory(), self.rule_engine)
+        except BaseException as e:
+            with self._lock:
+                del self._creating[stream_id]
+            pending.set_exception(e)
+            raise
+        with context.lock:
+            with self._lock:
+                self._streams[stream_id] = context
+                del self._creating[stream_id]
+            pending.set_result(context)
+            if self.on_create:
+                self.on_create(context)
+        return context
+
+    def peek(self, stream_id: str) -> Optional[StreamContext]:
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def remove(self, stream_id: str) -> Optional[StreamContext]:
+        with self._lock:
+            context = self._streams.pop(stream_id, None)
+        if self.rule_engine is not None:
+            self.rule_engine.release(stream_id)
+        return context
+
+    def stream_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._streams)
+
+    def evict_idle(self) -> List[str]:
+        """Drop streams that have not sent a frame within idle_timeout."""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [stream_id for stream_id, context in self._streams.items() if context.last_seen < cutoff]
+            for stream_id in idle:
+                del self._streams[stream_id]
+        if self.rule_engine is not None:
+            for stream_id in idle:
+                self.rule_engine.release(stream_id)
+        return idle
@@ -0,0 +1,279 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, Tuple
+
+from runtime.frame_pool import SharedFramePool, FrameHandle
+
+logger = logging.getLogger('hostel-security-ai')
+
+def _create_detector(name: str):
+    """Instantiate a detector by its endpoint name inside a worker process."""
+    if name == 'fight':
+        from detection.fight_detector import FightDetector
+        return FightDetector()
+    if name == 'drowsiness':
+        from detection.drowsiness_detector import DrowsinessDetector
+        return DrowsinessDetector()
+    if name == 'behavior':
+        from detection.behavior_detector import BehaviorDetector
+        return BehaviorDetector()
+    if name == 'access':
+        from detection.access_detector import AccessDetector
+        return AccessDetector()
+    raise ValueError(f"Unknown detector: {name}")
+
+
+def _worker_main(name: str, pool: SharedFramePool, inbox, outbox, idle_timeout: float):
+    """Detector worker loop: map the frame slot and run detect(); the parent releases the slot."""
+    # One detector instance per camera stream, so temporal histories stay separate
+    detectors = {'default': _create_detector(name)}
+    last_seen = {'default': time.time()}
+    thresholds = None
+    next_sweep = time.time() + min(idle_timeout, 60.0)
+    outbox.put((None, name, "ready"))
+
+    while True:
+        try:
+            item = inbox.get(timeout=max(next_sweep - time.time(), 0.0))
+        except queue.Empty:
+            item = ()
+        if item is None:
+            break
+
+        now = time.time()
+        if now >= next_sweep:
+            # Drop streams that stopped sending frames, like StreamRegistry.evict_idle
+            for stream_id in [stream_id for stream_id, seen in last_seen.items() if seen < now - idle_timeout]:
+                detectors.pop(stream_id, None)
+                del last_seen[stream_id]
+            next_sweep = now + min(idle_timeout, 60.0)
+        if not item:
+            continue
+        if item[0] == 'thresholds':
+            # Settings change: applied between frames, like ConfigRegistry does in-process
+            thresholds = item[1]
+            for detector in detectors.values():
+                detector.thresholds = thresholds
+            continue
+
+        request_id, handle, stream_id, output_size = item
+        last_seen[stream_id] = now
+        try:
+            detector = detectors.get(stream_id)
+            if detector is None:
+                detector = detectors[stream_id] = _create_detector(name)
+                if thresholds is not None:
+                    detector.thresholds = thresholds
+            frame = pool.view(handle)
+            # The slot may hold a reduced decode; boxes are reported in the uploaded frame's size
+            result = (detector.detect(frame, output_size=output_size) if name == 'fight'
+                      else detector.detect(frame))
+            outbox.put((request_id, name, result))
+        except Exception as e:
+            outbox.put((request_id, name, {"error": str(e)}))
+
+
+class WorkerDied(Exception):
+    """A detector worker process exited before answering a frame."""
+
+
+class DetectorProcessGroup:
+    """
+    Runs each detector in its own process, fed with shared-memory frame handles.
+
+    Only FrameHandle tuples are sent to the workers, never pixel data. Every
+    submission takes one pool reference per target detector, and the group
+    drops each one as that detector's result arrives, so the slot is
+    recycled as soon as the slowest detector is done with it.
+
+    A monitor thread watches the worker processes. When one exits, the
+    frames it still owed fail with WorkerDied, their slot references are
+    dropped and the worker is started again. A worker that sits on a frame
+    for longer than hang_timeout is terminated and handled the same way.
+    Decision thresholds from set_thresholds() are sent through the same
+    inboxes as frames and sent again to a restarted worker.
+    """
+
+    def __init__(self, pool: SharedFramePool, detector_names: List[str], idle_timeout: float = 600.0,
+                 hang_timeout: float = 60.0, check_interval: float = 1.0):
+        """
+        Start one worker process per detector.
+
+        Args:
+            pool: Shared frame pool the workers read from
+            detector_names: Detector names ('fight', 'drowsiness', 'behavior', 'access')
+            idle_timeout: Seconds without frames after which a worker drops a stream's detector
+            hang_timeout: Seconds a worker may take over one frame before it is restarted
+            check_interval: Seconds between checks of the worker processes
+        """
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        self.hang_timeout = hang_timeout
+        self.check_interval = check_interval
+        self._ctx = mp.get_context('spawn')
+        self._outbox = self._ctx.Queue()
+        self._inboxes = {}
+        self._processes = {}
+        self._thresholds: Dict[str, Dict[str, float]] = {}
+        for name in detector_names:
+            self._start_worker(name)
+
+        self._ids = itertools.count()
+        # request_id -> {"future", "handle", "outstanding", "results", "submitted", "abandoned"}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        # Wait for every worker to finish loading its models
+        for _ in detector_names:
+            self._outbox.get()
+
+        self._collector = threading.Thread(target=self._collect, name="detector-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="detector-monitor", daemon=True)
+        self._monitor.start()
+
+    def _start_worker(self, name: str):
+        # A fresh inbox: frames queued for a dead worker have already been failed
+        inbox = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main,
+                                    args=(name, self.pool, inbox, self._outbox, self.idle_timeout),
+                                    name=f"detector-{name}", daemon=True)
+        process.start()
+        if name in self._thresholds:
+            inbox.put(('thresholds', self._thresholds[name]))
+        self._inboxes[name] = inbox
+        self._processes[name] = process
+
+    def set_thresholds(self, thresholds: Dict[str, Dict[str, float]]):
+        """
+        Give the workers' detectors new decision thresholds, between two frames.
+
+        Args:
+            thresholds: {detector_name: thresholds}; detectors without a worker are ignored
+        """
+        with self._pending_lock:
+            for name, values in thresholds.items():
+                if name in self._inboxes:
+                    self._thresholds[name] = values
+                    self._inboxes[name].put(('thresholds', values))
+
+    def submit(self, handle: FrameHandle, detector_names: List[str], stream_id: str = 'default',
+               output_size: Tuple[int, int] = None) -> Future:
+        """
+        Hand a frame of a camera stream to one or more detectors.
+
+        The caller keeps its own reference to the handle and may release it
+        right after submitting.
+
+        Args:
+            handle: Frame slot holding the (possibly reduced) decoded frame
+            detector_names: Detectors to run
+            stream_id: Camera stream the frame belongs to
+            output_size: (height, width) of the uploaded frame, which bounding
+                boxes are reported in (optional, defaults to the slot's frame size)
+
+        Returns:
+            Future resolving to {detector_name: result}, or failing with
+            WorkerDied if a worker exits before answering
+        """
+        future = Future()
+        request_id = next(self._ids)
+        self.pool.retain(handle, len(detector_names))
+        with self._pending_lock:
+            self._pending[request_id] = {"future": future, "handle": handle, "outstanding": set(detector_names),
+                                         "results": {}, "submitted": time.monotonic(), "abandoned": False}
+            # Under the lock, so a worker being restarted cannot miss the frame
+            for name in detector_names:
+                self._inboxes[name].put((request_id, handle, stream_id, output_size))
+        return future
+
+    def wait(self, future: Future, timeout: float) -> Dict[str, Any]:
+        """
+        Wait for a submitted frame's results.
+
+        On timeout the frame is abandoned: late results are dropped, and its
+        slot references are released as they arrive (or when the worker is
+        restarted).
+
+        Returns:
+            {detector_name: result}
+
+        Raises:
+            TimeoutError: If not every detector answered within timeout
+            WorkerDied: If a worker exited before answering
+        """
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            with self._pending_lock:
+                for entry in self._pending.values():
+                    if entry["future"] is future:
+                        entry["abandoned"] = True
+            raise TimeoutError(f"Detectors did not answer within {timeout:g}s") from None
+
+    def _resolve(self, request_id: int, entry: Dict[str, Any], name: str, result: Dict[str, Any] = None,
+                 error: Exception = None):
+        """Settle one detector of a pending frame (caller holds the pending lock)."""
+        entry["outstanding"].discard(name)
+        self.pool.release(entry["handle"])
+        if error is not None and not entry["abandoned"]:
+            entry["future"].set_exception(error)
+            entry["abandoned"] = True
+        elif result is not None:
+            entry["results"][name] = result
+        if not entry["outstanding"]:
+            del self._pending[request_id]
+            if not entry["abandoned"]:
+                entry["future"].set_result(entry["results"])
+
+    def _collect(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                break
+            request_id, name, result = item
+            with self._pending_lock:
+                entry = self._pending.get(request_id)
+                # Ready messages of restarted workers, and answers already failed with WorkerDied
+                if entry is None or name not in entry["outstanding"]:
+                    continue
+                self._resolve(request_id, entry, name, result=result)
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            now = time.monotonic()
+            with self._pending_lock:
+                hung = {name for entry in self._pending.values() if now - entry["submitted"] > self.hang_timeout
+                        for name in entry["outstanding"]}
+                for name, process in list(self._processes.items()):
+                    if name in hung and process.is_alive():
+                        logger.error(f"Detector worker {name} is stuck on a frame; terminating it")
+                        process.terminate()
+                        process.join(timeout=5)
+                    if process.is_alive() or self._stop.is_set():
+                        continue
+                    logger.error(f"Detector worker {name} exited (code {process.exitcode}); restarting it")
+                    error = WorkerDied(f"{name} worker process exited")
+                    for request_id, entry in list(self._pending.items()):
+                        if name in entry["outstanding"]:
+                            self._resolve(request_id, entry, name, error=error)
+                    self._inboxes[name].cancel_join_thread()
+                    self._start_worker(name)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        self._stop.set()
+        for inbox in self._inboxes.values():
+            inbox.put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+        self._outbox.put(None)
+        self._collector.join(timeout=5)
+        self._monitor.join(timeout=5)
+        logger.info("Detector worker processes stopped")
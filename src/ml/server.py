@@ -1,18 +1,32 @@
-
 import os
+import hmac
+import math
 import time
 import json
 import logging
-from flask import Flask, request, jsonify
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import numpy as np
 import cv2
 
 # Import detection modules
-from detection.fight_detector import FightDetector
-from detection.drowsiness_detector import DrowsinessDetector
-from detection.behavior_detector import BehaviorDetector
-from detection.access_detector import AccessDetector
+from runtime.streams import StreamRegistry
+from runtime.frame_pool import SharedFramePool, PoolExhausted
+from runtime.decoding import DecodedFrame
+from runtime.workers import DetectorProcessGroup, WorkerDied
+from runtime.alert_state import AlertTracker
+from runtime.clip_recorder import ClipRecorder
+from runtime.snapshots import SnapshotManager
+from runtime.rule_engine import RuleEngine
+from runtime.memory import MemoryGovernor, process_rss
+from runtime.profiler import SamplingProfiler
+from runtime.config_registry import ConfigRegistry, VersionConflict
+from runtime.protocol import (FRAMES_CONTENT_TYPE, RESULTS_CONTENT_TYPE, FrameResult,
+                              decode_frames, encode_results)
+from storage.event_store import EventStore
 
 # Configure logging
 logging.basicConfig(
@@ -24,40 +38,359 @@ logger = logging.getLogger('hostel-security-ai')
 app = Flask(__name__)
 CORS(app)
 
+# Multiprocess inference: detectors run in worker processes fed from a shared-memory frame pool
+WORKER_PROCESSES = os.environ.get('ML_WORKER_PROCESSES', '0') == '1'
+FRAME_POOL_SLOTS = int(os.environ.get('ML_FRAME_POOL_SLOTS', 16))
+WORKER_TIMEOUT = float(os.environ.get('ML_WORKER_TIMEOUT', 10.0))
+
+# Detection events are persisted here and served to the Alerts and Analytics pages
+EVENT_DB_PATH = os.environ.get('ML_EVENT_DB', os.path.join(os.path.dirname(__file__), 'data', 'events.db'))
+EVENT_RETENTION_DAYS = float(os.environ.get('ML_EVENT_RETENTION_DAYS', 90))
+
+# Incident clips: original JPEGs buffered per stream and written around fight/access incidents
+CLIP_DIR = os.environ.get('ML_CLIP_DIR', os.path.join(os.path.dirname(__file__), 'data', 'clips'))
+CLIP_PRE_SECONDS = float(os.environ.get('ML_CLIP_PRE_SECONDS', 10.0))
+CLIP_POST_SECONDS = float(os.environ.get('ML_CLIP_POST_SECONDS', 10.0))
+CLIP_BUFFER_MB = float(os.environ.get('ML_CLIP_BUFFER_MB', 32))
+CLIP_DETECTORS = ('fight', 'access')
+
+# Score rule-based detectors of all streams together in vectorized ticks
+RULE_ENGINE = os.environ.get('ML_RULE_ENGINE', '0') == '1'
+RULE_TICK = float(os.environ.get('ML_RULE_TICK', 0.005))
+
+# Memory budgets: per stream (downsample histories and frame buffers) and per
+# process (evict idle streams, then reject new ones); 0 disables a budget
+STREAM_MEMORY_MB = float(os.environ.get('ML_STREAM_MEMORY_MB', 0))
+PROCESS_MEMORY_MB = float(os.environ.get('ML_PROCESS_MEMORY_MB', 0))
+MEMORY_CHECK_INTERVAL = float(os.environ.get('ML_MEMORY_CHECK_INTERVAL', 10.0))
+
+# Streams without frames for this long release their detector state
+STREAM_IDLE_TIMEOUT = float(os.environ.get('ML_STREAM_IDLE_TIMEOUT', 600))
+
+# Detector state snapshots, restored when a stream is recreated after a restart or handoff
+SNAPSHOT_DIR = os.environ.get('ML_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'data', 'snapshots'))
+SNAPSHOT_INTERVAL = float(os.environ.get('ML_SNAPSHOT_INTERVAL', 30.0))
+SNAPSHOT_MAX_AGE = float(os.environ.get('ML_SNAPSHOT_MAX_AGE', 3600.0))
+
+# Threads running the cameras of one binary batch request in parallel
+BATCH_WORKERS = int(os.environ.get('ML_BATCH_WORKERS', 8))
+
+# Admin endpoints (profiling, settings changes) require this token; they are disabled when it is unset
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.environ.get('ML_PROFILE_MAX_SECONDS', 60))
+
+# Detector settings (enabled flags, alert and decision thresholds), watched
+# together with the model files and applied to live streams when they change
+CONFIG_PATH = os.environ.get('ML_CONFIG_PATH', os.path.join(os.path.dirname(__file__), 'data', 'detector_config.json'))
+CONFIG_POLL_INTERVAL = float(os.environ.get('ML_CONFIG_POLL_INTERVAL', 5.0))
+
+# Identifies this node to the stream router
+NODE_ID = os.environ.get('ML_NODE_ID', f"node-{os.getpid()}")
+
+DETECTOR_NAMES = ['fight', 'drowsiness', 'behavior', 'access']
+MODEL_PATHS = {name: os.path.join(os.path.dirname(__file__), 'models', f'{name}_detection', 'model.h5')
+               for name in DETECTOR_NAMES}
+
+# Days covered by each analytics period
+ANALYTICS_PERIODS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+stream_registry = None
+frame_pool = None
+worker_group = None
+event_store = None
+clip_recorder = None
+snapshot_manager = None
+memory_governor = None
+config_registry = None
+batch_executor = None
+alert_tracker = AlertTracker()
+profile_lock = threading.Lock()
+
 # Initialize detection models
 @app.before_first_request
 def load_models():
-    global fight_detector, drowsiness_detector, behavior_detector, access_detector
-    
+    global stream_registry, frame_pool, worker_group, event_store, clip_recorder, snapshot_manager
+    global memory_governor, config_registry
+
     logger.info("Loading ML models...")
-    
+
+    event_store = EventStore(EVENT_DB_PATH, retention_days=EVENT_RETENTION_DAYS)
+    clip_recorder = ClipRecorder(CLIP_DIR, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS,
+                                 max_buffer_bytes=int(CLIP_BUFFER_MB * 1024 * 1024))
+
     # Load models with error handling
     try:
-        fight_detector = FightDetector()
-        drowsiness_detector = DrowsinessDetector()
-        behavior_detector = BehaviorDetector()
-        access_detector = AccessDetector()
+        if WORKER_PROCESSES:
+            frame_pool = SharedFramePool(num_slots=FRAME_POOL_SLOTS)
+            worker_group = DetectorProcessGroup(frame_pool, DETECTOR_NAMES, idle_timeout=STREAM_IDLE_TIMEOUT)
+            logger.info(f"Detectors running in {len(DETECTOR_NAMES)} worker processes")
+        else:
+            # Detectors are created per camera stream; load the shared models now
+            rule_engine = RuleEngine(tick_interval=RULE_TICK) if RULE_ENGINE else None
+            stream_registry = StreamRegistry(idle_timeout=STREAM_IDLE_TIMEOUT, on_create=_on_stream_created,
+                                             rule_engine=rule_engine)
+            snapshot_manager = SnapshotManager(stream_registry, SNAPSHOT_DIR, interval=SNAPSHOT_INTERVAL,
+                                               max_age=SNAPSHOT_MAX_AGE)
+            snapshot_manager.start()
+            memory_governor = MemoryGovernor(stream_registry, clip_recorder,
+                                             stream_budget=int(STREAM_MEMORY_MB * 1024 * 1024),
+                                             process_budget=int(PROCESS_MEMORY_MB * 1024 * 1024),
+                                             check_interval=MEMORY_CHECK_INTERVAL, on_evict=_evict_stream)
+            memory_governor.start()
+        # Thresholds and models change in place from now on; worker processes load their models at start
+        config_registry = ConfigRegistry(CONFIG_PATH, MODEL_PATHS if stream_registry is not None else {},
+                                         registry=stream_registry, alert_tracker=alert_tracker,
+                                         poll_interval=CONFIG_POLL_INTERVAL, workers=worker_group)
+        config_registry.start()
+        # Incidents of cameras that stop sending frames still close
+        alert_tracker.start(on_expired=_log_expired_incidents)
+        if stream_registry is not None:
+            stream_registry.get('default')
         logger.info("All models loaded successfully")
     except Exception as e:
         logger.error(f"Error loading models: {e}")
         raise
 
+def _log_expired_incidents(events):
+    for event in events:
+        logger.info(f"Closed incident {event['incident_id']}: no frames for {event['duration']:.0f}s")
+
+def _on_stream_created(context):
+    config_registry.configure(context)
+    snapshot_manager.restore(context)
+
+def _evict_stream(stream_id):
+    """Save an evicted stream's state so it resumes where it left off if it returns."""
+    try:
+        snapshot_manager.save(stream_id)
+    except OSError as e:
+        logger.error(f"Error saving snapshot of evicted stream {stream_id}: {e}")
+    snapshot_manager.forget(stream_id)
+    alert_tracker.reset(stream_id)
+
+def _is_admin():
+    """Whether the request carries the admin token (Authorization: Bearer or X-Admin-Token)."""
+    auth = request.headers.get('Authorization', '')
+    token = auth[7:] if auth.startswith('Bearer ') else request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def _enabled(names):
+    """The named detectors that are switched on in the detector settings."""
+    return [name for name in names if config_registry.enabled(name)]
+
+def _stream_id():
+    """Camera stream a request belongs to."""
+    return request.values.get('camera_id') or request.headers.get('X-Camera-Id') or 'default'
+
+class StreamRejected(Exception):
+    """A frame turned away because the node is over its memory budget."""
+
+class DetectorFailed(Exception):
+    """A detector worker process reported an error, timed out or died instead of answering."""
+
+def _detect_frame(stream_id, data, names, ts=None, camera='', location=''):
+    """
+    Decode one encoded frame once and run it through the named detectors.
+
+    Args:
+        stream_id: Camera stream the frame belongs to
+        data: Encoded (JPEG) frame bytes
+        names: Detectors to run
+        ts: Capture time of the frame (optional, defaults to arrival)
+        camera: Camera name stored with opened incidents
+        location: Camera location stored with opened incidents
+
+    Returns:
+        Tuple of ({detector_name: result}, incident events)
+
+    Raises:
+        StreamRejected: If the stream is new and the node is over its memory budget
+        PoolExhausted: If every shared frame slot is in use (worker mode)
+        DetectorFailed: If a worker process could not run its detector on the frame
+    """
+    decoded = DecodedFrame(data)
+    ts = time.time() if ts is None else ts
+
+    # New streams are turned away while the process is over its memory budget
+    if memory_governor is not None and not memory_governor.admit(stream_id):
+        raise StreamRejected("Node is over its memory budget; stream rejected")
+
+    # Keep the compressed frame for incident clips
+    clip_recorder.add_frame(stream_id, data)
+
+    if worker_group is not None:
+        # Decode, then copy once into shared memory; workers receive only the slot handle.
+        # Frames larger than a slot are downscaled; fight boxes are still reported
+        # in the original size
+        handle = frame_pool.put(frame_pool.fit(decoded.smallest_color_for(names)))
+        try:
+            future = worker_group.submit(handle, names, stream_id, output_size=decoded.size)
+        finally:
+            frame_pool.release(handle)
+        try:
+            results = worker_group.wait(future, WORKER_TIMEOUT)
+        except (TimeoutError, WorkerDied) as e:
+            raise DetectorFailed(str(e)) from e
+        failed = [f"{name}: {result['error']}" for name, result in results.items() if "error" in result]
+        if failed:
+            raise DetectorFailed("; ".join(failed))
+    else:
+        # Run the stream's detection graph: each decode variant and shared
+        # stage runs once, independent branches in parallel
+        context = stream_registry.get(stream_id)
+        with context.lock:
+            results = context.detect(decoded, names, ts)
+            context.frames += 1
+
+    return results, _update_incidents(stream_id, results, ts, camera, location)
+
+def _run_detection(names):
+    """
+    Run the uploaded frame through the named detectors.
+
+    The response carries the detector result(s) plus an "events" list with
+    the incident transitions (open/update/close) this frame caused. With a
+    `delta=1` form field or query argument only the events are returned.
+    An optional `ts` field gives the frame's capture time (epoch seconds);
+    without it the frame is timed on arrival. Detectors switched off in the
+    detector settings are skipped.
+
+    Returns:
+        Tuple of (response dict, None) or (None, error response)
+    """
+    # Get video frame from request
+    file = request.files.get('frame')
+    if not file:
+        return None, (jsonify({"error": "No frame provided"}), 400)
+
+    ts = request.values.get('ts')
+    if ts is not None:
+        try:
+            ts = float(ts)
+        except ValueError:
+            ts = math.nan
+        if not math.isfinite(ts) or ts <= 0:
+            return None, (jsonify({"error": "ts must be the capture time in epoch seconds"}), 400)
+
+    requested, names = names, _enabled(names)
+    if not names:
+        return None, (jsonify({"error": f"{', '.join(requested)} detection is disabled"}), 409)
+
+    try:
+        results, events = _detect_frame(_stream_id(), file.read(), names, ts,
+                                        camera=request.form.get('camera_name', ''),
+                                        location=request.form.get('location', ''))
+    except (StreamRejected, PoolExhausted) as e:
+        return None, (jsonify({"error": str(e)}), 503)
+
+    if (request.values.get('delta') or '0') != '0':
+        return {"events": events}, None
+    if len(requested) == 1:
+        return dict(results[names[0]], events=events), None
+    return dict(results, events=events), None
+
+def _is_binary_request():
+    return request.mimetype == FRAMES_CONTENT_TYPE
+
+def _run_binary(names=None):
+    """
+    Run a binary frames message (see runtime/protocol.py) and answer in kind.
+
+    The message may carry several frames of several cameras. Frames of one
+    camera run in order; different cameras run in parallel. Each frame gets
+    its own status, so one rejected stream does not fail the batch. The
+    response is a binary results message unless the client only accepts JSON.
+
+    Args:
+        names: Detectors to run (optional, defaults to the message's detector mask)
+    """
+    try:
+        requested, delta, frames = decode_frames(request.get_data())
+    except (ValueError, struct.error) as e:
+        return jsonify({"error": f"Invalid frames message: {e}"}), 400
+    names = names or requested
+    if not names or not frames:
+        return jsonify({"error": "No frames or detectors in message"}), 400
+    # Disabled detectors are left out of the results
+    names = _enabled(names)
+    if not names:
+        return jsonify({"error": "All requested detectors are disabled"}), 409
+
+    items = [None] * len(frames)
+    streams = {}
+    for i, frame in enumerate(frames):
+        streams.setdefault(frame.camera_id or 'default', []).append(i)
+
+    def run_stream(stream_id, indices):
+        for i in indices:
+            frame = frames[i]
+            try:
+                results, events = _detect_frame(stream_id, frame.data, names, frame.ts,
+                                                frame.camera_name, frame.location)
+                items[i] = FrameResult(stream_id, 200, {} if delta else results, events)
+            except (StreamRejected, PoolExhausted) as e:
+                items[i] = FrameResult(stream_id, 503, {}, [], str(e))
+            except DetectorFailed as e:
+                logger.error(f"Detector error for stream {stream_id}: {e}")
+                items[i] = FrameResult(stream_id, 500, {}, [], str(e))
+            except Exception as e:
+                logger.error(f"Error in batched detection for stream {stream_id}: {e}")
+                items[i] = FrameResult(stream_id, 500, {}, [], str(e))
+
+    if len(streams) == 1:
+        run_stream(*next(iter(streams.items())))
+    else:
+        for future in [_batch_executor().submit(run_stream, stream_id, indices)
+                       for stream_id, indices in streams.items()]:
+            future.result()
+
+    if request.accept_mimetypes.best_match([RESULTS_CONTENT_TYPE, 'application/json']) == 'application/json':
+        return jsonify({"results": [dict(item.results, stream_id=item.stream_id, status=item.status,
+                                         events=item.events, **({"error": item.error} if item.error else {}))
+                                    for item in items]})
+    return app.response_class(encode_results(items), mimetype=RESULTS_CONTENT_TYPE)
+
+def _batch_executor():
+    global batch_executor
+    if batch_executor is None:
+        batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+    return batch_executor
+
+def _update_incidents(camera_id, results, ts, camera='', location=''):
+    """Advance the per-stream incident state with a frame captured at ts and store newly opened incidents."""
+    events = []
+    for name, result in results.items():
+        for event in alert_tracker.observe(camera_id, name, result, now=ts):
+            events.append(event)
+            if event["event"] != 'open':
+                continue
+            details = result
+            if name in CLIP_DETECTORS:
+                clip = clip_recorder.trigger(camera_id, event["incident_id"])
+                if clip:
+                    event["clip"] = os.path.basename(clip)
+                    details = dict(result, clip=event["clip"])
+            # Opened incidents become alerts (written in the background)
+            event_store.record(dict(
+                event["alert"],
+                camera_id=camera_id,
+                camera=camera,
+                location=location,
+                details=details
+            ))
+    return events
+
 # Routes for different detection types
 @app.route('/api/detect/fight', methods=['POST'])
 def detect_fight():
     try:
-        # Get video frame from request
-        file = request.files.get('frame')
-        if not file:
-            return jsonify({"error": "No frame provided"}), 400
-            
-        # Process image
-        img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
-        
-        # Run detection
-        results = fight_detector.detect(img)
-        
-        return jsonify(results)
+        if _is_binary_request():
+            return _run_binary(['fight'])
+        response, error = _run_detection(['fight'])
+        if error:
+            return error
+
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error in fight detection: {e}")
         return jsonify({"error": str(e)}), 500
@@ -65,18 +398,13 @@ def detect_fight():
 @app.route('/api/detect/drowsiness', methods=['POST'])
 def detect_drowsiness():
     try:
-        # Get video frame from request
-        file = request.files.get('frame')
-        if not file:
-            return jsonify({"error": "No frame provided"}), 400
-            
-        # Process image
-        img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
-        
-        # Run detection
-        results = drowsiness_detector.detect(img)
-        
-        return jsonify(results)
+        if _is_binary_request():
+            return _run_binary(['drowsiness'])
+        response, error = _run_detection(['drowsiness'])
+        if error:
+            return error
+
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error in drowsiness detection: {e}")
         return jsonify({"error": str(e)}), 500
@@ -84,18 +412,13 @@ def detect_drowsiness():
 @app.route('/api/detect/behavior', methods=['POST'])
 def detect_behavior():
     try:
-        # Get video frame from request
-        file = request.files.get('frame')
-        if not file:
-            return jsonify({"error": "No frame provided"}), 400
-            
-        # Process image
-        img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
-        
-        # Run detection
-        results = behavior_detector.detect(img)
-        
-        return jsonify(results)
+        if _is_binary_request():
+            return _run_binary(['behavior'])
+        response, error = _run_detection(['behavior'])
+        if error:
+            return error
+
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error in behavior detection: {e}")
         return jsonify({"error": str(e)}), 500
@@ -103,25 +426,215 @@ def detect_behavior():
 @app.route('/api/detect/access', methods=['POST'])
 def detect_access():
     try:
-        # Get video frame from request
-        file = request.files.get('frame')
-        if not file:
-            return jsonify({"error": "No frame provided"}), 400
-            
-        # Process image
-        img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
-        
-        # Run detection
-        results = access_detector.detect(img)
-        
-        return jsonify(results)
+        if _is_binary_request():
+            return _run_binary(['access'])
+        response, error = _run_detection(['access'])
+        if error:
+            return error
+
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error in access detection: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/detect/all', methods=['POST'])
+def detect_all():
+    """Run every detector on one uploaded frame, decoding it only once."""
+    try:
+        if _is_binary_request():
+            return _run_binary(DETECTOR_NAMES)
+        response, error = _run_detection(DETECTOR_NAMES)
+        if error:
+            return error
+
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error in combined detection: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/detect/batch', methods=['POST'])
+def detect_batch():
+    """Run a binary message of frames from one or more cameras through the detectors it selects."""
+    try:
+        if not _is_binary_request():
+            return jsonify({"error": f"Expected {FRAMES_CONTENT_TYPE}"}), 415
+        return _run_binary()
+    except Exception as e:
+        logger.error(f"Error in batched detection: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/alerts', methods=['GET'])
+def list_alerts():
+    """Page through stored alerts, newest first, using the dashboard's filters."""
+    try:
+        args = request.args
+        alerts = event_store.query_alerts(
+            status=args.get('status'),
+            severity=args.get('severity'),
+            type=args.get('type'),
+            camera_id=args.get('camera'),
+            date_from=args.get('from'),
+            date_to=args.get('to'),
+            before_id=args.get('before', type=int),
+            before_ts=args.get('before_ts', type=float),
+            limit=args.get('limit', 50, type=int)
+        )
+        return jsonify(alerts)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error listing alerts: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/alerts/<int:alert_id>', methods=['GET'])
+def get_alert(alert_id):
+    alert = event_store.get_alert(alert_id)
+    if alert is None:
+        return jsonify({"error": "Alert not found"}), 404
+    return jsonify(alert)
+
+@app.route('/api/alerts/<int:alert_id>/status', methods=['PUT'])
+def update_alert_status(alert_id):
+    try:
+        status = (request.get_json(silent=True) or {}).get('status')
+        alert = event_store.update_status(alert_id, status)
+        if alert is None:
+            return jsonify({"error": "Alert not found"}), 404
+        return jsonify(alert)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating alert {alert_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+def analytics():
+    try:
+        days = ANALYTICS_PERIODS.get(request.args.get('period', 'week'), 7)
+        return jsonify(event_store.analytics(days))
+    except Exception as e:
+        logger.error(f"Error computing analytics: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/clips/<path:name>', methods=['GET'])
+def get_clip(name):
+    """Download an incident clip (.mjpeg) or its frame index (.json)."""
+    return send_from_directory(CLIP_DIR, name)
+
+@app.route('/api/streams', methods=['GET'])
+def list_streams():
+    """Camera streams with detector state on this node."""
+    if stream_registry is None:
+        return jsonify({"node": NODE_ID, "streams": []})
+    stream_registry.evict_idle()
+    return jsonify({"node": NODE_ID, "streams": stream_registry.stream_ids()})
+
+@app.route('/api/streams/<stream_id>', methods=['DELETE'])
+def release_stream(stream_id):
+    """Drop a stream's state, e.g. after the router moved it to another node."""
+    removed = stream_registry is not None and stream_registry.remove(stream_id) is not None
+    if snapshot_manager is not None:
+        snapshot_manager.forget(stream_id)
+    clip_recorder.release(stream_id)
+    alert_tracker.reset(stream_id)
+    return jsonify({"node": NODE_ID, "stream": stream_id, "released": removed})
+
+@app.route('/api/streams/<stream_id>/snapshot', methods=['GET'])
+def export_snapshot(stream_id):
+    """Binary snapshot of a stream's detector state, for handing it to another node."""
+    data = snapshot_manager.export(stream_id) if snapshot_manager is not None else None
+    if data is None:
+        return jsonify({"error": f"Stream {stream_id} is not on this node"}), 404
+    return app.response_class(data, mimetype='application/octet-stream')
+
+@app.route('/api/streams/<stream_id>/snapshot', methods=['PUT'])
+def import_snapshot(stream_id):
+    """Resume a stream from a snapshot exported by another node."""
+    if snapshot_manager is None:
+        return jsonify({"error": "Snapshots are not available in worker-process mode"}), 409
+    context = stream_registry.get(stream_id)
+    try:
+        snapshot_manager.load(context, request.get_data())
+    except (ValueError, KeyError, OSError) as e:
+        return jsonify({"error": f"Invalid snapshot: {e}"}), 400
+    return jsonify({"node": NODE_ID, "stream": stream_id, "frames": context.frames})
+
+@app.route('/api/memory', methods=['GET'])
+def memory_report():
+    """Memory accounted per stream and detector, with process RSS and budgets."""
+    if memory_governor is None:
+        return jsonify({"node": NODE_ID, "rss": process_rss(), "streams": {}})
+    return jsonify(dict(memory_governor.report(), node=NODE_ID))
+
+@app.route('/api/settings', methods=['GET'])
+def get_settings():
+    """Detector settings with their version, the defaults and the loaded model versions."""
+    return jsonify(dict(config_registry.settings(), node=NODE_ID))
+
+@app.route('/api/settings', methods=['PUT'])
+def update_settings():
+    """
+    Change detector settings on the running node, without restarting streams.
+
+    The body uses the GET format; only the settings to change need to be
+    given. Including the `version` the changes were based on makes the
+    update fail with 409 if someone else changed the settings meanwhile.
+    Requires the admin token; changes are refused while ML_ADMIN_TOKEN is unset.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Settings changes are disabled (set ML_ADMIN_TOKEN)"}), 403
+    if not _is_admin():
+        return jsonify({"error": "Admin token required"}), 403
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    version = body.pop('version', None)
+    try:
+        return jsonify(dict(config_registry.update(body, expected_version=version), node=NODE_ID))
+    except VersionConflict as e:
+        return jsonify({"error": str(e), "version": config_registry.version}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except OSError as e:
+        logger.error(f"Error saving detector settings: {e}")
+        return jsonify({"error": "Could not save settings"}), 500
+
+@app.route('/api/admin/profile', methods=['GET'])
+def profile():
+    """
+    Sample every thread of this process for a while and return the aggregated stacks.
+
+    Query args: seconds (default 10), interval (seconds between samples,
+    default 0.01), idle=1 to include blocked threads, format=collapsed
+    (flamegraph text, the default) or json (with per-detector attribution).
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (set ML_ADMIN_TOKEN)"}), 404
+    if not _is_admin():
+        return jsonify({"error": "Admin token required"}), 403
+
+    seconds = request.args.get('seconds', 10.0, type=float)
+    interval = request.args.get('interval', 0.01, type=float)
+    if not (math.isfinite(seconds) and seconds > 0 and math.isfinite(interval) and interval > 0):
+        return jsonify({"error": "seconds and interval must be positive numbers"}), 400
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    interval = max(interval, 0.001)
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        logger.info(f"Profiling for {seconds:.0f}s at {interval * 1000:.0f}ms intervals")
+        profiler = SamplingProfiler(interval, include_idle=request.args.get('idle') == '1').run(seconds)
+    finally:
+        profile_lock.release()
+
+    if request.args.get('format') == 'json':
+        return jsonify(dict(profiler.report(), node=NODE_ID))
+    return app.response_class(profiler.collapsed(), mimetype='text/plain')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "models_loaded": True})
+    return jsonify({"status": "ok", "models_loaded": True, "node": NODE_ID,
+                    "event_store": event_store.store_id if event_store is not None else None})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from storage.rollups import AnalyticsRollups
+
+logger = logging.getLogger('hostel-security-ai')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    camera TEXT NOT NULL DEFAULT '',
+    location TEXT NOT NULL DEFAULT '',
+    type TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    confidence REAL NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_status_ts ON events (status, ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+ALERT_STATUSES = ('pending', 'investigating', 'resolved')
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL makes NORMAL durable against application crashes and much cheaper than FULL
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _day_start(date: str) -> float:
+    """
+    Epoch seconds at local midnight of a YYYY-MM-DD date.
+
+    Raises:
+        ValueError: If the date is not in YYYY-MM-DD form
+    """
+    try:
+        return time.mktime(time.strptime(date, "%Y-%m-%d"))
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}; expected YYYY-MM-DD") from None
+
+
+class EventStore:
+    """
+    Append-only SQLite store for detection events.
+
+    Inference threads only enqueue events; a background writer drains the
+    queue and inserts them in batches, one transaction per batch, so storage
+    latency never lands on the request path. Reads use per-thread
+    connections and benefit from WAL's concurrent readers.
+
+    Each batch also updates the analytics rollups, and raw events older than
+    the retention period are periodically compacted away.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.5,
+                 max_pending: int = 100000, retention_days: float = 90,
+                 compact_interval: float = 3600):
+        """
+        Open (or create) the event store.
+
+        Args:
+            path: SQLite database file
+            batch_size: Maximum events written per transaction
+            flush_interval: Seconds the writer waits before committing a partial batch
+            max_pending: Queue bound; events beyond it are dropped rather than blocking inference
+            retention_days: Age after which raw events are compacted (None keeps them forever)
+            compact_interval: Seconds between compaction runs
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+
+        self._write_conn = _connect(path)
+        self._write_conn.executescript(SCHEMA)
+        # Identifies the database, so nodes sharing one can tell (see cluster/router.py)
+        self._write_conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)",
+                                 (uuid.uuid4().hex,))
+        self._write_conn.commit()
+        self.store_id = self._write_conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+        self.rollups = AnalyticsRollups(self._write_conn)
+        self._last_compaction = time.monotonic()
+
+        self._readers = threading.local()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._dropped = 0
+        self._writer = threading.Thread(target=self._write_loop, name="event-writer", daemon=True)
+        self._writer.start()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = _connect(self.path)
+            self._readers.conn = conn
+        return conn
+
+    def record(self, event: Dict[str, Any]):
+        """
+        Queue an event for writing. Never blocks.
+
+        Args:
+            event: Dictionary with camera_id, type, detector, severity, confidence,
+                title and description; optional ts, camera, location, status, details
+        """
+        event.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped % 1000 == 1:
+                logger.warning(f"Event store backlog full, {self._dropped} events dropped")
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every event queued so far has been written."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            batch, markers = [], []
+            try:
+                item = self._queue.get(timeout=self.compact_interval)
+            except queue.Empty:
+                self._maybe_compact()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._insert(batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing {len(batch)} events: {e}")
+            for marker in markers:
+                marker.set()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.retention_days is None or time.monotonic() - self._last_compaction < self.compact_interval:
+            return
+        self._last_compaction = time.monotonic()
+        try:
+            deleted = self.rollups.compact(self._write_conn, self.retention_days)
+            if deleted:
+                logger.info(f"Compacted {deleted} events older than {self.retention_days} days")
+        except sqlite3.Error as e:
+            logger.error(f"Error compacting events: {e}")
+
+    def _insert(self, batch: List[Dict[str, Any]]):
+        rows = [(
+            e["ts"], str(e["camera_id"]), e.get("camera", ""), e.get("location", ""),
+            e["type"], e["detector"], e["severity"], e.get("status", "pending"),
+            float(e["confidence"]), e["title"], e["description"],
+            json.dumps(e["details"]) if e.get("details") is not None else None,
+        ) for e in batch]
+        with self._write_conn:
+            self._write_conn.executemany(
+                "INSERT INTO events (ts, camera_id, camera, location, type, detector, severity, "
+                "status, confidence, title, description, details) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.rollups.apply(self._write_conn, batch)
+
+    def query_alerts(self, status: str = None, severity: str = None, type: str = None,
+                     camera_id: str = None, date_from: str = None, date_to: str = None,
+                     before_id: int = None, before_ts: float = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Page through events, newest first.
+
+        Filters map to indexed columns; paging is keyset based (pass the id of
+        the last alert of the previous page as before_id), so deep pages cost
+        the same as the first one. before_ts pages by time alone, for cursors
+        taken from another store.
+
+        Returns:
+            List of alerts in the frontend Alert shape; empty if before_id is
+            not (or no longer, after compaction) in the store
+
+        Raises:
+            ValueError: If date_from or date_to is not a YYYY-MM-DD date
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if type:
+            clauses.append("type = ?")
+            params.append(type)
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(str(camera_id))
+        if date_from:
+            clauses.append("ts >= ?")
+            params.append(_day_start(date_from))
+        if date_to:
+            clauses.append("ts < ?")
+            params.append(_day_start(date_to) + 86400)
+        if before_id is not None:
+            cursor = self._reader().execute("SELECT ts FROM events WHERE id = ?",
+                                            (int(before_id),)).fetchone()
+            if cursor is None:
+                # Nothing is known to be older than an unknown cursor
+                return []
+            # (ts, id) matches the trailing columns of every index
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend([cursor["ts"], int(before_id)])
+        if before_ts is not None:
+            clauses.append("ts < ?")
+            params.append(float(before_ts))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            params + [max(1, min(int(limit), 500))]).fetchall()
+        return [self._to_alert(row) for row in rows]
+
+    def get_alert(self, alert_id: int) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute("SELECT * FROM events WHERE id = ?", (alert_id,)).fetchone()
+        return self._to_alert(row) if row else None
+
+    def update_status(self, alert_id: int, status: str) -> Optional[Dict[str, Any]]:
+        """Set the workflow status of an alert; the only mutation of stored events."""
+        if status not in ALERT_STATUSES:
+            raise ValueError(f"Invalid status: {status}")
+        conn = self._reader()
+        with conn:
+            conn.execute("UPDATE events SET status = ? WHERE id = ?", (status, alert_id))
+        return self.get_alert(alert_id)
+
+    def analytics(self, days: int) -> Dict[str, Any]:
+        """Dashboard analytics for the last `days` days, served from the rollups."""
+        return self.rollups.summary(self._reader(), days)
+
+    @staticmethod
+    def _to_alert(row: sqlite3.Row) -> Dict[str, Any]:
+        local = time.localtime(row["ts"])
+        return {
+            "id": row["id"],
+            "ts": row["ts"],
+            "type": row["type"],
+            "title": row["title"],
+            "description": row["description"],
+            "location": row["location"],
+            "camera": row["camera"],
+            "date": time.strftime("%Y-%m-%d", local),
+            "time": time.strftime("%H:%M", local),
+            "severity": row["severity"],
+            "status": row["status"],
+            "confidence": row["confidence"],
+            "cameraId": row["camera_id"],
+        }
+
+    def close(self):
+        self.flush()
+        self._write_conn.close()
@@ -0,0 +1,211 @@
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+# Confidence histogram resolution (bins of width 0.1 over [0, 1])
+HISTOGRAM_BINS = 10
+
+HOUR = 'hour'
+DAY = 'day'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    camera_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    confidence_sum REAL NOT NULL DEFAULT 0,
+    {histogram_columns},
+    PRIMARY KEY (granularity, bucket, camera_id, type)
+) WITHOUT ROWID;
+""".format(histogram_columns=",\n    ".join(
+    f"h{i} INTEGER NOT NULL DEFAULT 0" for i in range(HISTOGRAM_BINS)))
+
+_HISTOGRAM = [f"h{i}" for i in range(HISTOGRAM_BINS)]
+
+_UPSERT = (
+    f"INSERT INTO rollups (granularity, bucket, camera_id, type, location, count, confidence_sum, "
+    f"{', '.join(_HISTOGRAM)}) VALUES (?, ?, ?, ?, ?, ?, ?, {', '.join('?' * HISTOGRAM_BINS)}) "
+    f"ON CONFLICT (granularity, bucket, camera_id, type) DO UPDATE SET "
+    f"location = excluded.location, count = count + excluded.count, "
+    f"confidence_sum = confidence_sum + excluded.confidence_sum, "
+    + ", ".join(f"{h} = {h} + excluded.{h}" for h in _HISTOGRAM)
+)
+
+# Chart label of each bucket, by granularity
+_LABEL_FORMATS = {HOUR: "%H:00", DAY: "%a"}
+
+_TYPE_KEYS = {
+    'altercation': 'altercations',
+    'unauthorized': 'unauthorized',
+    'behavioral': 'behavioral',
+    'staff': 'staff',
+}
+
+def hour_bucket(ts: float) -> int:
+    """Epoch seconds of the start of the local hour of ts (not a UTC hour, in half-hour offset zones)."""
+    local = time.localtime(ts)
+    return int(ts) - local.tm_min * 60 - local.tm_sec
+
+
+def day_bucket(ts: float) -> int:
+    """Epoch seconds of local midnight on the day of ts."""
+    local = time.localtime(ts)
+    return int(time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1)))
+
+
+def _bin(confidence: float) -> int:
+    return min(HISTOGRAM_BINS - 1, max(0, int(confidence * HISTOGRAM_BINS)))
+
+
+class AnalyticsRollups:
+    """
+    Pre-aggregated event counts per camera, alert type and hour/day bucket.
+
+    Rollups are updated in the same transaction as each batch of raw events,
+    so they are always consistent with the event table. Dashboard queries
+    read a handful of rollup rows per bucket instead of scanning events, and
+    raw events past their retention can be compacted away without changing
+    the analytics.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        """
+        Create the rollup table on the event store's writer connection.
+
+        Backfills from existing raw events the first time it runs against an
+        older database. Hourly rollups not aligned to local hours (written by
+        older versions, which used UTC hours, or before a time zone change)
+        are rebuilt from the raw events.
+        """
+        conn.executescript(SCHEMA)
+        empty = conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None
+        has_events = conn.execute("SELECT 1 FROM events LIMIT 1").fetchone() is not None
+        if empty and has_events:
+            self.rebuild(conn)
+        else:
+            latest = conn.execute("SELECT MAX(bucket) FROM rollups WHERE granularity = ?", (HOUR,)).fetchone()[0]
+            if latest is not None and hour_bucket(latest) != latest:
+                self.rebuild(conn, granularities=(HOUR,))
+        conn.commit()
+
+    def apply(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]],
+              granularities: Tuple[str, ...] = (HOUR, DAY)):
+        """Fold a batch of new events into the rollups (inside the caller's transaction)."""
+        bucket_of = {HOUR: hour_bucket, DAY: day_bucket}
+        rows = defaultdict(lambda: [None, 0, 0.0] + [0] * HISTOGRAM_BINS)
+        for event in batch:
+            confidence = float(event["confidence"])
+            for granularity in granularities:
+                bucket = bucket_of[granularity](event["ts"])
+                row = rows[(granularity, bucket, str(event["camera_id"]), event["type"])]
+                row[0] = event.get("location") or event.get("camera") or ""
+                row[1] += 1
+                row[2] += confidence
+                row[3 + _bin(confidence)] += 1
+
+        conn.executemany(_UPSERT, [key + tuple(values) for key, values in rows.items()])
+
+    def rebuild(self, conn: sqlite3.Connection, chunk_size: int = 10000,
+                granularities: Tuple[str, ...] = (HOUR, DAY)):
+        """
+        Recompute rollups from the raw events table.
+
+        Args:
+            conn: Writer connection
+            chunk_size: Events read per query
+            granularities: Rollups to recompute; daily rollups outlive the raw
+                events, so rebuilding them loses the compacted days
+        """
+        conn.execute(f"DELETE FROM rollups WHERE granularity IN ({','.join('?' * len(granularities))})",
+                     tuple(granularities))
+        last_id = 0
+        while True:
+            events = conn.execute(
+                "SELECT id, ts, camera_id, type, location, camera, confidence FROM events "
+                "WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)).fetchall()
+            if not events:
+                break
+            self.apply(conn, [dict(event) for event in events], granularities)
+            last_id = events[-1]["id"]
+
+    def compact(self, conn: sqlite3.Connection, raw_retention_days: float,
+                hourly_retention_days: float = 30):
+        """
+        Drop raw events and hourly rollups past their retention.
+
+        Daily rollups are kept indefinitely, so long-range analytics remain
+        available after the underlying events are gone.
+
+        Returns:
+            Number of raw events deleted
+        """
+        now = time.time()
+        with conn:
+            deleted = conn.execute("DELETE FROM events WHERE ts < ?",
+                                   (now - raw_retention_days * 86400,)).rowcount
+            conn.execute("DELETE FROM rollups WHERE granularity = ? AND bucket < ?",
+                         (HOUR, hour_bucket(now - hourly_retention_days * 86400)))
+        return deleted
+
+    def summary(self, conn: sqlite3.Connection, days: int) -> Dict[str, Any]:
+        """
+        Analytics for the last `days` days, read entirely from rollups.
+
+        Returns:
+            Dictionary with per-type totals, an incident series with one entry
+            per bucket of the range (zero for buckets without incidents),
+            per-location totals and confidence histograms per type
+        """
+        now = time.time()
+        if days <= 1:
+            granularity, start = HOUR, hour_bucket(now - 23 * 3600)
+        else:
+            granularity, start = DAY, day_bucket(now - (days - 1) * 86400)
+
+        rows = conn.execute(
+            f"SELECT bucket, type, location, count, {', '.join(_HISTOGRAM)} FROM rollups "
+            f"WHERE granularity = ? AND bucket >= ? ORDER BY bucket",
+            (granularity, start)).fetchall()
+
+        # Every bucket of the range, so charts show quiet hours and days as zero
+        label_format = _LABEL_FORMATS[granularity] if days <= 7 else "%d %b"
+        series = {}
+        bucket, last = start, hour_bucket(now) if granularity == HOUR else day_bucket(now)
+        while bucket <= last:
+            series[bucket] = {"name": time.strftime(label_format, time.localtime(bucket)),
+                              **{key: 0 for key in _TYPE_KEYS.values()}}
+            # Local days are 23 to 25 hours long around DST changes
+            bucket = hour_bucket(bucket + 3600) if granularity == HOUR else day_bucket(bucket + 36 * 3600)
+
+        totals = defaultdict(int)
+        locations = defaultdict(int)
+        histograms = defaultdict(lambda: [0] * HISTOGRAM_BINS)
+        for row in rows:
+            totals[row["type"]] += row["count"]
+            locations[row["location"] or "Unknown"] += row["count"]
+
+            if row["bucket"] not in series:
+                # Written after the range was computed (the clock passed a bucket boundary)
+                series[row["bucket"]] = {"name": time.strftime(label_format, time.localtime(row["bucket"])),
+                                         **{key: 0 for key in _TYPE_KEYS.values()}}
+            series[row["bucket"]][_TYPE_KEYS.get(row["type"], row["type"])] += row["count"]
+
+            histogram = histograms[row["type"]]
+            for i, h in enumerate(_HISTOGRAM):
+                histogram[i] += row[h]
+
+        return {
+            "incidentCount": sum(totals.values()),
+            "altercationCount": totals['altercation'],
+            "unauthorizedCount": totals['unauthorized'],
+            "behavioralCount": totals['behavioral'],
+            "staffIssuesCount": totals['staff'],
+            "incidents": list(series.values()),
+            "locations": [{"name": name, "incidents": count}
+                          for name, count in sorted(locations.items(), key=lambda item: -item[1])],
+            "confidenceHistograms": dict(histograms),
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the server's packages as `python -m` does when run from src/ml
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
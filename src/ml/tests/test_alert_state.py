@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from runtime.alert_state import AlertTracker, DEFAULT_POLICIES
+
+# fight: opens at 0.65 after 0.5s, closes below 0.45 after 2s, 30s cooldown, updates every 5s
+POLICY = DEFAULT_POLICIES['fight']
+
+
+def _fight(confidence):
+    return {"is_fight": confidence >= POLICY.open_threshold, "confidence": confidence, "persons_involved": 2}
+
+
+def _feed(tracker, frames):
+    """Observe (ts, confidence) frames and collect (ts, event kind) transitions."""
+    return [(ts, event["event"]) for ts, confidence in frames
+            for event in tracker.observe("cam", "fight", _fight(confidence), now=ts)]
+
+
+def test_opens_only_after_min_duration():
+    tracker = AlertTracker()
+    assert _feed(tracker, [(0.0, 0.8), (0.3, 0.8)]) == []
+    # A frame below the open threshold restarts the wait
+    assert _feed(tracker, [(0.4, 0.5), (0.6, 0.8), (1.0, 0.8)]) == []
+    assert _feed(tracker, [(1.1, 0.8)]) == [(1.1, "open")]
+
+
+def test_hysteresis_keeps_the_incident_open():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.8), (0.5, 0.8)])
+    # Between the close and open thresholds the incident stays open indefinitely
+    assert _feed(tracker, [(ts, 0.5) for ts in range(1, 60)]) == []
+
+
+def test_close_delay():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.8), (0.5, 0.8)])
+    # Recovering above the close threshold within close_delay cancels the close
+    assert _feed(tracker, [(1.0, 0.3), (2.9, 0.3), (2.95, 0.5)]) == []
+    assert _feed(tracker, [(3.0, 0.3), (4.9, 0.3), (5.0, 0.3)]) == [(5.0, "close")]
+
+
+def test_cooldown_blocks_a_new_incident():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.8), (0.5, 0.8), (1.0, 0.3), (3.0, 0.3)])
+    assert _feed(tracker, [(10.0, 0.8), (11.0, 0.8), (32.9, 0.8)]) == []
+    events = tracker.observe("cam", "fight", _fight(0.8), now=33.0)
+    assert events == []
+    events = tracker.observe("cam", "fight", _fight(0.8), now=33.5)
+    assert [event["event"] for event in events] == ["open"]
+    assert events[0]["incident_id"] == "cam:fight:2"
+
+
+def test_updates_are_rate_limited():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.7), (0.5, 0.7)])
+    assert _feed(tracker, [(1.0, 0.9), (5.4, 0.9)]) == []
+    events = tracker.observe("cam", "fight", _fight(0.9), now=5.5)
+    assert [event["event"] for event in events] == ["update"]
+    assert events[0]["alert"]["severity"] == "high"
+    assert events[0]["peak_confidence"] == 0.9
+    # Nothing changed since the last update
+    assert _feed(tracker, [(20.0, 0.9)]) == []
+
+
+def test_streams_are_independent():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.8), (0.5, 0.8)])
+    assert tracker.observe("other", "fight", _fight(0.8), now=0.5) == []
+    tracker.reset("cam")
+    assert _feed(tracker, [(1.0, 0.8)]) == []
+
+
+def test_idle_stream_incidents_expire():
+    tracker = AlertTracker()
+    # Frame timestamps from the camera's clock, far from the server's
+    _feed(tracker, [(100.0, 0.8), (100.5, 0.8)])
+    arrived = time.time()
+    assert tracker.expire(now=arrived + POLICY.close_delay - 0.5) == []
+
+    (event,) = tracker.expire(now=arrived + POLICY.close_delay + 0.5)
+    assert event["event"] == "close" and event["incident_id"] == "cam:fight:1"
+    assert event["duration"] == pytest.approx(POLICY.close_delay + 0.5, abs=0.5)
+    assert tracker.expire(now=arrived + 60) == []
+
+    # The cooldown runs in the camera's clock from the close
+    assert _feed(tracker, [(110.0, 0.8), (111.0, 0.8)]) == []
+    assert _feed(tracker, [(140.0, 0.8), (140.5, 0.8)]) == [(140.5, "open")]
+
+
+def test_expire_drops_pending_incidents():
+    tracker = AlertTracker()
+    _feed(tracker, [(0.0, 0.8)])
+    assert tracker.expire(now=time.time() + 60) == []
+    # The wait before opening starts over
+    assert _feed(tracker, [(0.4, 0.8), (0.8, 0.8)]) == []
@@ -0,0 +1,86 @@
+import json
+import time
+
+from runtime.clip_recorder import ClipRecorder, FrameRingBuffer
+
+
+def _jpeg(i, size=100):
+    return i.to_bytes(4, 'big') + bytes(size - 4)
+
+
+def test_time_window():
+    buffer = FrameRingBuffer(max_seconds=2.0, max_bytes=10 ** 6)
+    for i in range(50):
+        buffer.append(i * 0.1, _jpeg(i))
+    assert buffer.frames[0][0] >= 4.9 - 2.0
+    assert buffer.frames[-1][1] == _jpeg(49)
+    assert [ts for ts, _ in buffer.since(4.0)] == [ts for ts, _ in buffer.frames if ts >= 4.0]
+
+
+def test_byte_budget():
+    buffer = FrameRingBuffer(max_seconds=60.0, max_bytes=350)
+    for i in range(10):
+        assert buffer.append(i, _jpeg(i)) is not None
+        assert buffer.nbytes <= 350
+    assert [data for _, data in buffer.frames] == [_jpeg(7), _jpeg(8), _jpeg(9)]
+    assert buffer.nbytes == 300
+
+
+def test_frame_over_budget_is_not_kept():
+    buffer = FrameRingBuffer(max_seconds=60.0, max_bytes=150)
+    buffer.append(0, _jpeg(0))
+    assert buffer.append(1, _jpeg(1, size=151)) is None
+    # The buffered footage is not evicted for it
+    assert [data for _, data in buffer.frames] == [_jpeg(0)]
+    assert buffer.append(2, _jpeg(2, size=150)) is not None
+    assert buffer.nbytes == 150
+
+
+def test_zero_budget_keeps_nothing():
+    buffer = FrameRingBuffer(max_seconds=60.0, max_bytes=0)
+    assert buffer.append(0, _jpeg(0)) is None
+    assert not buffer.frames and buffer.nbytes == 0
+
+
+def test_repeated_frame_is_kept_once():
+    buffer = FrameRingBuffer(max_seconds=60.0, max_bytes=10 ** 6)
+    buffer.append(0, _jpeg(0))
+    assert buffer.append(0.01, _jpeg(0)) is None
+    assert buffer.append(0.02, _jpeg(1)) is not None
+    assert len(buffer.frames) == 2
+
+
+def test_downsample_halves_the_rate():
+    buffer = FrameRingBuffer(max_seconds=60.0, max_bytes=10 ** 6)
+    for i in range(10):
+        buffer.append(i, _jpeg(i))
+    buffer.downsample()
+    # The newest frame stays, so the window still ends now
+    assert [ts for ts, _ in buffer.frames] == [1, 3, 5, 7, 9]
+    assert buffer.nbytes == 500
+    kept = [buffer.append(10 + i, _jpeg(10 + i)) is not None for i in range(4)]
+    assert kept == [False, True, False, True]
+
+
+def test_clip_spans_pre_and_post_event(tmp_path):
+    recorder = ClipRecorder(str(tmp_path), pre_seconds=1.0, post_seconds=1.0)
+    for i in range(20):
+        recorder.add_frame("cam", _jpeg(i), ts=i * 0.1)
+    path = recorder.trigger("cam", "cam:fight:1", ts=1.9)
+    assert recorder.trigger("other", "other:fight:1", ts=1.9) is None
+    for i in range(20, 32):
+        recorder.add_frame("cam", _jpeg(i), ts=i * 0.1)
+
+    index_path = path[:-len(".mjpeg")] + ".json"
+    index, deadline = None, time.time() + 5
+    while index is None and time.time() < deadline:
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            time.sleep(0.02)
+    assert index is not None, "clip was not written"
+    times = [frame["ts"] for frame in index["frames"]]
+    assert times[0] >= 0.9 - 1e-9 and times[-1] >= 2.9 - 1e-9
+    with open(path, "rb") as f:
+        assert f.read() == b"".join(_jpeg(round(ts * 10)) for ts in times)
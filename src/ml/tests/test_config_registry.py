@@ -0,0 +1,61 @@
+import json
+import math
+
+import pytest
+
+from detection.thresholds import DEFAULT_THRESHOLDS
+from runtime.config_registry import DETECTORS, ConfigRegistry, default_config, validate_config
+
+
+def test_empty_config_gets_the_defaults():
+    config = validate_config({})
+    expected = default_config()
+    del expected["version"]
+    assert config == expected
+    assert config["detectors"]["access"]["thresholds"] == DEFAULT_THRESHOLDS["access"]
+
+
+def test_partial_config_keeps_other_defaults():
+    config = validate_config({"detectors": {"fight": {"alert_threshold": 0.9, "thresholds": {"motion": 0.5}},
+                                            "access": {"enabled": False}}})
+    fight = config["detectors"]["fight"]
+    assert fight["alert_threshold"] == 0.9
+    assert fight["thresholds"] == dict(DEFAULT_THRESHOLDS["fight"], motion=0.5)
+    assert config["detectors"]["access"]["enabled"] is False
+    assert all(config["detectors"][name]["enabled"] for name in DETECTORS if name != "access")
+
+
+@pytest.mark.parametrize("raw", [
+    [],
+    {"colour": "red"},
+    {"enabled": "yes"},
+    {"detectors": {"face": {}}},
+    {"detectors": {"fight": 1}},
+    {"detectors": {"fight": {"sensitivity": 1}}},
+    {"detectors": {"fight": {"alert_threshold": 0.2}}},
+    {"detectors": {"fight": {"alert_threshold": 1.5}}},
+    {"detectors": {"fight": {"alert_threshold": True}}},
+    {"detectors": {"fight": {"thresholds": [0.5]}}},
+    {"detectors": {"fight": {"enabled": 1}}},
+    {"detectors": {"fight": {"thresholds": {"speed": 0.5}}}},
+    {"detectors": {"fight": {"thresholds": {"motion": -0.1}}}},
+    {"detectors": {"fight": {"thresholds": {"motion": float("nan")}}}},
+    {"detectors": {"fight": {"thresholds": {"motion": float("inf")}}}},
+    {"detectors": {"fight": {"alert_threshold": float("nan")}}},
+])
+def test_invalid_configs_are_rejected(raw):
+    with pytest.raises(ValueError):
+        validate_config(raw)
+
+
+def test_reload_keeps_running_config_on_non_finite_threshold(tmp_path):
+    path = tmp_path / "settings.json"
+    registry = ConfigRegistry(str(path), {})
+    registry.update({"detectors": {"fight": {"thresholds": {"motion": 0.5}}}})
+
+    # json writes NaN and reads it back, so a hand edit can introduce it
+    path.write_text(json.dumps({"detectors": {"fight": {"thresholds": {"motion": math.nan}}}}))
+    registry.poll()
+    assert registry.config["detectors"]["fight"]["thresholds"]["motion"] == 0.5
+    with pytest.raises(ValueError):
+        registry.update({"detectors": {"fight": {"thresholds": {"motion": math.inf}}}})
@@ -0,0 +1,144 @@
+import os
+import time
+
+import pytest
+
+from storage.event_store import EventStore
+from storage.rollups import hour_bucket
+
+TYPES = [('fight', 'altercation'), ('access', 'unauthorized'), ('behavior', 'behavioral'), ('drowsiness', 'staff')]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def _event(ts, i=0, **fields):
+    detector, type = TYPES[i % len(TYPES)]
+    return dict({"ts": ts, "camera_id": f"cam-{i % 3}", "camera": "Lobby", "location": f"Floor {i % 2}",
+                 "type": type, "detector": detector, "severity": "medium", "confidence": 0.55 + (i % 4) / 10,
+                 "title": "Alert", "description": "Something happened"}, **fields)
+
+
+def test_record_and_filter(store):
+    now = time.time()
+    for i in range(12):
+        store.record(_event(now - i * 60, i))
+    store.flush()
+    assert len(store.query_alerts()) == 12
+    assert {alert["type"] for alert in store.query_alerts(type="altercation")} == {"altercation"}
+    assert len(store.query_alerts(camera_id="cam-1")) == 4
+
+    alert = store.query_alerts(limit=1)[0]
+    assert store.update_status(alert["id"], "resolved")["status"] == "resolved"
+    assert [a["id"] for a in store.query_alerts(status="resolved")] == [alert["id"]]
+    with pytest.raises(ValueError):
+        store.update_status(alert["id"], "closed")
+
+
+def test_keyset_paging(store):
+    now = time.time()
+    # Ties on ts are broken by id
+    for i in range(25):
+        store.record(_event(now - (i // 2), i))
+    store.flush()
+    expected = [alert["id"] for alert in store.query_alerts(limit=100)]
+
+    pages, before_id = [], None
+    while True:
+        page = store.query_alerts(before_id=before_id, limit=10)
+        if not page:
+            break
+        pages.append([alert["id"] for alert in page])
+        before_id = page[-1]["id"]
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == expected
+
+
+def test_unknown_cursor_is_an_empty_page(store):
+    store.record(_event(time.time()))
+    store.flush()
+    assert store.query_alerts(before_id=10 ** 6) == []
+
+
+def test_bad_dates_are_rejected(store):
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        store.query_alerts(date_from="yesterday")
+    with pytest.raises(ValueError):
+        store.query_alerts(date_to="2024-13-01")
+    assert store.query_alerts(date_from="2024-01-01", date_to="2024-01-01") == []
+
+
+def test_analytics_fill_every_bucket(store):
+    now = time.time()
+    store.record(_event(now, 0))
+    store.record(_event(now - 2 * 86400, 1))
+    store.flush()
+
+    day = store.analytics(1)
+    assert len(day["incidents"]) == 24
+    assert sum(bucket["altercations"] for bucket in day["incidents"]) == 1
+
+    week = store.analytics(7)
+    assert len(week["incidents"]) == 7
+    assert week["incidentCount"] == 2
+    assert (week["altercationCount"], week["unauthorizedCount"]) == (1, 1)
+    assert sum(1 for bucket in week["incidents"] if any(bucket[key] for key in bucket if key != "name")) == 2
+
+    assert len(store.analytics(30)["incidents"]) == 30
+
+
+def test_compaction_keeps_daily_analytics(store):
+    old = time.time() - 200 * 86400
+    store.record(_event(old, 0))
+    store.record(_event(time.time(), 1))
+    store.flush()
+    assert store.rollups.compact(store._write_conn, raw_retention_days=90) == 1
+    assert len(store.query_alerts()) == 1
+    assert store.analytics(365)["incidentCount"] == 2
+
+
+@pytest.fixture
+def half_hour_zone():
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Kolkata"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_hourly_buckets_follow_local_hours(half_hour_zone, tmp_path):
+    now = time.time()
+    assert time.localtime(hour_bucket(now)).tm_min == 0
+    # Ten past the previous local hour
+    ts = hour_bucket(hour_bucket(now) - 1) + 600
+    assert time.strftime("%H:%M", time.localtime(ts)).endswith(":10")
+
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.01)
+    try:
+        store.record(_event(ts, 0))
+        store.flush()
+        series = store.analytics(1)["incidents"]
+        assert len(series) == 24
+        assert [bucket["name"] for bucket in series if bucket["altercations"]] == \
+            [time.strftime("%H:00", time.localtime(ts))]
+
+        # Rollups written with UTC hours are re-bucketed when the store is opened
+        conn = store._write_conn
+        with conn:
+            conn.execute("UPDATE rollups SET bucket = bucket - bucket % 3600 WHERE granularity = 'hour'")
+    finally:
+        store.close()
+    store = EventStore(str(tmp_path / "events.db"))
+    try:
+        (bucket,) = store._reader().execute("SELECT bucket FROM rollups WHERE granularity = 'hour'").fetchone()
+        assert bucket == hour_bucket(ts)
+    finally:
+        store.close()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from training.feature_store import FeatureStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeatureStore(str(tmp_path / "features"), chunk_rows=8)
+    yield store
+    store.close()
+
+
+def _vectors(clip, n):
+    return np.arange(n * 3, dtype=np.float32).reshape(n, 3) + clip * 1000
+
+
+def test_write_and_read(store):
+    store.write_clip("a.mp4", "fight", 10, 1, 5, {"fight": _vectors(0, 5), "access": np.empty((0, 3))})
+    store.write_clip("b.mp4", "normal", 10, 1, 6, {"fight": _vectors(1, 6)})
+    assert store.clips() == ["a.mp4", "b.mp4"]
+    assert store.label_names() == ["fight", "normal"]
+    assert store.count("fight") == 11 and store.count("access") == 0
+    assert store.feature_shape("fight") == (3,)
+
+    # Clips span chunk boundaries
+    features, labels = store.read("fight", store.rows("fight"))
+    np.testing.assert_array_equal(features, np.concatenate([_vectors(0, 5), _vectors(1, 6)]))
+    np.testing.assert_array_equal(labels, [0] * 5 + [1] * 6)
+    features, _ = store.read("fight", store.rows("fight", labels=["normal"]))
+    np.testing.assert_array_equal(features, _vectors(1, 6))
+
+    with pytest.raises(ValueError):
+        store.write_clip("c.mp4", "fight", 10, 1, 1, {"fight": np.zeros((1, 4))})
+
+
+def test_reextract_and_remove_then_compact(store):
+    store.write_clip("a.mp4", "fight", 10, 1, 5, {"fight": _vectors(0, 5)})
+    store.write_clip("b.mp4", "normal", 10, 1, 6, {"fight": _vectors(1, 6)})
+    store.write_clip("a.mp4", "normal", 12, 2, 4, {"fight": _vectors(2, 4)})
+    store.remove_clip("b.mp4")
+    assert store.clips() == ["a.mp4"]
+    assert store.clip("a.mp4")["label"] == "normal"
+    assert store.count("fight") == 4
+
+    assert store.compact("fight") == 11
+    assert store.compact("fight") == 0
+    features, labels = store.read("fight", store.rows("fight"))
+    np.testing.assert_array_equal(features, _vectors(2, 4))
+    np.testing.assert_array_equal(labels, [1] * 4)
+
+    # Writes continue after the compacted rows
+    store.write_clip("c.mp4", "fight", 10, 1, 9, {"fight": _vectors(3, 9)})
+    batches = list(store.iter_batches("fight", batch_size=5, shuffle=False))
+    assert [len(features) for features, _ in batches] == [5, 5, 3]
+    np.testing.assert_array_equal(np.concatenate([features for features, _ in batches]),
+                                  np.concatenate([_vectors(2, 4), _vectors(3, 9)]))
+
+
+def test_freshness_is_per_detector(store, tmp_path):
+    clip = tmp_path / "a.mp4"
+    clip.write_bytes(b"video")
+    stat = clip.stat()
+    store.write_clip(str(clip), "fight", stat.st_size, stat.st_mtime_ns, 5, {"fight": _vectors(0, 5)})
+    assert store.is_current(str(clip), "fight", ["fight"])
+    # Features of a detector that was not extracted are not current
+    assert not store.is_current(str(clip), "fight", ["fight", "access"])
+    assert not store.is_current(str(clip), "normal", ["fight"])
+
+    store.write_clip(str(clip), "fight", stat.st_size, stat.st_mtime_ns, 5, {"access": _vectors(1, 5)})
+    assert store.is_current(str(clip), "fight", ["fight", "access"])
+    assert store.clip(str(clip))["detectors"] == ["access", "fight"]
+
+    clip.write_bytes(b"longer video")
+    assert not store.is_current(str(clip), "fight", ["fight"])
+
+
+def test_partial_extraction_keeps_other_detectors(store):
+    store.write_clip("a.mp4", "fight", 10, 1, 5, {"fight": _vectors(0, 5), "access": _vectors(1, 5)})
+    # Re-extracting the changed clip for access alone leaves the fight rows
+    store.write_clip("a.mp4", "normal", 12, 2, 4, {"access": _vectors(2, 4)})
+    assert store.count("fight") == 5 and store.count("access") == 4
+    assert store.compact("fight") == 0
+    np.testing.assert_array_equal(store.read("access", store.rows("access"))[0], _vectors(2, 4))
+    # Rows are selected by the label their detector extracted them with
+    assert len(store.rows("fight", labels=["fight"])) == 5
+    assert len(store.rows("access", labels=["normal"])) == 4
+    assert len(store.rows("fight", labels=["normal"])) == 0
+
+    store.remove_clip("a.mp4")
+    assert store.count("fight") == 0 and store.clip("a.mp4") is None
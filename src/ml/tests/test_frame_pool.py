@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from runtime.decoding import DecodedFrame
+from runtime.frame_pool import SharedFramePool
+
+
+@pytest.fixture
+def pool():
+    pool = SharedFramePool(num_slots=2)
+    yield pool
+    pool.close()
+
+
+def test_oversize_frame_is_downscaled_into_a_slot(pool):
+    # A 4K upload decoded at full resolution, as drowsiness needs it
+    image = np.zeros((2160, 3840, 3), np.uint8)
+    cv2.rectangle(image, (1000, 500), (2000, 1500), (255, 255, 255), -1)
+    frame = DecodedFrame(cv2.imencode('.jpg', image)[1].tobytes()).smallest_color_for(['drowsiness'])
+    assert frame.shape == (2160, 3840, 3)
+    with pytest.raises(ValueError):
+        pool.put(frame)
+
+    handle = pool.put(pool.fit(frame))
+    try:
+        height, width, _ = handle.shape
+        assert height * width * 3 <= pool.slot_bytes
+        assert (height, width) == (1080, 1920)
+        assert pool.view(handle)[500, 750].min() > 200
+    finally:
+        pool.release(handle)
+
+
+def test_fitting_frames_are_kept(pool):
+    frame = np.ones((480, 640, 3), np.uint8)
+    assert pool.fit(frame) is frame
+    # Portrait frames fit as long as the slot holds their bytes
+    portrait = np.ones((1920, 1080, 3), np.uint8)
+    assert pool.fit(portrait) is portrait
@@ -0,0 +1,39 @@
+from cluster.hash_ring import HashRing
+
+KEYS = [f"camera-{i}" for i in range(5000)]
+
+
+def _owners(ring):
+    return {key: ring.lookup(key) for key in KEYS}
+
+
+def test_adding_a_node_moves_about_its_share():
+    ring = HashRing(["a", "b", "c", "d"])
+    before = _owners(ring)
+    ring.add("e")
+    after = _owners(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    # Only keys taken over by the new node move, about 1/5 of them
+    assert all(after[key] == "e" for key in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_removing_a_node_moves_only_its_keys():
+    ring = HashRing(["a", "b", "c", "d"])
+    before = _owners(ring)
+    ring.remove("b")
+    after = _owners(ring)
+    assert "b" not in after.values()
+    assert all(after[key] == before[key] for key in KEYS if before[key] != "b")
+
+
+def test_lookup_skips_excluded_nodes():
+    ring = HashRing(["a", "b", "c"])
+    for key in KEYS[:500]:
+        owner = ring.lookup(key)
+        fallback = ring.lookup(key, exclude=[owner])
+        assert fallback not in (owner, None)
+        # The fallback is where the key goes if its owner leaves
+        assert fallback == HashRing(ring.nodes - {owner}).lookup(key)
+    assert ring.lookup("camera-1", exclude=["a", "b", "c"]) is None
+    assert HashRing().lookup("camera-1") is None
@@ -0,0 +1,80 @@
+import os
+import re
+
+import pytest
+
+from runtime import protocol
+from runtime.alerts import ALERT_TYPES
+from runtime.protocol import FrameRequest, FrameResult
+
+TS_PROTOCOL = os.path.join(os.path.dirname(__file__), '..', '..', 'services', 'mlBinaryProtocol.ts')
+
+RESULTS = {
+    'fight': {"is_fight": True, "confidence": 0.75, "bounding_boxes": [[10, 20, 300, 400], [0, 0, 5, 5]],
+              "persons_involved": 2},
+    'drowsiness': {"is_drowsy": False, "confidence": 0.25, "eye_closure_ratio": 0.125, "head_nodding": True,
+                   "inactivity_duration": 12.5},
+    'behavior': {"unusual_behavior": True, "confidence": 0.5, "behavior_type": "loitering",
+                 "details": {"loitering_score": 0.5, "swaying_score": 0.0}},
+    'access': {"unauthorized_access": False, "confidence": 0.0, "access_type": "none", "person_count": 0,
+               "details": {}},
+}
+
+EVENTS = [
+    {"event": "open", "incident_id": "cam-1:fight:3", "stream_id": "cam-1", "detector": "fight",
+     "confidence": 0.75, "peak_confidence": 0.75, "started_at": 1700000000.123456, "duration": 0.5,
+     "alert": {"type": "altercation", "detector": "fight", "confidence": 0.75, "title": "Altercation",
+               "description": "Two people fighting — hallway", "severity": "high"},
+     "clip": "cam-1_fight_3.mjpeg"},
+    {"event": "close", "incident_id": "cam-1:access:1", "stream_id": "cam-1", "detector": "access",
+     "confidence": 0.25, "peak_confidence": 0.5, "started_at": 1700000100.0, "duration": 31.0, "alert": None},
+]
+
+
+def _ts_constants():
+    with open(TS_PROTOCOL) as f:
+        source = f.read()
+
+    def constant(name):
+        return re.search(rf"const {name}\b[^=]*=\s*([^;]+);", source).group(1)
+
+    return {
+        "RESULT_SIZES": [int(size) for size in re.findall(r"\d+", constant("RESULT_SIZES"))],
+        "EVENT_SIZE": int(constant("EVENT_SIZE")),
+        "ALERT_SIZE": int(constant("ALERT_SIZE")),
+        "DETECTORS": re.findall(r"'(\w+)'", constant("DETECTORS")),
+        "ALERT_TYPES": re.findall(r"'(\w+)'", constant("ALERT_TYPES")),
+    }
+
+
+def test_frames_round_trip():
+    frames = [FrameRequest("cam-1", "Lobby", "Entrance", 1700000000.5, b"\xff\xd8jpeg\xff\xd9"),
+              FrameRequest("cam-2", "Hall é", "", None, b"")]
+    body = protocol.encode_frames(frames, ['fight', 'access'], delta=True)
+    assert protocol.decode_frames(body) == (['fight', 'access'], True, frames)
+
+
+def test_results_round_trip():
+    items = [FrameResult("cam-1", 200, RESULTS, EVENTS), FrameResult("cam-2", 503, {}, [], "Busy")]
+    decoded = protocol.decode_results(protocol.encode_results(items))
+    assert decoded[0].results == RESULTS
+    assert decoded[0].events == EVENTS
+    assert decoded[1] == items[1]
+
+
+def test_truncated_messages_are_rejected():
+    body = protocol.encode_frames([FrameRequest("cam-1", "", "", None, b"jpeg")], ['fight'])
+    with pytest.raises(ValueError):
+        protocol.decode_frames(body[:-1])
+    with pytest.raises(ValueError):
+        protocol.decode_results(b"HSF1\x00\x00")
+
+
+def test_typescript_layout_matches():
+    ts = _ts_constants()
+    assert ts["DETECTORS"] == list(protocol.DETECTORS)
+    assert ts["RESULT_SIZES"] == [protocol._FIGHT.size, protocol._DROWSINESS.size,
+                                  protocol._BEHAVIOR.size, protocol._ACCESS.size]
+    assert ts["EVENT_SIZE"] == protocol._EVENT.size
+    assert ts["ALERT_SIZE"] == protocol._ALERT.size
+    assert ts["ALERT_TYPES"] == [ALERT_TYPES[name] for name in protocol.DETECTORS]
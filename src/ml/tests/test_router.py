@@ -0,0 +1,52 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cluster.router import StreamRouter, create_app
+
+
+class _Node(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.received.append((self.path, self.headers.get('Content-Type'), body))
+        data = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def node():
+    _Node.received = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Node)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _Node.received
+    server.shutdown()
+    server.server_close()
+
+
+def test_multipart_frame_is_forwarded_whole(node):
+    url, received = node
+    router = StreamRouter({"node-a": url})
+    client = create_app(router).test_client()
+    jpeg = b"\xff\xd8" + bytes(range(256)) * 40 + b"\xff\xd9"
+
+    # The dashboard sends camera_id inside the form, without an X-Camera-Id header
+    response = client.post('/api/detect/fight', data={"camera_id": "cam-7", "frame": (io.BytesIO(jpeg), "frame.jpg")},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    (path, content_type, body), = received
+    assert path == '/api/detect/fight'
+    assert content_type.startswith('multipart/form-data; boundary=')
+    assert jpeg in body and b'cam-7' in body
+    assert router.assignments == {"cam-7": "node-a"}
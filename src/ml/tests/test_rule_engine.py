@@ -0,0 +1,70 @@
+import math
+import random
+
+import pytest
+
+from runtime.rule_engine import RuleEngine, RULE_DETECTORS
+
+# The scalar rules live in the detectors, which need MediaPipe
+pytest.importorskip('mediapipe')
+from runtime.streams import create_detectors  # noqa: E402
+
+FRAMES = 400
+
+def _observations(name, rng):
+    """A random observation sequence of one stream, with frames lacking a face or person."""
+    ts = 1_700_000_000.0 + rng.uniform(0, 86400)
+    count, held = 0, 0
+    for _ in range(FRAMES):
+        # Jump hours now and then so access sees day, early-morning and night scores
+        ts += rng.uniform(0.02, 0.5) if rng.random() < 0.98 else rng.uniform(3600, 4 * 3600)
+        if name == 'fight':
+            people = rng.random() < 0.7
+            boxes = [[rng.randint(0, 600), rng.randint(0, 400), rng.randint(600, 1280), rng.randint(400, 720)]
+                     for _ in range(rng.randint(1, 3))] if people else []
+            yield {"landmarks": [[rng.random() for _ in range(12)]] if people else [],
+                   "motion_score": rng.uniform(0, 0.6), "bounding_boxes": boxes}
+        elif name == 'drowsiness':
+            yield None if rng.random() < 0.1 else {
+                "ear": rng.uniform(0.05, 0.4), "head_pose": [rng.uniform(-30, 30), rng.uniform(-0.3, 0.3)], "ts": ts}
+        elif name == 'behavior':
+            yield None if rng.random() < 0.1 else {
+                "pose_features": [rng.random() for _ in range(27)],
+                "position": (0.5 + rng.uniform(-0.05, 0.05), 0.5 + rng.uniform(-0.05, 0.05))}
+        else:
+            # Counts held for a while, so a jump between them reads as tailgating
+            if held == 0:
+                count, held = rng.choice([0, 1, 1, 2, 3, 4]), rng.randint(5, 40)
+            held -= 1
+            yield {"person_count": count, "ts": ts}
+
+
+def _assert_close(actual, expected, path="result"):
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), path
+        for key in expected:
+            _assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            _assert_close(a, e, f"{path}[{i}]")
+    elif isinstance(expected, float) and not isinstance(expected, bool):
+        assert math.isclose(actual, expected, rel_tol=1e-6, abs_tol=1e-9), f"{path}: {actual} != {expected}"
+    else:
+        assert actual == expected, path
+
+
+@pytest.mark.parametrize('name', RULE_DETECTORS)
+def test_rule_engine_matches_scalar_rules(name):
+    detector = create_detectors([name])[name]
+    detector.model = None
+    engine = RuleEngine()
+    try:
+        # Start both from the same state, as StreamContext does when a detector moves to the engine
+        engine.import_state('cam', {name: detector.get_state()})
+        for i, observation in enumerate(_observations(name, random.Random(name))):
+            expected = detector._score(observation)
+            (actual,) = engine.score_batch([('cam', name, observation)])
+            _assert_close(actual, expected, f"{name} frame {i}")
+    finally:
+        engine.stop()
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+import pytest
+
+from runtime.decoding import DecodedFrame
+
+
+def _jpeg(seed):
+    image = np.random.default_rng(seed).integers(0, 255, (240, 320, 3), np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def test_tracker_steps_once_per_uploaded_frame(monkeypatch):
+    # The detectors need MediaPipe
+    pytest.importorskip('mediapipe')
+    from runtime.streams import StreamContext, create_detectors
+
+    detectors = create_detectors(['fight', 'access'])
+    tracker = detectors['fight'].person_tracker
+    steps = []
+    monkeypatch.setattr(tracker, '_step', lambda frame: steps.append(frame.shape))
+    context = StreamContext('cam', detectors)
+
+    # The dashboard posts each frame to the fight and access endpoints separately
+    for seed in range(3):
+        data = _jpeg(seed)
+        context.detect(DecodedFrame(data), ['fight'], ts=seed)
+        context.detect(DecodedFrame(data), ['access'], ts=seed)
+    assert len(steps) == 3
+
+
+def test_fingerprint_follows_the_bytes():
+    assert DecodedFrame(_jpeg(0)).fingerprint == DecodedFrame(_jpeg(0)).fingerprint
+    assert DecodedFrame(_jpeg(0)).fingerprint != DecodedFrame(_jpeg(1)).fingerprint
@@ -0,0 +1,296 @@
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from runtime.decoding import DecodedFrame
+from runtime.streams import StreamContext, create_detectors
+from training.feature_store import FeatureStore
+
+logger = logging.getLogger('hostel-security-ai')
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.mpg')
+DETECTORS = ('fight', 'drowsiness', 'behavior', 'access')
+# Attributes of detectors and the person tracker holding MediaPipe graphs
+MEDIAPIPE_GRAPHS = ('face_mesh', 'holistic', 'pose')
+
+def parse_time(value: str) -> float:
+    """
+    Epoch seconds of a local "YYYY-MM-DD HH:MM:SS" (or ISO "T"-separated) time.
+
+    Raises:
+        ValueError: If the value is in neither form
+    """
+    for layout in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return time.mktime(time.strptime(value.strip(), layout))
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time {value!r}; expected YYYY-MM-DD HH:MM:SS")
+
+
+def find_clips(root: str, labels_csv: str = None) -> List[Tuple[str, str, Optional[float]]]:
+    """
+    List labelled clips.
+
+    Args:
+        root: Dataset directory; without labels_csv, each clip's label is its
+            top-level subdirectory (e.g. RWF-2000's Fight/ and NonFight/)
+        labels_csv: CSV of "path,label[,start]" rows, paths relative to root,
+            start the local capture time of the clip's first frame (optional)
+
+    Returns:
+        (absolute clip path, label, capture start or None) triples, sorted by path
+
+    Raises:
+        ValueError: If a capture time in labels_csv is invalid
+    """
+    clips = []
+    if labels_csv:
+        with open(labels_csv, newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or row[0].startswith('#'):
+                    continue
+                path = os.path.abspath(os.path.join(root, row[0]))
+                start = parse_time(row[2]) if len(row) > 2 and row[2].strip() else None
+                if os.path.exists(path):
+                    clips.append((path, row[1].strip(), start))
+                else:
+                    logger.warning(f"Labelled clip {path} not found")
+    else:
+        for label in sorted(os.listdir(root)):
+            label_dir = os.path.join(root, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for directory, _, files in os.walk(label_dir):
+                for name in files:
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        clips.append((os.path.abspath(os.path.join(directory, name)), label, None))
+    return sorted(clips)
+
+
+class ClipDetectors:
+    """
+    The requested detectors, reused from clip to clip.
+
+    Models and MediaPipe graphs are loaded once. reset() gives the
+    detectors, their shared person tracker and the graphs' frame-to-frame
+    landmark tracking the state of a new stream, so no clip sees another
+    clip's history.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = list(names)
+        self.detectors = create_detectors(self.names)
+        self.tracker = next((d.person_tracker for d in self.detectors.values()
+                             if getattr(d, 'person_tracker', None) is not None), None)
+        self._fresh = {name: detector.get_state() for name, detector in self.detectors.items()}
+        self._fresh_tracker = self.tracker.get_state() if self.tracker is not None else None
+
+    def reset(self, start: float, vectors: Dict[str, list]) -> StreamContext:
+        """
+        Start a clip.
+
+        Args:
+            start: Time of the clip's first frame
+            vectors: {detector: list} receiving each model input vector
+
+        Returns:
+            A stream context over the detectors
+        """
+        for name, detector in self.detectors.items():
+            detector.set_state(self._fresh[name])
+            detector.feature_sink = vectors[name].append
+            # Inactivity and access clocks start with the clip
+            for attr in ('last_active_time', 'last_clean_time'):
+                if hasattr(detector, attr):
+                    setattr(detector, attr, start)
+        if self.tracker is not None:
+            self.tracker.set_state(self._fresh_tracker)
+        for owner in [*self.detectors.values(), self.tracker]:
+            for attr in MEDIAPIPE_GRAPHS:
+                graph = getattr(owner, attr, None)
+                if graph is not None:
+                    graph.reset()
+        return StreamContext('clip', self.detectors)
+
+
+def extract_clip(path: str, names: List[str], sample_fps: float = None, jpeg_quality: int = 95,
+                 start: float = None, detectors: ClipDetectors = None) -> Tuple[Dict[str, np.ndarray], int]:
+    """
+    Run a clip through the runtime detection pipeline and collect model inputs.
+
+    Frames are JPEG-encoded as the browser uploads them and go through the
+    same decode, tracking and scoring stages as live streams, with fresh
+    detector state per clip. Frame times follow the video clock, starting
+    at the clip's capture time, or at its modification time when that is
+    not known; access detection's time-of-day score depends on it.
+
+    Args:
+        path: Video file
+        names: Detectors to extract features for
+        sample_fps: Frame rate to sample at, e.g. the rate cameras upload
+            at (optional, every frame by default)
+        jpeg_quality: JPEG quality of the re-encoded frames
+        start: Capture time of the first frame (optional, defaults to the file's modification time)
+        detectors: Detectors to reuse (optional, built for this clip when not given)
+
+    Returns:
+        ({detector: array of shape (n, *feature_shape)}, frames processed)
+    """
+    detectors = detectors or ClipDetectors(names)
+    vectors = {name: [] for name in names}
+    start = os.stat(path).st_mtime if start is None else start
+    context = detectors.reset(start, vectors)
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(fps / sample_fps)) if sample_fps else 1
+
+    index = frames = 0
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index % step == 0:
+                ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+                context.detect(DecodedFrame(encoded.tobytes()), names, start + index / fps)
+                frames += 1
+            index += 1
+    finally:
+        capture.release()
+
+    # Model inputs carry a leading batch axis of 1
+    return {name: np.concatenate(parts) for name, parts in vectors.items() if parts}, frames
+
+
+# Detectors of a worker process, built once by _init_worker
+_worker_detectors: Optional[ClipDetectors] = None
+
+def _init_worker(names: List[str]):
+    global _worker_detectors
+    _worker_detectors = ClipDetectors(names)
+
+
+def _extract_job(path: str, names: List[str], sample_fps: float, jpeg_quality: int, start: Optional[float]):
+    # Runs in a worker process; only arrays cross the process boundary
+    return extract_clip(path, names, sample_fps, jpeg_quality, start, _worker_detectors)
+
+
+def extract(store: FeatureStore, clips: List[Tuple[str, str, Optional[float]]], names: List[str],
+            workers: int = None, sample_fps: float = None, jpeg_quality: int = 95, prune: bool = False,
+            default_start: float = None) -> Dict[str, int]:
+    """
+    Extract features of new and changed clips into the store, one clip per worker process.
+
+    Each worker process builds the requested detectors once and resets
+    them for every clip.
+
+    Args:
+        store: Destination feature store
+        clips: (path, label, capture start or None) triples
+        names: Detectors to extract features for
+        workers: Worker processes (optional, one per CPU)
+        sample_fps: Frame rate to sample at (optional, every frame)
+        jpeg_quality: JPEG quality of the re-encoded frames
+        prune: Drop indexed clips that are no longer in the dataset
+        default_start: Capture time of clips without one (optional, their modification time)
+
+    Returns:
+        {"extracted", "skipped", "failed", "pruned"} clip counts
+    """
+    pending = [(path, label, start) for path, label, start in clips if not store.is_current(path, label, names)]
+    stats = {"extracted": 0, "skipped": len(clips) - len(pending), "failed": 0, "pruned": 0}
+    if prune:
+        listed = {path for path, _, _ in clips}
+        for path in store.clips():
+            if path not in listed:
+                store.remove_clip(path)
+                stats["pruned"] += 1
+
+    logger.info(f"{len(pending)} clips to extract, {stats['skipped']} up to date")
+    # MediaPipe and TensorFlow are not fork-safe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(names,)) as executor:
+        jobs = {}
+        for path, label, start in pending:
+            # Record the file as it was when extraction started
+            stat = os.stat(path)
+            future = executor.submit(_extract_job, path, names, sample_fps, jpeg_quality,
+                                     default_start if start is None else start)
+            jobs[future] = (path, label, stat.st_size, stat.st_mtime_ns)
+
+        for done, future in enumerate(as_completed(jobs), 1):
+            path, label, size, mtime_ns = jobs[future]
+            try:
+                features, frames = future.result()
+            except Exception as e:
+                logger.error(f"Error extracting {path}: {e}")
+                stats["failed"] += 1
+                continue
+            store.write_clip(path, label, size, mtime_ns, frames, features)
+            stats["extracted"] += 1
+            logger.info(f"[{done}/{len(pending)}] {path}: {frames} frames, " +
+                        ", ".join(f"{name} {len(vectors)}" for name, vectors in features.items()))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract detector model inputs from labelled videos into a feature store.")
+    parser.add_argument('dataset', help="Dataset directory (one subdirectory per label unless --labels is given)")
+    parser.add_argument('--store', required=True, help="Feature store directory")
+    parser.add_argument('--labels', help="CSV of path,label[,start] rows relative to the dataset directory; "
+                                         "start is the clip's local capture time, YYYY-MM-DD HH:MM:SS")
+    parser.add_argument('--start-time', help="Capture time (YYYY-MM-DD HH:MM:SS) of clips without one in --labels "
+                                             "(default: each clip's modification time)")
+    parser.add_argument('--detectors', default=','.join(DETECTORS), help="Comma-separated detectors")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--sample-fps', type=float, default=None, help="Frame rate to sample at (default: every frame)")
+    parser.add_argument('--jpeg-quality', type=int, default=95, help="JPEG quality of re-encoded frames")
+    parser.add_argument('--chunk-rows', type=int, default=65536, help="Feature vectors per chunk file")
+    parser.add_argument('--prune', action='store_true', help="Drop indexed clips missing from the dataset")
+    parser.add_argument('--compact', action='store_true', help="Reclaim rows of removed and re-extracted clips")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    names = [name for name in args.detectors.split(',') if name]
+    unknown = set(names) - set(DETECTORS)
+    if unknown:
+        parser.error(f"Unknown detectors: {', '.join(sorted(unknown))}")
+
+    try:
+        default_start = parse_time(args.start_time) if args.start_time else None
+        clips = find_clips(args.dataset, args.labels)
+    except ValueError as e:
+        parser.error(str(e))
+
+    store = FeatureStore(args.store, chunk_rows=args.chunk_rows)
+    try:
+        stats = extract(store, clips, names, args.workers, args.sample_fps, args.jpeg_quality, args.prune,
+                        default_start)
+        logger.info(f"Extraction finished: {stats}")
+        if args.compact:
+            for name in names:
+                reclaimed = store.compact(name)
+                if reclaimed:
+                    logger.info(f"Compacted {name}: {reclaimed} rows reclaimed")
+        logger.info(f"Feature store: {store.summary()}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    # Run from src/ml as: python -m training.extract_features datasets/RWF-2000/train --store data/features/fight
+    main()
@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    extracted_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extractions (
+    path TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (path, detector)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    detector TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (detector, chunk)
+);
+CREATE TABLE IF NOT EXISTS segments (
+    path TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_path ON segments (path);
+CREATE INDEX IF NOT EXISTS idx_segments_detector ON segments (detector, chunk, start);
+CREATE TABLE IF NOT EXISTS detectors (
+    detector TEXT PRIMARY KEY,
+    shape TEXT NOT NULL
+);
+"""
+
+class FeatureStore:
+    """
+    On-disk store of detector model inputs for training.
+
+    Each detector's feature vectors live in fixed-size chunk files
+    (<root>/<detector>/features-NNNNN.npy and labels-NNNNN.npy) that are
+    memory-mapped, so training reads only the pages it touches and never
+    decodes video. A SQLite index records every clip's size and mtime, its
+    label, and the chunk rows holding its features. Clips can be extracted
+    for some detectors at a time, so the index also records the file
+    version and label each detector's features were extracted from.
+
+    Rows of a clip that is re-extracted or removed are unlinked from the
+    index and left in place until compact() rewrites the chunks.
+    """
+
+    def __init__(self, root: str, chunk_rows: int = 65536):
+        """
+        Open (or create) a feature store.
+
+        Args:
+            root: Store directory
+            chunk_rows: Feature vectors per chunk file
+        """
+        self.root = root
+        self.chunk_rows = chunk_rows
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            # Stores written before extractions were recorded per detector
+            if self._conn.execute("SELECT 1 FROM extractions LIMIT 1").fetchone() is None:
+                self._conn.execute("INSERT INTO extractions (path, detector, size, mtime_ns, label) "
+                                   "SELECT DISTINCT s.path, s.detector, c.size, c.mtime_ns, c.label "
+                                   "FROM segments s JOIN clips c ON c.path = s.path")
+        self._lock = threading.Lock()
+        self._maps: Dict[Tuple[str, str, int, str], np.memmap] = {}
+
+    def close(self):
+        with self._lock:
+            for array in self._maps.values():
+                if array.mode == 'r+':
+                    array.flush()
+            self._maps.clear()
+            self._conn.close()
+
+    def clip(self, path: str) -> Optional[Dict]:
+        """Index entry of a clip (as of its latest extraction), or None if it has not been extracted."""
+        row = self._conn.execute("SELECT size, mtime_ns, label, frames, extracted_at FROM clips WHERE path = ?",
+                                 (path,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(("size", "mtime_ns", "label", "frames", "extracted_at"), row))
+        entry["detectors"] = [detector for (detector,) in self._conn.execute(
+            "SELECT detector FROM extractions WHERE path = ? ORDER BY detector", (path,))]
+        return entry
+
+    def clips(self) -> List[str]:
+        return [row[0] for row in self._conn.execute("SELECT path FROM clips ORDER BY path")]
+
+    def is_current(self, path: str, label: str, detectors: List[str] = None) -> bool:
+        """
+        Whether a clip's features are up to date with the file on disk and its label.
+
+        Args:
+            path: Clip path
+            label: The clip's current label
+            detectors: Detectors whose features are needed (optional, every
+                detector the clip was extracted for)
+        """
+        extracted = {detector: (size, mtime_ns, extracted_label) for detector, size, mtime_ns, extracted_label
+                     in self._conn.execute("SELECT detector, size, mtime_ns, label FROM extractions WHERE path = ?",
+                                           (path,))}
+        if not extracted:
+            return False
+        stat = os.stat(path)
+        return all(extracted.get(detector) == (stat.st_size, stat.st_mtime_ns, label)
+                   for detector in (extracted if detectors is None else detectors))
+
+    def label_names(self) -> List[str]:
+        """Label names, indexed by the integer label stored with each feature vector."""
+        return [row[0] for row in self._conn.execute("SELECT name FROM labels ORDER BY id")]
+
+    def label_id(self, name: str) -> int:
+        with self._lock, self._conn:
+            return self._label_id(name)
+
+    def _label_id(self, name: str) -> int:
+        row = self._conn.execute("SELECT id FROM labels WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            return row[0]
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()
+        self._conn.execute("INSERT INTO labels (id, name) VALUES (?, ?)", (count, name))
+        return count
+
+    def feature_shape(self, detector: str) -> Optional[Tuple[int, ...]]:
+        row = self._conn.execute("SELECT shape FROM detectors WHERE detector = ?", (detector,)).fetchone()
+        return tuple(json.loads(row[0])) if row else None
+
+    def count(self, detector: str) -> int:
+        """Live feature vectors of a detector."""
+        (count,) = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM segments WHERE detector = ?",
+                                      (detector,)).fetchone()
+        return count
+
+    def summary(self) -> Dict:
+        """Clips, labels, and live vectors and shape per detector."""
+        detectors = [row[0] for row in self._conn.execute("SELECT detector FROM detectors ORDER BY detector")]
+        return {
+            "clips": len(self.clips()),
+            "labels": self.label_names(),
+            "detectors": {name: {"vectors": self.count(name), "shape": list(self.feature_shape(name))}
+                          for name in detectors},
+        }
+
+    def write_clip(self, path: str, label: str, size: int, mtime_ns: int, frames: int,
+                   features: Dict[str, np.ndarray]):
+        """
+        Store a clip's features, replacing any earlier extraction of it by the same detectors.
+
+        Features other detectors extracted from the clip are kept.
+
+        Args:
+            path: Clip path (the index key)
+            label: Class name of every frame in the clip
+            size: File size the features were extracted from
+            mtime_ns: File modification time the features were extracted from
+            frames: Frames decoded from the clip
+            features: {detector: array of shape (n, *feature_shape)}; an
+                empty array records that the detector produced no vectors
+        """
+        detectors = list(features)
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM segments WHERE path = ? "
+                               f"AND detector IN ({','.join('?' * len(detectors))})", (path, *detectors))
+            label_id = self._label_id(label)
+            for detector, vectors in features.items():
+                if len(vectors):
+                    self._append(path, detector, np.asarray(vectors, np.float32), label_id)
+                self._conn.execute("INSERT OR REPLACE INTO extractions (path, detector, size, mtime_ns, label) "
+                                   "VALUES (?, ?, ?, ?, ?)", (path, detector, size, mtime_ns, label))
+            self._conn.execute("INSERT OR REPLACE INTO clips (path, size, mtime_ns, label, frames, extracted_at) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (path, size, mtime_ns, label, frames, time.time()))
+
+    def remove_clip(self, path: str):
+        """Drop a clip from the index; its rows are reclaimed by compact()."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM extractions WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM clips WHERE path = ?", (path,))
+
+    def _append(self, path: str, detector: str, vectors: np.ndarray, label_id: int):
+        shape = self.feature_shape(detector)
+        if shape is None:
+            shape = vectors.shape[1:]
+            self._conn.execute("INSERT INTO detectors (detector, shape) VALUES (?, ?)",
+                               (detector, json.dumps(list(shape))))
+        elif vectors.shape[1:] != shape:
+            raise ValueError(f"{detector} features have shape {vectors.shape[1:]}, store holds {shape}")
+
+        row = self._conn.execute("SELECT chunk, used FROM chunks WHERE detector = ? ORDER BY chunk DESC LIMIT 1",
+                                 (detector,)).fetchone()
+        chunk, used = row if row else (-1, self.chunk_rows)
+        written = 0
+        while written < len(vectors):
+            if used == self.chunk_rows:
+                chunk, used = chunk + 1, 0
+                self._conn.execute("INSERT INTO chunks (detector, chunk, used) VALUES (?, ?, 0)", (detector, chunk))
+            count = min(len(vectors) - written, self.chunk_rows - used)
+            features = self._chunk(detector, "features", chunk, 'r+', shape)
+            labels = self._chunk(detector, "labels", chunk, 'r+')
+            features[used:used + count] = vectors[written:written + count]
+            labels[used:used + count] = label_id
+            features.flush()
+            labels.flush()
+            self._conn.execute("INSERT INTO segments (path, detector, chunk, start, count) VALUES (?, ?, ?, ?, ?)",
+                               (path, detector, chunk, used, count))
+            used += count
+            written += count
+            self._conn.execute("UPDATE chunks SET used = ? WHERE detector = ? AND chunk = ?", (used, detector, chunk))
+
+    def _chunk_path(self, detector: str, kind: str, chunk: int) -> str:
+        return os.path.join(self.root, detector, f"{kind}-{chunk:05d}.npy")
+
+    def _chunk(self, detector: str, kind: str, chunk: int, mode: str = 'r',
+               shape: Tuple[int, ...] = None) -> np.memmap:
+        key = (detector, kind, chunk, mode)
+        array = self._maps.get(key)
+        if array is None:
+            path = self._chunk_path(detector, kind, chunk)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if kind == "features":
+                    np.lib.format.open_memmap(path, 'w+', np.float32, (self.chunk_rows,) + tuple(shape)).flush()
+                else:
+                    np.lib.format.open_memmap(path, 'w+', np.int32, (self.chunk_rows,)).flush()
+            array = self._maps[key] = np.load(path, mmap_mode=mode)
+        return array
+
+    def compact(self, detector: str) -> int:
+        """
+        Rewrite a detector's chunks without the rows of removed or re-extracted clips.
+
+        Returns:
+            Rows reclaimed
+        """
+        with self._lock, self._conn:
+            chunks = [row[0] for row in self._conn.execute(
+                "SELECT chunk FROM chunks WHERE detector = ? ORDER BY chunk", (detector,))]
+            if not chunks:
+                return 0
+            (allocated,) = self._conn.execute("SELECT SUM(used) FROM chunks WHERE detector = ?",
+                                              (detector,)).fetchone()
+            segments = self._conn.execute("SELECT rowid, path, chunk, start, count FROM segments "
+                                          "WHERE detector = ? ORDER BY chunk, start", (detector,)).fetchall()
+            live = sum(segment[4] for segment in segments)
+            if live == allocated:
+                return 0
+
+            # New chunks are numbered after the old ones, so a crash before the
+            # index commit leaves the old chunks and their segments intact
+            self._conn.execute("DELETE FROM segments WHERE detector = ?", (detector,))
+            self._conn.execute("UPDATE chunks SET used = ? WHERE detector = ? AND chunk = ?",
+                               (self.chunk_rows, detector, chunks[-1]))
+            for _, path, chunk, start, count in segments:
+                features = self._chunk(detector, "features", chunk)[start:start + count]
+                label_id = int(self._chunk(detector, "labels", chunk)[start])
+                self._append(path, detector, np.asarray(features), label_id)
+            self._conn.execute(f"DELETE FROM chunks WHERE detector = ? AND chunk IN ({','.join('?' * len(chunks))})",
+                               (detector, *chunks))
+
+        for chunk in chunks:
+            for kind in ("features", "labels"):
+                for mode in ('r', 'r+'):
+                    self._maps.pop((detector, kind, chunk, mode), None)
+                os.remove(self._chunk_path(detector, kind, chunk))
+        return allocated - live
+
+    def rows(self, detector: str, labels: List[str] = None) -> np.ndarray:
+        """
+        Live rows of a detector as (chunk, row) pairs.
+
+        Args:
+            detector: Detector name
+            labels: Only rows of clips with these labels (optional)
+        """
+        query = "SELECT s.chunk, s.start, s.count FROM segments s"
+        params: list = [detector]
+        if labels:
+            # The label the detector's rows were extracted with
+            query += (" JOIN extractions e ON e.path = s.path AND e.detector = s.detector"
+                      f" WHERE s.detector = ? AND e.label IN ({','.join('?' * len(labels))})")
+            params += labels
+        else:
+            query += " WHERE s.detector = ?"
+        segments = self._conn.execute(query + " ORDER BY s.chunk, s.start", params).fetchall()
+        if not segments:
+            return np.empty((0, 2), np.int64)
+        return np.concatenate([np.stack([np.full(count, chunk), np.arange(start, start + count)], axis=1)
+                               for chunk, start, count in segments])
+
+    def read(self, detector: str, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gather feature vectors and labels for (chunk, row) pairs.
+
+        Returns:
+            (features of shape (len(rows), *feature_shape), int32 labels)
+        """
+        features = np.empty((len(rows),) + self.feature_shape(detector), np.float32)
+        labels = np.empty(len(rows), np.int32)
+        for chunk in np.unique(rows[:, 0]):
+            selected = np.flatnonzero(rows[:, 0] == chunk)
+            # Sorted row order turns the gather into mostly sequential page reads
+            order = selected[np.argsort(rows[selected, 1])]
+            features[order] = self._chunk(detector, "features", int(chunk))[rows[order, 1]]
+            labels[order] = self._chunk(detector, "labels", int(chunk))[rows[order, 1]]
+        return features, labels
+
+    def iter_batches(self, detector: str, batch_size: int = 256, shuffle: bool = True, seed: int = None,
+                     labels: List[str] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Stream (features, labels) batches of a detector for training.
+
+        Args:
+            detector: Detector name
+            batch_size: Vectors per batch
+            shuffle: Visit rows in random order
+            seed: Shuffle seed (optional)
+            labels: Only rows of clips with these labels (optional)
+        """
+        rows = self.rows(detector, labels)
+        if shuffle:
+            rows = rows[np.random.default_rng(seed).permutation(len(rows))]
+        for start in range(0, len(rows), batch_size):
+            yield self.read(detector, rows[start:start + batch_size])
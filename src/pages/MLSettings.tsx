@@ -1,14 +1,17 @@
 
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Switch } from "@/components/ui/switch";
 import { Slider } from "@/components/ui/slider";
 import { Label } from "@/components/ui/label";
+import { Input } from "@/components/ui/input";
 import { Badge } from "@/components/ui/badge";
 import { BrainCircuit, AlertTriangle, Video, Users, DoorOpen, Shield, RefreshCw } from "lucide-react";
 import { toast } from '@/components/ui/sonner';
 import { mlService } from "@/services/mlConnection";
+import { getAdminToken, getDetectorSettings, setAdminToken, updateDetectorSettings } from "@/services/api";
+import { DetectorConfig, DetectorName, DetectorSettings } from "@/types";
 
 const MLSettings = () => {
   const [connecting, setConnecting] = useState(false);
@@ -27,6 +30,83 @@ const MLSettings = () => {
   const [accessDetection, setAccessDetection] = useState(true);
   const [accessThreshold, setAccessThreshold] = useState(65);
 
+  // Settings as last loaded from or saved to the backend
+  const [settings, setSettings] = useState<DetectorSettings | null>(null);
+  const [saving, setSaving] = useState(false);
+  const [adminToken, setAdminTokenState] = useState(getAdminToken);
+
+  const changeAdminToken = (token: string) => {
+    setAdminTokenState(token);
+    setAdminToken(token);
+  };
+
+  const showSettings = (detectors: Record<DetectorName, DetectorConfig>) => {
+    const percent = (name: DetectorName) => Math.round(detectors[name].alert_threshold * 100);
+    setFightDetection(detectors.fight.enabled);
+    setFightThreshold(percent('fight'));
+    setDrowsinessDetection(detectors.drowsiness.enabled);
+    setDrowsinessThreshold(percent('drowsiness'));
+    setBehaviorDetection(detectors.behavior.enabled);
+    setBehaviorThreshold(percent('behavior'));
+    setAccessDetection(detectors.access.enabled);
+    setAccessThreshold(percent('access'));
+  };
+
+  const loadSettings = async () => {
+    try {
+      const loaded = await getDetectorSettings();
+      setSettings(loaded);
+      showSettings(loaded.detectors);
+    } catch (error) {
+      console.error("Error loading detector settings:", error);
+    }
+  };
+
+  useEffect(() => {
+    loadSettings();
+  }, []);
+
+  const saveSettings = async () => {
+    setSaving(true);
+    try {
+      // Sent with the version it was edited from: the backend refuses it if the settings changed meanwhile
+      const updated = await updateDetectorSettings({
+        version: settings?.version,
+        detectors: {
+          fight: { enabled: fightDetection, alert_threshold: fightThreshold / 100 },
+          drowsiness: { enabled: drowsinessDetection, alert_threshold: drowsinessThreshold / 100 },
+          behavior: { enabled: behaviorDetection, alert_threshold: behaviorThreshold / 100 },
+          access: { enabled: accessDetection, alert_threshold: accessThreshold / 100 }
+        }
+      });
+      setSettings(updated);
+      showSettings(updated.detectors);
+      mlService.applySettings(updated);
+      toast.success("Settings Saved", {
+        description: `Version ${updated.version} is live on running cameras`
+      });
+    } catch (error) {
+      console.error("Error saving detector settings:", error);
+      toast.error("Settings Not Saved", {
+        description: error instanceof Error ? error.message : "Could not save settings to the ML backend"
+      });
+      loadSettings();
+    } finally {
+      setSaving(false);
+    }
+  };
+
+  const modelStatus = (name: DetectorName) => {
+    if (settings?.mode === 'workers') {
+      return "Loaded at worker start";
+    }
+    const model = settings?.models[name];
+    if (!model || model.version === 0) {
+      return "Rule-based";
+    }
+    return model.error ? `Version ${model.version} (update failed)` : `Version ${model.version}`;
+  };
+
   const testConnection = async () => {
     setConnecting(true);
     try {
@@ -111,6 +191,20 @@ const MLSettings = () => {
                   <span>{connected ? 'Connected' : 'Disconnected'}</span>
                 </div>
               </div>
+
+              <div className="flex items-center justify-between">
+                <div>
+                  <Label htmlFor="admin-token" className="font-medium">Admin Token</Label>
+                  <p className="text-sm text-gray-500">The backend's ML_ADMIN_TOKEN, required to save settings</p>
+                </div>
+                <Input
+                  id="admin-token"
+                  type="password"
+                  className="w-64"
+                  value={adminToken}
+                  onChange={(e) => changeAdminToken(e.target.value)}
+                />
+              </div>
             </div>
           </div>
         </CardContent>
@@ -148,7 +242,8 @@ const MLSettings = () => {
                 </div>
                 <Slider 
                   id="fight-threshold"
-                  defaultValue={[fightThreshold]} 
+                  value={[fightThreshold]} 
+                  min={55}
                   max={100} 
                   step={5}
                   disabled={!fightDetection}
@@ -174,6 +269,10 @@ const MLSettings = () => {
                     <span>Accuracy:</span>
                     <span>92%</span>
                   </div>
+                  <div className="flex justify-between">
+                    <span>Loaded Model:</span>
+                    <span>{modelStatus('fight')}</span>
+                  </div>
                 </div>
               </div>
             </div>
@@ -211,7 +310,8 @@ const MLSettings = () => {
                 </div>
                 <Slider 
                   id="drowsiness-threshold"
-                  defaultValue={[drowsinessThreshold]} 
+                  value={[drowsinessThreshold]} 
+                  min={55}
                   max={100} 
                   step={5}
                   disabled={!drowsinessDetection}
@@ -237,6 +337,10 @@ const MLSettings = () => {
                     <span>Accuracy:</span>
                     <span>88%</span>
                   </div>
+                  <div className="flex justify-between">
+                    <span>Loaded Model:</span>
+                    <span>{modelStatus('drowsiness')}</span>
+                  </div>
                 </div>
               </div>
             </div>
@@ -274,7 +378,8 @@ const MLSettings = () => {
                 </div>
                 <Slider 
                   id="behavior-threshold"
-                  defaultValue={[behaviorThreshold]} 
+                  value={[behaviorThreshold]} 
+                  min={55}
                   max={100} 
                   step={5}
                   disabled={!behaviorDetection}
@@ -300,6 +405,10 @@ const MLSettings = () => {
                     <span>Accuracy:</span>
                     <span>85%</span>
                   </div>
+                  <div className="flex justify-between">
+                    <span>Loaded Model:</span>
+                    <span>{modelStatus('behavior')}</span>
+                  </div>
                 </div>
               </div>
             </div>
@@ -337,7 +446,8 @@ const MLSettings = () => {
                 </div>
                 <Slider 
                   id="access-threshold"
-                  defaultValue={[accessThreshold]} 
+                  value={[accessThreshold]} 
+                  min={55}
                   max={100} 
                   step={5}
                   disabled={!accessDetection}
@@ -363,6 +473,10 @@ const MLSettings = () => {
                     <span>Accuracy:</span>
                     <span>90%</span>
                   </div>
+                  <div className="flex justify-between">
+                    <span>Loaded Model:</span>
+                    <span>{modelStatus('access')}</span>
+                  </div>
                 </div>
               </div>
             </div>
@@ -371,8 +485,12 @@ const MLSettings = () => {
       </div>
 
       <div className="flex justify-end space-x-3">
-        <Button variant="outline">Reset to Defaults</Button>
-        <Button>Save Settings</Button>
+        <Button variant="outline" disabled={!settings} onClick={() => settings && showSettings(settings.defaults)}>
+          Reset to Defaults
+        </Button>
+        <Button onClick={saveSettings} disabled={!settings || saving}>
+          {saving ? "Saving..." : "Save Settings"}
+        </Button>
       </div>
     </div>
   );
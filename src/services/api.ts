@@ -1,5 +1,5 @@
 
-import { Alert, Camera, User, AISettings, NotificationSettings, CameraSettings, AlertStatus } from '../types';
+import { Alert, Camera, User, AISettings, NotificationSettings, CameraSettings, DetectorSettings, DetectorSettingsUpdate } from '../types';
 
 // This is a mock API service for now
 // When you develop your backend with ML models, replace these functions with actual API calls
@@ -8,38 +8,29 @@ import { Alert, Camera, User, AISettings, NotificationSettings, CameraSettings,
 const BASE_URL = 'http://localhost:5000/api';
 
 // Fetch alerts with optional filters
+// Results are paged newest first; pass the id of the last alert as `before` to get the next page
 export const fetchAlerts = async (filters?: { 
   status?: string; 
   severity?: string; 
   type?: string;
   from?: string;
   to?: string;
+  camera?: string;
+  before?: number;
+  limit?: number;
 }): Promise<Alert[]> => {
-  // In a real implementation, you would make an API call like:
-  // const response = await fetch(`${BASE_URL}/alerts?${new URLSearchParams(filters)}`);
-  // return await response.json();
-  
-  // For now, we'll simulate a delay
-  return new Promise((resolve) => {
-    setTimeout(() => {
-      // Return mock data
-      resolve([
-        { 
-          id: 1, 
-          type: "altercation", 
-          title: "Physical altercation detected", 
-          location: "Block B, 2nd Floor Corridor", 
-          time: "22:45", 
-          date: "2023-05-18", 
-          severity: "high",
-          status: "pending",
-          description: "AI detected aggressive physical movement patterns consistent with a fight between two individuals.",
-          camera: "Corridor Camera 3"
-        },
-        // Add more mock alerts here
-      ] as Alert[]);
-    }, 500);
+  const params = new URLSearchParams();
+  Object.entries(filters ?? {}).forEach(([key, value]) => {
+    if (value !== undefined && value !== '' && value !== 'all') {
+      params.append(key, String(value));
+    }
   });
+  
+  const response = await fetch(`${BASE_URL}/alerts?${params}`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch alerts: ${response.status}`);
+  }
+  return await response.json();
 };
 
 // Fetch cameras
@@ -62,61 +53,83 @@ export const fetchCameras = async (zone?: string): Promise<Camera[]> => {
 
 // Fetch analytics data
 export const fetchAnalyticsData = async (period: string = 'week') => {
-  // In a real implementation:
-  // const response = await fetch(`${BASE_URL}/analytics?period=${period}`);
-  // return await response.json();
-  
-  return new Promise((resolve) => {
-    setTimeout(() => {
-      resolve({
-        incidentCount: 42,
-        altercationCount: 8,
-        unauthorizedCount: 15,
-        behavioralCount: 14,
-        staffIssuesCount: 5,
-        // Add more analytics data as needed
-      });
-    }, 700);
+  const response = await fetch(`${BASE_URL}/analytics?period=${period}`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch analytics: ${response.status}`);
+  }
+  return await response.json();
+};
+
+// Get detector settings from the ML backend
+export const getDetectorSettings = async (): Promise<DetectorSettings> => {
+  const response = await fetch(`${BASE_URL}/settings`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch detector settings: ${response.status}`);
+  }
+  return await response.json();
+};
+
+// Admin token of the ML backend (ML_ADMIN_TOKEN), needed to change detector settings
+const ADMIN_TOKEN_KEY = 'mlAdminToken';
+
+export const getAdminToken = (): string => localStorage.getItem(ADMIN_TOKEN_KEY) ?? '';
+
+export const setAdminToken = (token: string) => {
+  if (token) {
+    localStorage.setItem(ADMIN_TOKEN_KEY, token);
+  } else {
+    localStorage.removeItem(ADMIN_TOKEN_KEY);
+  }
+};
+
+// Update detector settings; the backend applies them to running streams without a restart.
+// Pass the version the changes are based on to get a 409 error if someone else changed them meanwhile.
+export const updateDetectorSettings = async (changes: DetectorSettingsUpdate): Promise<DetectorSettings> => {
+  const token = getAdminToken();
+  const response = await fetch(`${BASE_URL}/settings`, {
+    method: 'PUT',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { 'Authorization': `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify(changes),
   });
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    throw new Error(body.error ?? `Failed to update detector settings: ${response.status}`);
+  }
+  return await response.json();
 };
 
+// The ML backend has no privacy masking setting, so it is kept in the browser
+const PRIVACY_MASKING_KEY = 'privacyMasking';
+
+const toAISettings = (settings: DetectorSettings): AISettings => ({
+  enabled: settings.enabled,
+  altercationDetection: settings.detectors.fight.enabled,
+  unauthorizedAccess: settings.detectors.access.enabled,
+  behavioralAnalysis: settings.detectors.behavior.enabled,
+  staffMonitoring: settings.detectors.drowsiness.enabled,
+  privacyMasking: localStorage.getItem(PRIVACY_MASKING_KEY) !== 'false'
+});
+
 // Get AI settings
 export const getAISettings = async (): Promise<AISettings> => {
-  // In a real implementation:
-  // const response = await fetch(`${BASE_URL}/settings/ai`);
-  // return await response.json();
-  
-  return new Promise((resolve) => {
-    setTimeout(() => {
-      resolve({
-        enabled: true,
-        altercationDetection: true,
-        unauthorizedAccess: true,
-        behavioralAnalysis: true,
-        staffMonitoring: true,
-        privacyMasking: true
-      });
-    }, 300);
-  });
+  return toAISettings(await getDetectorSettings());
 };
 
-// Update AI settings
+// Update AI settings (the detector switches; thresholds are set on the ML Settings page)
 export const updateAISettings = async (settings: AISettings): Promise<AISettings> => {
-  // In a real implementation:
-  // const response = await fetch(`${BASE_URL}/settings/ai`, {
-  //   method: 'PUT',
-  //   headers: {
-  //     'Content-Type': 'application/json',
-  //   },
-  //   body: JSON.stringify(settings),
-  // });
-  // return await response.json();
-  
-  return new Promise((resolve) => {
-    setTimeout(() => {
-      resolve(settings);
-    }, 300);
-  });
+  localStorage.setItem(PRIVACY_MASKING_KEY, String(settings.privacyMasking));
+  return toAISettings(await updateDetectorSettings({
+    enabled: settings.enabled,
+    detectors: {
+      fight: { enabled: settings.altercationDetection },
+      access: { enabled: settings.unauthorizedAccess },
+      behavior: { enabled: settings.behavioralAnalysis },
+      drowsiness: { enabled: settings.staffMonitoring }
+    }
+  }));
 };
 
 // Get users
@@ -213,32 +226,17 @@ export const updateCameraSettings = async (settings: CameraSettings): Promise<Ca
 
 // Respond to an alert (mark as investigating, resolved, etc.)
 export const updateAlertStatus = async (alertId: number, status: string): Promise<Alert> => {
-  // In a real implementation:
-  // const response = await fetch(`${BASE_URL}/alerts/${alertId}/status`, {
-  //   method: 'PUT',
-  //   headers: {
-  //     'Content-Type': 'application/json',
-  //   },
-  //   body: JSON.stringify({ status }),
-  // });
-  // return await response.json();
-  
-  return new Promise((resolve) => {
-    setTimeout(() => {
-      resolve({
-        id: alertId,
-        type: "altercation",
-        title: "Physical altercation detected",
-        location: "Block B, 2nd Floor Corridor",
-        time: "22:45",
-        date: "2023-05-18",
-        severity: "high",
-        status: status as AlertStatus,
-        description: "AI detected aggressive physical movement patterns consistent with a fight between two individuals.",
-        camera: "Corridor Camera 3"
-      } as Alert);
-    }, 300);
+  const response = await fetch(`${BASE_URL}/alerts/${alertId}/status`, {
+    method: 'PUT',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ status }),
   });
+  if (!response.ok) {
+    throw new Error(`Failed to update alert status: ${response.status}`);
+  }
+  return await response.json();
 };
 
 // ML Model Information
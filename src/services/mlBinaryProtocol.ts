@@ -0,0 +1,141 @@
+import { AlertSeverity, AlertType } from '@/types';
+
+/**
+ * Binary frame upload and results format of the ML backend
+ * (src/ml/runtime/protocol.py). All integers are little-endian.
+ */
+export const FRAMES_CONTENT_TYPE = 'application/x-hostel-frames';
+export const RESULTS_CONTENT_TYPE = 'application/x-hostel-results';
+
+const DETECTORS = ['fight', 'drowsiness', 'behavior', 'access'];
+const ALERT_TYPES: AlertType[] = ['altercation', 'staff', 'behavioral', 'unauthorized'];
+const EVENT_KINDS = ['open', 'update', 'close'] as const;
+const SEVERITIES: AlertSeverity[] = ['low', 'medium', 'high'];
+
+// Packed result record sizes; fight records are followed by 8 bytes per bounding box
+const RESULT_SIZES = [7, 13, 14, 16];
+const EVENT_SIZE = 27;
+const ALERT_SIZE = 5;
+const DELTA_FLAG = 0x01;
+
+export interface BinaryIncidentEvent {
+  event: typeof EVENT_KINDS[number];
+  incident_id: string;
+  detector: string;
+  confidence: number;
+  peak_confidence: number;
+  duration: number;
+  alert: {
+    type: AlertType;
+    title: string;
+    description: string;
+    severity: AlertSeverity;
+  } | null;
+}
+
+/**
+ * Pack one JPEG frame for all four detectors, asking only for incident events
+ */
+export function encodeFrame(
+  jpeg: Uint8Array,
+  cameraId: string,
+  cameraName: string,
+  location: string,
+  capturedAt = 0
+): Uint8Array {
+  const encoder = new TextEncoder();
+  const strings = [cameraId, cameraName, location].map(text => encoder.encode(text).subarray(0, 255));
+  const size = 8 + strings.reduce((total, text) => total + 1 + text.length, 0) + 12 + jpeg.length;
+
+  const bytes = new Uint8Array(size);
+  const view = new DataView(bytes.buffer);
+  bytes.set(encoder.encode('HSF1'), 0);
+  view.setUint16(4, 1, true);
+  view.setUint8(6, (1 << DETECTORS.length) - 1);
+  view.setUint8(7, DELTA_FLAG);
+
+  let offset = 8;
+  for (const text of strings) {
+    view.setUint8(offset, text.length);
+    bytes.set(text, offset + 1);
+    offset += 1 + text.length;
+  }
+  // Capture time in epoch seconds; 0 lets the server stamp the frame on arrival
+  view.setFloat64(offset, capturedAt, true);
+  view.setUint32(offset + 8, jpeg.length, true);
+  bytes.set(jpeg, offset + 12);
+  return bytes;
+}
+
+/**
+ * Read the incident events of every frame in a results message
+ */
+export function decodeEvents(buffer: ArrayBuffer): BinaryIncidentEvent[] {
+  const bytes = new Uint8Array(buffer);
+  const view = new DataView(buffer);
+  const decoder = new TextDecoder();
+  let offset = 0;
+
+  const readString = (prefix: 1 | 2): string => {
+    const length = prefix === 1 ? view.getUint8(offset) : view.getUint16(offset, true);
+    offset += prefix;
+    const text = decoder.decode(bytes.subarray(offset, offset + length));
+    offset += length;
+    return text;
+  };
+
+  if (decoder.decode(bytes.subarray(0, 4)) !== 'HSR1') {
+    throw new Error('Not a detection results message');
+  }
+  const frames = view.getUint16(4, true);
+  offset = 6;
+
+  const events: BinaryIncidentEvent[] = [];
+  for (let frame = 0; frame < frames; frame++) {
+    const status = view.getUint16(offset, true);
+    const mask = view.getUint8(offset + 2);
+    offset += 3;
+    const streamId = readString(1);
+    if (status !== 200) {
+      throw new Error(`Detection failed: ${status} ${readString(2)}`);
+    }
+
+    // Skip per-detector results; only events drive alerts
+    DETECTORS.forEach((_, index) => {
+      if (mask & (1 << index)) {
+        offset += RESULT_SIZES[index] + (index === 0 ? 8 * view.getUint8(offset + 6) : 0);
+      }
+    });
+
+    const count = view.getUint16(offset, true);
+    offset += 2;
+    for (let i = 0; i < count; i++) {
+      const detector = view.getUint8(offset + 1);
+      const flags = view.getUint8(offset + 2);
+      const event: BinaryIncidentEvent = {
+        event: EVENT_KINDS[view.getUint8(offset)],
+        incident_id: `${streamId}:${DETECTORS[detector]}:${view.getUint32(offset + 23, true)}`,
+        detector: DETECTORS[detector],
+        confidence: view.getFloat32(offset + 3, true),
+        peak_confidence: view.getFloat32(offset + 7, true),
+        duration: view.getFloat32(offset + 19, true),
+        alert: null
+      };
+      offset += EVENT_SIZE;
+
+      if (flags & 1) {
+        const severity = SEVERITIES[view.getUint8(offset)];
+        offset += ALERT_SIZE;
+        const title = readString(2);
+        const description = readString(2);
+        event.alert = { type: ALERT_TYPES[detector], title, description, severity };
+      }
+      if (flags & 2) {
+        // Incident clip name
+        readString(1);
+      }
+      events.push(event);
+    }
+  }
+  return events;
+}
@@ -1,9 +1,28 @@
 
 import { toast } from '@/components/ui/sonner';
-import { Alert, AlertType, AlertSeverity } from '@/types';
+import { Alert, AlertType, AlertSeverity, DetectorSettings } from '@/types';
+import { encodeFrame, decodeEvents, FRAMES_CONTENT_TYPE, RESULTS_CONTENT_TYPE } from './mlBinaryProtocol';
 
 const ML_API_BASE_URL = 'http://localhost:5000/api';
 
+/**
+ * Incident transition reported by the ML backend
+ */
+interface IncidentEvent {
+  event: 'open' | 'update' | 'close';
+  incident_id: string;
+  detector: string;
+  confidence: number;
+  peak_confidence: number;
+  duration: number;
+  alert: {
+    type: AlertType;
+    title: string;
+    description: string;
+    severity: AlertSeverity;
+  } | null;
+}
+
 /**
  * Connects to the ML backend to process video frames and generate alerts
  */
@@ -11,6 +30,10 @@ export class MLConnectionService {
   private static instance: MLConnectionService;
   private isConnected: boolean = false;
   private alertCallbacks: ((alert: Alert) => void)[] = [];
+  // Send each frame once as a packed binary message instead of four multipart uploads
+  private useBinaryProtocol: boolean = false;
+  // Detectors switched on in the backend's settings
+  private enabledDetectors: Set<string> = new Set(['fight', 'drowsiness', 'behavior', 'access']);
 
   // Private constructor for singleton pattern
   private constructor() {}
@@ -31,6 +54,9 @@ export class MLConnectionService {
       if (response.ok) {
         const data = await response.json();
         this.isConnected = data.status === 'ok';
+        if (this.isConnected) {
+          await this.refreshSettings();
+        }
         return this.isConnected;
       }
       return false;
@@ -40,6 +66,38 @@ export class MLConnectionService {
     }
   }
 
+  /**
+   * Fetch the backend's detector settings so frames only go to enabled detectors
+   */
+  public async refreshSettings(): Promise<void> {
+    try {
+      const response = await fetch(`${ML_API_BASE_URL}/settings`);
+      if (response.ok) {
+        this.applySettings(await response.json());
+      }
+    } catch (error) {
+      console.error('Error fetching detector settings:', error);
+    }
+  }
+
+  /**
+   * Use detector settings returned by the backend (e.g. after saving them)
+   */
+  public applySettings(settings: DetectorSettings): void {
+    this.enabledDetectors = new Set(
+      Object.entries(settings.detectors)
+        .filter(([, config]) => settings.enabled && config.enabled)
+        .map(([name]) => name)
+    );
+  }
+
+  /**
+   * Switch between the binary frame protocol and multipart/JSON requests
+   */
+  public setBinaryProtocol(enabled: boolean): void {
+    this.useBinaryProtocol = enabled;
+  }
+
   /**
    * Process a video frame through all detection models
    * @param videoElement HTML video element to capture frame from
@@ -61,6 +119,10 @@ export class MLConnectionService {
       }
     }
 
+    if (this.enabledDetectors.size === 0) {
+      return;
+    }
+
     try {
       // Capture video frame
       const canvas = document.createElement('canvas');
@@ -73,6 +135,8 @@ export class MLConnectionService {
       }
       
       ctx.drawImage(videoElement, 0, 0, canvas.width, canvas.height);
+      // Capture time in epoch seconds; the server times incidents by it
+      const capturedAt = Date.now() / 1000;
       
       // Convert to blob
       const blob = await new Promise<Blob | null>((resolve) => {
@@ -83,12 +147,26 @@ export class MLConnectionService {
         throw new Error('Could not create image blob');
       }
 
-      // Process frame through all detection models
+      if (this.useBinaryProtocol) {
+        const events = await this.postFrameBinary(blob, cameraId, cameraName, location, capturedAt);
+        // One alert per detector that opened an incident on this frame
+        const detectors = [...new Set(events.map(event => event.detector))];
+        detectors.forEach(detector => {
+          const alert = this.alertFromEvents(events.filter(event => event.detector === detector), cameraName, location);
+          if (alert) {
+            this.notifyAlertCallbacks(alert);
+          }
+        });
+        return;
+      }
+
+      // Process frame through the enabled detection models
+      const enabled = (detector: string) => this.enabledDetectors.has(detector);
       const results = await Promise.all([
-        this.detectFight(blob, cameraId, cameraName, location),
-        this.detectDrowsiness(blob, cameraId, cameraName, location),
-        this.detectBehavior(blob, cameraId, cameraName, location),
-        this.detectAccess(blob, cameraId, cameraName, location)
+        enabled('fight') ? this.detectFight(blob, cameraId, cameraName, location, capturedAt) : null,
+        enabled('drowsiness') ? this.detectDrowsiness(blob, cameraId, cameraName, location, capturedAt) : null,
+        enabled('behavior') ? this.detectBehavior(blob, cameraId, cameraName, location, capturedAt) : null,
+        enabled('access') ? this.detectAccess(blob, cameraId, cameraName, location, capturedAt) : null
       ]);
       
       // Process results (if any alerts were generated)
@@ -110,42 +188,12 @@ export class MLConnectionService {
     imageBlob: Blob,
     cameraId: number,
     cameraName: string,
-    location: string
+    location: string,
+    capturedAt: number
   ): Promise<Alert | null> {
     try {
-      const formData = new FormData();
-      formData.append('frame', imageBlob);
-      
-      const response = await fetch(`${ML_API_BASE_URL}/detect/fight`, {
-        method: 'POST',
-        body: formData
-      });
-      
-      if (!response.ok) {
-        throw new Error(`Fight detection request failed: ${response.status}`);
-      }
-      
-      const result = await response.json();
-      
-      // Only create alert if fight is detected
-      if (result.is_fight && result.confidence > 0.65) {
-        const alert: Alert = {
-          id: Date.now(),
-          type: 'altercation',
-          title: `Physical altercation detected`,
-          description: `AI detected aggressive physical movement patterns between ${result.persons_involved} individuals`,
-          location,
-          camera: cameraName,
-          date: new Date().toISOString().split('T')[0],
-          time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-          severity: result.confidence > 0.85 ? 'high' : 'medium',
-          status: 'pending'
-        };
-        
-        return alert;
-      }
-      
-      return null;
+      const result = await this.postFrame('fight', imageBlob, cameraId, cameraName, location, capturedAt);
+      return this.alertFromEvents(result.events, cameraName, location);
     } catch (error) {
       console.error('Error in fight detection:', error);
       return null;
@@ -159,42 +207,12 @@ export class MLConnectionService {
     imageBlob: Blob,
     cameraId: number,
     cameraName: string,
-    location: string
+    location: string,
+    capturedAt: number
   ): Promise<Alert | null> {
     try {
-      const formData = new FormData();
-      formData.append('frame', imageBlob);
-      
-      const response = await fetch(`${ML_API_BASE_URL}/detect/drowsiness`, {
-        method: 'POST',
-        body: formData
-      });
-      
-      if (!response.ok) {
-        throw new Error(`Drowsiness detection request failed: ${response.status}`);
-      }
-      
-      const result = await response.json();
-      
-      // Only create alert if drowsiness is detected
-      if (result.is_drowsy && result.confidence > 0.7) {
-        const alert: Alert = {
-          id: Date.now(),
-          type: 'staff',
-          title: `Guard inattention detected`,
-          description: `Security staff appears to be ${result.inactivity_duration > 30 ? 'sleeping' : 'drowsy'} at post. No activity detected for ${Math.round(result.inactivity_duration)} seconds.`,
-          location,
-          camera: cameraName,
-          date: new Date().toISOString().split('T')[0],
-          time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-          severity: result.inactivity_duration > 60 ? 'high' : 'medium',
-          status: 'pending'
-        };
-        
-        return alert;
-      }
-      
-      return null;
+      const result = await this.postFrame('drowsiness', imageBlob, cameraId, cameraName, location, capturedAt);
+      return this.alertFromEvents(result.events, cameraName, location);
     } catch (error) {
       console.error('Error in drowsiness detection:', error);
       return null;
@@ -208,57 +226,12 @@ export class MLConnectionService {
     imageBlob: Blob,
     cameraId: number,
     cameraName: string,
-    location: string
+    location: string,
+    capturedAt: number
   ): Promise<Alert | null> {
     try {
-      const formData = new FormData();
-      formData.append('frame', imageBlob);
-      
-      const response = await fetch(`${ML_API_BASE_URL}/detect/behavior`, {
-        method: 'POST',
-        body: formData
-      });
-      
-      if (!response.ok) {
-        throw new Error(`Behavior detection request failed: ${response.status}`);
-      }
-      
-      const result = await response.json();
-      
-      // Only create alert if unusual behavior is detected
-      if (result.unusual_behavior && result.confidence > 0.6) {
-        let title = 'Unusual behavior detected';
-        let description = 'AI detected behavioral patterns that require attention.';
-        let severity: AlertSeverity = 'low';
-        
-        // Customize alert based on behavior type
-        if (result.behavior_type === 'loitering') {
-          title = 'Suspicious loitering detected';
-          description = 'Individual observed spending excessive time in area without clear purpose.';
-          severity = 'low';
-        } else if (result.behavior_type === 'potential_intoxication') {
-          title = 'Possible intoxication detected';
-          description = 'AI detected unsteady movement and swaying indicative of potential intoxication.';
-          severity = 'medium';
-        }
-        
-        const alert: Alert = {
-          id: Date.now(),
-          type: 'behavioral',
-          title,
-          description,
-          location,
-          camera: cameraName,
-          date: new Date().toISOString().split('T')[0],
-          time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-          severity,
-          status: 'pending'
-        };
-        
-        return alert;
-      }
-      
-      return null;
+      const result = await this.postFrame('behavior', imageBlob, cameraId, cameraName, location, capturedAt);
+      return this.alertFromEvents(result.events, cameraName, location);
     } catch (error) {
       console.error('Error in behavior detection:', error);
       return null;
@@ -272,60 +245,104 @@ export class MLConnectionService {
     imageBlob: Blob,
     cameraId: number,
     cameraName: string,
-    location: string
+    location: string,
+    capturedAt: number
   ): Promise<Alert | null> {
     try {
-      const formData = new FormData();
-      formData.append('frame', imageBlob);
-      
-      const response = await fetch(`${ML_API_BASE_URL}/detect/access`, {
-        method: 'POST',
-        body: formData
-      });
-      
-      if (!response.ok) {
-        throw new Error(`Access detection request failed: ${response.status}`);
-      }
-      
-      const result = await response.json();
-      
-      // Only create alert if unauthorized access is detected
-      if (result.unauthorized_access && result.confidence > 0.65) {
-        let title = 'Unauthorized access detected';
-        let description = 'Suspicious entry detected by security system.';
-        
-        // Customize alert based on access type
-        if (result.access_type === 'tailgating') {
-          title = 'Tailgating detected';
-          description = `${result.person_count} individuals entered through access point at once. Possible tailgating behavior.`;
-        } else if (result.access_type === 'unusual_time') {
-          title = 'After-hours access detected';
-          description = 'Entry detected during restricted hours.';
-        }
-        
-        const alert: Alert = {
-          id: Date.now(),
-          type: 'unauthorized',
-          title,
-          description,
-          location,
-          camera: cameraName,
-          date: new Date().toISOString().split('T')[0],
-          time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-          severity: 'medium',
-          status: 'pending'
-        };
-        
-        return alert;
-      }
-      
-      return null;
+      const result = await this.postFrame('access', imageBlob, cameraId, cameraName, location, capturedAt);
+      return this.alertFromEvents(result.events, cameraName, location);
     } catch (error) {
       console.error('Error in access detection:', error);
       return null;
     }
   }
 
+  /**
+   * Send a frame to a detection endpoint.
+   * Requests delta responses: the server debounces verdicts into incidents
+   * and only reports their open/update/close transitions.
+   */
+  private async postFrame(
+    detector: string,
+    imageBlob: Blob,
+    cameraId: number,
+    cameraName: string,
+    location: string,
+    capturedAt: number
+  ): Promise<{ events: IncidentEvent[] }> {
+    const formData = new FormData();
+    formData.append('frame', imageBlob);
+    formData.append('camera_id', String(cameraId));
+    formData.append('camera_name', cameraName);
+    formData.append('location', location);
+    formData.append('ts', String(capturedAt));
+    formData.append('delta', '1');
+    
+    const response = await fetch(`${ML_API_BASE_URL}/detect/${detector}`, {
+      method: 'POST',
+      body: formData
+    });
+    
+    if (!response.ok) {
+      throw new Error(`Detection request to ${detector} failed: ${response.status}`);
+    }
+    
+    return await response.json();
+  }
+
+  /**
+   * Send a frame to all detectors in one binary request (see mlBinaryProtocol.ts)
+   * and return the incident events it caused.
+   */
+  private async postFrameBinary(
+    imageBlob: Blob,
+    cameraId: number,
+    cameraName: string,
+    location: string,
+    capturedAt: number
+  ): Promise<IncidentEvent[]> {
+    const jpeg = new Uint8Array(await imageBlob.arrayBuffer());
+    const response = await fetch(`${ML_API_BASE_URL}/detect/all`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': FRAMES_CONTENT_TYPE,
+        'Accept': RESULTS_CONTENT_TYPE,
+        // Lets the stream router place the frame without reading the body
+        'X-Camera-Id': String(cameraId)
+      },
+      body: encodeFrame(jpeg, String(cameraId), cameraName, location, capturedAt)
+    });
+
+    if (!response.ok) {
+      throw new Error(`Binary detection request failed: ${response.status}`);
+    }
+
+    return decodeEvents(await response.arrayBuffer());
+  }
+
+  /**
+   * Create an alert for a newly opened incident, if the frame opened one
+   */
+  private alertFromEvents(events: IncidentEvent[], cameraName: string, location: string): Alert | null {
+    const opened = events.find(event => event.event === 'open' && event.alert);
+    if (!opened) {
+      return null;
+    }
+    
+    return {
+      id: Date.now(),
+      type: opened.alert.type,
+      title: opened.alert.title,
+      description: opened.alert.description,
+      location,
+      camera: cameraName,
+      date: new Date().toISOString().split('T')[0],
+      time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
+      severity: opened.alert.severity,
+      status: 'pending'
+    };
+  }
+
   /**
    * Register a callback to receive new alerts
    */
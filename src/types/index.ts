@@ -39,6 +39,38 @@ export interface AISettings {
   privacyMasking: boolean;
 }
 
+// ML Detector Settings Types (GET/PUT /api/settings on the ML backend)
+export type DetectorName = 'fight' | 'drowsiness' | 'behavior' | 'access';
+
+export interface DetectorConfig {
+  enabled: boolean;
+  alert_threshold: number;
+  thresholds: Record<string, number>;
+}
+
+export interface DetectorModelState {
+  path: string;
+  version: number;
+  loaded_at: number | null;
+  error: string | null;
+}
+
+export interface DetectorSettings {
+  version: number;
+  enabled: boolean;
+  detectors: Record<DetectorName, DetectorConfig>;
+  defaults: Record<DetectorName, DetectorConfig>;
+  // 'workers' when detectors run in worker processes, which load their models at start
+  mode: 'in-process' | 'workers';
+  models: Partial<Record<DetectorName, DetectorModelState>>;
+}
+
+export interface DetectorSettingsUpdate {
+  version?: number;
+  enabled?: boolean;
+  detectors?: Partial<Record<DetectorName, Partial<DetectorConfig>>>;
+}
+
 // Notification Settings Types
 export interface NotificationSettings {
   email: boolean;